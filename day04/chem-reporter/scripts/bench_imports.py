@@ -0,0 +1,105 @@
+# scripts/bench_imports.py
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# Entry point -> (code run under "python -X importtime", import budget in ms).
+# The budget covers everything the entry point imports beyond interpreter
+# startup (site, encodings, ...); RDKit, numpy, requests and dotenv must not
+# be among them until a command actually needs them.
+ENTRY_POINTS: Dict[str, Tuple[str, float]] = {
+    "gui": ("import src.app_gui", 150.0),
+    "launcher": ("import src.launcher_gui", 120.0),
+    "run_batch --help": ("import runpy, sys; sys.argv = ['run_batch.py', '--help']; "
+                         "runpy.run_path('scripts/run_batch.py', run_name='__main__')", 150.0),
+    "query_results --help": ("import runpy, sys; sys.argv = ['query_results.py', '--help']; "
+                             "runpy.run_path('scripts/query_results.py', run_name='__main__')", 100.0),
+    "worker client": ("import src.daemon", 60.0),
+    "serve_resolve --help": ("import runpy, sys; sys.argv = ['serve_resolve.py', '--help']; "
+                             "runpy.run_path('scripts/serve_resolve.py', run_name='__main__')", 150.0),
+}
+
+HEAVY = ("rdkit", "numpy", "requests", "dotenv", "pyarrow")
+
+
+def _importtime(code: str) -> List[Tuple[int, int, str]]:
+    """(self µs, cumulative µs, indented name) for every import `code` triggers."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=PROJECT_ROOT,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+
+def _top_level(rows: List[Tuple[int, int, str]]) -> Dict[str, int]:
+    return {name.strip(): cum for _, cum, name in rows if not name.startswith("  ")}
+
+
+def measure(code: str, startup: set[str]) -> Tuple[float, List[Tuple[str, float]], List[str]]:
+    """Import ms beyond startup, the heaviest imports, and heavy packages loaded."""
+    rows, group = [], []
+    for row in _importtime(code):
+        # importtime prints children before their parent: a group ends at a top-level line
+        group.append(row)
+        if not row[2].startswith("  "):
+            if row[2].strip() not in startup:
+                rows += group
+            group = []
+    total = sum(cum for _, cum, name in rows if not name.startswith("  "))
+    heaviest = sorted(((name.strip(), cum / 1000) for _, cum, name in rows if name.count("  ") <= 2),
+                      key=lambda kv: -kv[1])
+    modules = {name.strip().split(".")[0] for _, _, name in rows}
+    heavy = sorted(pkg for pkg in HEAVY if pkg in modules)
+    return total / 1000, heaviest[:5], heavy
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure cold-import time of the chem-reporter entry points against their budgets."
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Runs per entry point; the median is reported")
+    parser.add_argument("--only", action="append", choices=sorted(ENTRY_POINTS),
+                        help="Measure only this entry point (repeatable)")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    startup = set(_top_level(_importtime("pass")))
+    report, failed = [], False
+    for name in args.only or ENTRY_POINTS:
+        code, budget = ENTRY_POINTS[name]
+        samples = [measure(code, startup) for _ in range(max(1, args.runs))]
+        ms = statistics.median(s[0] for s in samples)
+        _, heaviest, heavy = samples[-1]
+        ok = ms <= budget and not heavy
+        failed |= not ok
+        report.append({"entry_point": name, "import_ms": round(ms, 1), "budget_ms": budget,
+                       "ok": ok, "heavy_modules": heavy,
+                       "heaviest": [{"module": m, "ms": round(t, 1)} for m, t in heaviest]})
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        for r in report:
+            flag = "OK  " if r["ok"] else "OVER"
+            print(f"{flag} {r['entry_point']:<22} {r['import_ms']:7.1f} ms  (budget {r['budget_ms']:.0f} ms)")
+            if r["heavy_modules"]:
+                print(f"     loads {', '.join(r['heavy_modules'])} at startup")
+            print("     heaviest: " + ", ".join(f"{h['module']} {h['ms']:.0f} ms" for h in r["heaviest"]))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# scripts/query_results.py
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+
+# Allow "python scripts/query_results.py" to import src/*
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src.catalog import CATALOG_FILENAME, ResultsCatalog
+
+
+def _fmt_mp(row: dict) -> str:
+    low, high = row["mp_low_c"], row["mp_high_c"]
+    if low is None:
+        return ""
+    return f"{low:g} °C" if low == high else f"{low:g}–{high:g} °C"
+
+
+def _print_rows(rows: list, fmt: str, line) -> None:
+    if fmt == "json":
+        json.dump(rows, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    elif fmt == "csv":
+        writer = csv.DictWriter(sys.stdout, fieldnames=list(rows[0]) if rows else ["folder"])
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        for row in rows:
+            print(line(row))
+
+
+def similar_main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="query_results.py similar",
+        description="Find processed compounds similar to a SMILES (Tanimoto on Morgan fingerprints)."
+    )
+    parser.add_argument("smiles", help="Query SMILES")
+    parser.add_argument("--results", type=Path, default=Path("results"),
+                        help="Results directory holding fingerprints/ (default: ./results)")
+    parser.add_argument("-k", "--top-k", type=int, default=10, help="Return the N most similar (default: 10)")
+    parser.add_argument("--threshold", type=float, default=0.0,
+                        help="Only compounds with similarity at least this (0-1)")
+    parser.add_argument("--format", choices=("table", "csv", "json"), default="table")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="(Re)compute fingerprints for everything under --results first "
+                             "(for results written before fingerprints were stored)")
+    args = parser.parse_args(argv)
+
+    from src import fingerprints
+
+    if args.rebuild:
+        print(f"Fingerprinted {fingerprints.rebuild(args.results)} compounds.", file=sys.stderr)
+    elif not fingerprints.fingerprint_dirs(args.results):
+        parser.error(f"No fingerprints under {args.results}; run with --rebuild to create them.")
+
+    t0 = time.perf_counter()
+    try:
+        rows = fingerprints.search(args.results, args.smiles, top_k=args.top_k, threshold=args.threshold)
+    except ValueError as e:
+        parser.error(str(e))
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    _print_rows(rows, args.format,
+                lambda row: f"{row['similarity']:.3f}  {row['key']:<40} CID={row['cid'] or '-':<10} "
+                            f"{_fmt_mp(row):<16} {row['smiles']}")
+    print(f"{len(rows)} match(es) in {elapsed_ms:.1f} ms", file=sys.stderr)
+
+
+_RECORD_FIELDS = ["key", "smiles", "cid", "name", "mp_low_c", "mp_high_c"]
+
+
+def substructure_main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="query_results.py substructure",
+        description="Stream the processed compounds that contain a motif (SMARTS or SMILES)."
+    )
+    parser.add_argument("smarts", help="Query SMARTS, e.g. 'c1ccccc1C(=O)[OH]'")
+    parser.add_argument("--results", type=Path, default=Path("results"),
+                        help="Results directory holding fingerprints/ (default: ./results)")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after N matches")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes for exact matching (default: CPU count - 1; 0 = in-process)")
+    parser.add_argument("--format", choices=("table", "csv", "ndjson"), default="table")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="(Re)compute fingerprints for everything under --results first")
+    args = parser.parse_args(argv)
+
+    from src import fingerprints
+    from src.substructure import SubstructureFilter
+
+    try:
+        motif = SubstructureFilter(args.smarts, workers=args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.rebuild:
+        print(f"Fingerprinted {fingerprints.rebuild(args.results)} compounds.", file=sys.stderr)
+    elif not fingerprints.fingerprint_dirs(args.results):
+        parser.error(f"No fingerprints under {args.results}; run with --rebuild to create them.")
+
+    t0 = time.perf_counter()
+    writer = None
+    if args.format == "csv":
+        writer = csv.DictWriter(sys.stdout, fieldnames=_RECORD_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+    found = 0
+    for record in motif.search(args.results):
+        if args.format == "csv":
+            writer.writerow(record)
+        elif args.format == "ndjson":
+            print(json.dumps(record, ensure_ascii=False))
+        else:
+            print(f"{record['key']:<40} CID={record['cid'] or '-':<10} {_fmt_mp(record):<16} {record['smiles']}")
+        sys.stdout.flush()
+        found += 1
+        if args.limit and found >= args.limit:
+            break
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    print(f"{found} match(es) in {elapsed_ms:.1f} ms ({motif.screened} compounds screened, "
+          f"{motif.matched} matched exactly)", file=sys.stderr)
+
+
+def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] == "similar":
+        similar_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "substructure":
+        substructure_main(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(
+        epilog="Similarity search: query_results.py similar SMILES [-k N] [--threshold T]; "
+               "substructure search: query_results.py substructure SMARTS [--limit N]",
+        description="Query the results catalog (CID, SMILES, name, melting-point range)."
+    )
+    parser.add_argument("--results", type=Path, default=Path("results"),
+                        help="Results directory holding catalog.sqlite (default: ./results)")
+    parser.add_argument("--cid", type=int, help="PubChem CID")
+    parser.add_argument("--smiles", help="Any SMILES of the compound (canonicalized)")
+    parser.add_argument("--name", help="Preferred or IUPAC name, case-insensitive; end with * for a prefix")
+    parser.add_argument("--mp-min", type=float, help="Melting point at least this (°C)")
+    parser.add_argument("--mp-max", type=float, help="Melting point at most this (°C)")
+    parser.add_argument("--limit", type=int, default=None, help="Return at most N rows")
+    parser.add_argument("--format", choices=("table", "csv", "json"), default="table")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="(Re)index every folder under --results first (for trees written "
+                             "before the catalog existed)")
+    args = parser.parse_args()
+
+    catalog_path = args.results / CATALOG_FILENAME
+    if not catalog_path.exists() and not args.rebuild:
+        parser.error(f"No catalog at {catalog_path}; run with --rebuild to create it.")
+    catalog = ResultsCatalog(catalog_path)
+    if args.rebuild:
+        print(f"Indexed {catalog.rebuild(args.results)} folders.", file=sys.stderr)
+
+    t0 = time.perf_counter()
+    rows = catalog.query(cid=args.cid, smiles=args.smiles, name=args.name,
+                         mp_min=args.mp_min, mp_max=args.mp_max, limit=args.limit)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    catalog.close()
+
+    _print_rows(rows, args.format,
+                lambda row: f"{row['folder']:<40} CID={row['cid'] or '-':<10} {_fmt_mp(row):<16} "
+                            f"{row['canonical_smiles'] or ''}")
+    print(f"{len(rows)} match(es) in {elapsed_ms:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
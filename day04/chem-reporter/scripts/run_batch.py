@@ -2,96 +2,407 @@
 from __future__ import annotations
 
 import argparse
-import csv
 import sys
+import time
+from contextlib import ExitStack, nullcontext
 from pathlib import Path
 from datetime import datetime
+from typing import Optional
 
 # Allow "python scripts/run_batch.py" to import src/*
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from src.rdkit_utils import validate_smiles
+# RDKit / numpy / requests come in with src.pipeline, imported by process_csv
+# itself so that --help and argument errors return immediately.
 from src.pubchem import resolve
-from src.io_utils import write_outputs
-from src.models import Result
+from src.io_utils import SmilesCsvReader
+from src.checkpoint import CheckpointJournal
+from src.store import STORE_FILENAME, ResultStore, store_filename
+from src.catalog import catalog_filename
+from src.columnar import COLUMNAR_SUFFIXES, ColumnarWriter
+from src.fingerprints import FINGERPRINT_DIRNAME, FingerprintStore
+from src.sharding import merge_summaries, parse_shard, shard_of, shard_tag
+from src.profiling import PROFILE_MODES, profiled
+from src.descriptors import DEFAULT_DESCRIPTORS, DESCRIPTORS, add_descriptors, parse_descriptor_names
 # at top of scripts/run_batch.py
 import logging
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 
-def process_csv(input_csv: Path, results_dir: Path) -> Path:
+PROFILE_DEFAULT = Path("<results>/profile-<time>")  # --profile given without a path
+
+def process_csv(
+    input_csv: Path,
+    results_dir: Path,
+    embed_budget: Optional[float] = 60.0,
+    adaptive: bool = False,
+    cpu_budget: Optional[float] = None,
+    keep_conformers: bool = False,
+    lookup_workers: int = 4,
+    rdkit_workers: Optional[int] = None,
+    max_in_flight: int = 64,
+    dedup: Optional[str] = "smiles",
+    resume: bool = False,
+    fresh: bool = False,
+    shard: Optional[tuple[int, int]] = None,
+    store: bool = False,
+    columnar: Optional[Path] = None,
+    fingerprints: bool = True,
+    substructure: Optional[str] = None,
+    depict: Optional[str] = None,
+    depict_size: int = 300,
+    grid_page: int = 36,
+    descriptors: tuple[str, ...] = (),
+) -> Path:
+    """
+    Run validate -> resolve -> write_outputs for every row of `input_csv`
+    through the concurrent pipeline (see src/pipeline.py). The summary CSV is
+    written in input order and flushed row by row.
+
+    `embed_budget` caps seconds per molecule for 3D generation. With
+    `adaptive=True` the conformer count and pruning threshold follow each
+    molecule's flexibility, and `cpu_budget` (seconds) caps the 3D work of
+    the whole batch. The summary reports conformers and seconds per row.
+    `keep_conformers=True` writes every conformer to structure.sdf (and the
+    store), lowest energy first, so the notebook viewer can page through them.
+
+    `dedup` ("smiles", "inchikey" or None) computes each distinct compound
+    once and copies its outcome to repeated rows (`dup_group` column).
+
+    Finished rows are journaled under <results>/.checkpoints/. If the last
+    run on this input did not finish, or `resume=True`, rows already in the
+    journal are skipped (their summary rows are copied over); `fresh=True`
+    discards the journal and starts from row 1.
+
+    `shard=(i, N)` (0-based) processes only the rows whose dedup key
+    (canonical SMILES or InChIKey, as for `dedup`) hashes to shard i of N; row numbers stay those of the full input, so the
+    per-shard summaries can be combined with `merge-summaries`. A shard
+    indexes into <results>/catalog_<tag>.sqlite rather than catalog.sqlite,
+    so no SQLite file is shared between shards.
+
+    With `store=True` compounds are written to <results>/results.sqlite
+    (per shard: results_<tag>.sqlite; see src/store.py) instead of one
+    folder each; folders can be exported from it later with `export-store`.
+
+    `columnar` (a .parquet, .arrow or .feather path) additionally writes one
+    row per computed compound for analytics; needs pyarrow.
+
+    With `fingerprints=True` (the default) the Morgan fingerprint of every
+    compound goes into <results>/fingerprints/ (per shard:
+    fingerprints_<tag>/) for `query_results.py similar`.
+
+    `substructure` (SMARTS) limits the run to rows whose SMILES contain that
+    motif; matching runs on a process pool ahead of the pipeline (see
+    src/substructure.py) and other rows are left out of the summary.
+
+    `depict` ("png" or "svg") draws every compound into <results>/depictions/
+    (one `depict_size`-pixel image each, plus grid pages of `grid_page`
+    compounds) on a process pool, cached by canonical SMILES and options
+    (see src/depict.py).
+
+    Substructure matching, 3D generation and depictions share one pool of
+    `rdkit_workers` processes (default: one per core but one).
+
+    `descriptors` (names from src/descriptors.py) are computed for every
+    compound in the 3D worker, from the molecule it has already parsed, and
+    added as summary and columnar columns, to metadata.json and to the store.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from src.pipeline import BatchPipeline, default_rdkit_workers
+    from src.rdkit_utils import ConformerBudget, EmbedOptions
+    from src.substructure import SubstructureFilter
+
     results_dir.mkdir(parents=True, exist_ok=True)
-    summary_path = results_dir / f"batch_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-
-    smiles_column_candidates = ("smiles", "SMILES")
-    rows = list(csv.DictReader(input_csv.open("r", newline="", encoding="utf-8")))
-    if not rows:
-        raise ValueError("Input CSV is empty.")
-
-    # Detect column
-    header = rows[0].keys()
-    col = None
-    for c in smiles_column_candidates:
-        if c in header:
-            col = c
-            break
-    if col is None:
-        raise ValueError(f"CSV must contain one of these columns: {smiles_column_candidates}")
-
-    with summary_path.open("w", newline="", encoding="utf-8") as fh:
-        writer = csv.DictWriter(
-            fh,
-            fieldnames=["input_smiles", "valid", "cid", "iupac_name", "output_dir", "error"]
+    embed = EmbedOptions(time_budget=embed_budget, adaptive=adaptive, keep_conformers=keep_conformers)
+    budget = ConformerBudget(cpu_budget) if adaptive and cpu_budget else None
+    tag = shard_tag(*shard) if shard else ""
+    summary_path = results_dir / (
+        f"batch_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}{('_' + tag) if tag else ''}.csv"
+    )
+    if rdkit_workers is None:
+        rdkit_workers = default_rdkit_workers()
+
+    # Everything opened below is registered on the stack as soon as it
+    # exists, so a failure while setting up the rest still closes it (and
+    # stops the pool's worker processes). Closed in reverse: the pool last.
+    grids: list[str] = []
+    with ExitStack() as cleanup:
+        # One process pool for every RDKit stage (matching, 3D, depictions), so
+        # they share `rdkit_workers` processes instead of each starting its own
+        rdkit_pool = ProcessPoolExecutor(rdkit_workers) if rdkit_workers > 0 else None
+        if rdkit_pool is not None:
+            cleanup.callback(rdkit_pool.shutdown, wait=True, cancel_futures=True)
+        motif = SubstructureFilter(substructure, workers=rdkit_workers, pool=rdkit_pool) if substructure else None
+
+        journal = CheckpointJournal.for_input(input_csv, results_dir, tag=tag)
+        restored = {} if fresh else journal.load()
+        if journal.complete and not resume:
+            restored = {}  # plain re-run of a finished input
+        if restored:
+            print(f"Resuming: {len(restored)} rows already finished (journal: {journal.path})")
+        journal.start(fresh=not restored)
+        cleanup.callback(journal.close)
+        result_store = cleanup.enter_context(ResultStore(results_dir / store_filename(tag))) if store else None
+        columnar_writer = cleanup.enter_context(
+            ColumnarWriter(columnar, descriptors=descriptors)
+        ) if columnar else None
+        fingerprint_store = cleanup.enter_context(FingerprintStore(
+            results_dir / (FINGERPRINT_DIRNAME + (f"_{tag}" if tag else ""))
+        )) if fingerprints else None
+        depictions = None
+        if depict:
+            from src.depict import DepictionStage, DrawOptions
+
+            depictions = DepictionStage(results_dir, DrawOptions(fmt=depict, width=depict_size, height=depict_size),
+                                        workers=rdkit_workers, pool=rdkit_pool, per_page=grid_page,
+                                        run_tag=summary_path.stem[len("batch_summary_"):])
+            cleanup.callback(lambda: grids.extend(depictions.close()))
+
+        pipeline = BatchPipeline(
+            str(results_dir),
+            embed=embed,
+            budget=budget,
+            resolver=resolve,
+            lookup_workers=lookup_workers,
+            rdkit_workers=rdkit_workers,
+            pool=rdkit_pool,
+            max_in_flight=max_in_flight,
+            dedup=dedup,
+            journal=journal,
+            restored=restored,
+            store=result_store,
+            columnar=columnar_writer,
+            fingerprints=fingerprint_store,
+            depictions=depictions,
+            descriptors=descriptors,
+            catalog=catalog_filename(tag),
         )
-        writer.writeheader()
-
-        for i, row in enumerate(rows, start=1):
-            raw = (row.get(col) or "").strip()
-            record = {
-                "input_smiles": raw,
-                "valid": False,
-                "cid": "",
-                "iupac_name": "",
-                "output_dir": "",
-                "error": ""
-            }
-            if not raw:
-                record["error"] = "Empty SMILES cell"
-                writer.writerow(record)
-                continue
-
-            try:
-                record["valid"] = bool(validate_smiles(raw))
-                if not record["valid"]:
-                    record["error"] = "Invalid SMILES"
-                    writer.writerow(record)
-                    continue
-
-                res: Result = resolve(raw)
-                record["cid"] = str(res.cid or "")
-                record["iupac_name"] = res.iupac_name or ""
-
-                out_dir = write_outputs(res, base_dir=str(results_dir))
-                record["output_dir"] = str(out_dir)
-
-                writer.writerow(record)
-                print(f"[{i}] OK: {raw} → CID={record['cid']}")
-            except Exception as e:
-                record["error"] = str(e)
-                writer.writerow(record)
-                print(f"[{i}] ERROR: {raw} → {e}")
+        with SmilesCsvReader(input_csv, buffer_size=256) as reader, \
+                summary_path.open("w", newline="", encoding="utf-8") as fh:
+            rows = ((i, raw) for i, raw, _row in reader)
+            if shard:
+                index, count = shard
+                mode = dedup or "smiles"
+                rows = ((i, raw) for i, raw in rows if shard_of(raw, count, mode) == index)
+            if motif:
+                rows = motif.filter(rows)
+            stats = pipeline.run(rows, fh)
+        journal.mark_complete()
 
+    print(f"\nProcessed {stats['rows']} rows: {stats['ok']} OK, {stats['errors']} errors, "
+          f"{stats['deduplicated']} deduplicated, {stats['restored']} restored from checkpoint, "
+          f"{stats['unchanged']} unchanged since the last run.")
+    if depictions is not None:
+        print(f"Depictions: {depictions.drawn} drawn, {depictions.cached} from cache; "
+              f"{len(grids)} grid page(s) in {depictions.out_dir}")
+    if motif:
+        print(f"Substructure {substructure}: {motif.kept} of {motif.matched} rows matched.")
     return summary_path
 
-def main() -> None:
+def merge_main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="run_batch.py merge-summaries",
+        description="Merge per-shard batch summaries into one, in input order."
+    )
+    parser.add_argument("summaries", type=Path, nargs="+",
+                        help="Shard summary CSVs (batch_summary_*_shardIofN.csv)")
+    parser.add_argument("--out", type=Path, required=True,
+                        help="Merged summary CSV to write")
+    parser.add_argument("--results", type=Path, default=None,
+                        help="Also copy every referenced compound folder into this directory "
+                             "and point output_dir at the copies. The shard catalogs, stores and "
+                             "fingerprints are merged into its catalog.sqlite / results.sqlite / "
+                             "fingerprints/ (default: the directory of --out).")
+    args = parser.parse_args(argv)
+
+    stats = merge_summaries(args.summaries, args.out, args.results)
+    print(f"Merged {stats['rows']} rows from {len(args.summaries)} summaries into {args.out} "
+          f"({stats['duplicates']} duplicate rows dropped, {stats['missing']} missing; "
+          f"{stats['catalogs']} shard catalogs, {stats['stores']} shard stores and "
+          f"{stats['fingerprints']} shard fingerprint stores merged).")
+
+def export_main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="run_batch.py export-store",
+        description="Write per-compound folders from a results store."
+    )
+    parser.add_argument("store", type=Path, help="Store file (results/results.sqlite)")
+    parser.add_argument("keys", nargs="*",
+                        help="Folder names, CIDs or names to export (default: everything)")
+    parser.add_argument("--out", type=Path, default=Path("results"),
+                        help="Directory for the folders (default: ./results)")
+    args = parser.parse_args(argv)
+
+    if not args.store.exists():
+        parser.error(f"No such store: {args.store}")
+    with ResultStore(args.store) as result_store:
+        written = result_store.export(args.keys or None, str(args.out))
+    print(f"Exported {len(written)} compounds to {args.out}")
+
+def descriptors_main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="run_batch.py add-descriptors",
+        description="Add RDKit descriptors to compounds already written (folders and results.sqlite)."
+    )
+    parser.add_argument("results", type=Path, nargs="?", default=Path("results"),
+                        help="Results directory (default: ./results)")
+    parser.add_argument("--descriptors", type=str, default="default", metavar="LIST",
+                        help="Comma-separated names, 'default' or 'all' "
+                             f"(available: {', '.join(DESCRIPTORS)})")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes (default: CPU count - 1; 0 = in-process)")
+    parser.add_argument("--chunk-size", type=int, default=512,
+                        help="Compounds per worker task (default: 512)")
+    args = parser.parse_args(argv)
+
+    try:
+        names = parse_descriptor_names(args.descriptors)
+    except ValueError as e:
+        parser.error(str(e))
+    if not args.results.is_dir():
+        parser.error(f"No such directory: {args.results}")
+    updated = add_descriptors(args.results, names, workers=args.workers, chunk_size=args.chunk_size)
+    print(f"Added {', '.join(names)} to {updated} compounds in {args.results}")
+
+def main(argv: Optional[list[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "merge-summaries":
+        merge_main(argv[1:])
+        return
+    if argv and argv[0] == "export-store":
+        export_main(argv[1:])
+        return
+    if argv and argv[0] == "add-descriptors":
+        descriptors_main(argv[1:])
+        return
+
     parser = argparse.ArgumentParser(
         description="Batch process a CSV of SMILES and write Chem-Reporter outputs."
     )
-    parser.add_argument("csv", type=Path, help="Path to input CSV containing a 'smiles' column.")
+    parser.add_argument("csv", type=Path,
+                        help="Path to input CSV containing a 'smiles' column (.csv, .csv.gz or .csv.zst).")
     parser.add_argument("--results", type=Path, default=Path("results"),
                         help="Base output directory (default: ./results)")
-    args = parser.parse_args()
+    parser.add_argument("--embed-budget", type=float, default=60.0,
+                        help="Seconds allowed per molecule for 3D embedding + optimization; a soft "
+                             "limit that may be overrun by about a second (default: 60; 0 disables "
+                             "the budget)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Pick conformer count and RMS pruning from each molecule's flexibility.")
+    parser.add_argument("--cpu-budget", type=float, default=None,
+                        help="With --adaptive: total seconds of 3D work for the whole batch; "
+                             "conformer counts shrink as it is used up.")
+    parser.add_argument("--keep-conformers", action="store_true",
+                        help="Write every optimized conformer to structure.sdf (and the store), "
+                             "not only the lowest-energy one; use with --adaptive to get several.")
+    parser.add_argument("--lookup-workers", type=int, default=4,
+                        help="Threads doing PubChem lookups (default: 4)")
+    parser.add_argument("--rdkit-workers", type=int, default=None,
+                        help="Processes for 3D generation (default: CPU count - 1; 0 = in-process)")
+    parser.add_argument("--max-in-flight", type=int, default=64,
+                        help="Rows held in the pipeline at once; bounds memory (default: 64)")
+    parser.add_argument("--dedup", choices=("smiles", "inchikey", "none"), default="smiles",
+                        help="Compute repeated compounds once, keyed by canonical SMILES or InChIKey "
+                             "(default: smiles)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip rows already finished for this input, even if the last run completed. "
+                             "(An interrupted run is always resumed.)")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Ignore the checkpoint journal and start from the first row.")
+    parser.add_argument("--shard", type=str, default=None, metavar="I/N",
+                        help="Process only shard I of N (1-based), split by a stable hash of the "
+                             "--dedup key. Combine results with: run_batch.py merge-summaries")
+    parser.add_argument("--store", action="store_true",
+                        help=f"Write all compounds into <results>/{STORE_FILENAME} instead of one folder "
+                             "each (export folders later with: run_batch.py export-store)")
+    parser.add_argument("--columnar", type=Path, default=None, metavar="FILE",
+                        help="Also write one row per compound to a Parquet (.parquet) or Arrow "
+                             "(.arrow/.feather) file for analytics (requires pyarrow).")
+    parser.add_argument("--substructure", type=str, default=None, metavar="SMARTS",
+                        help="Process only rows whose SMILES contain this motif (SMARTS or SMILES)")
+    parser.add_argument("--depict", choices=("png", "svg"), default=None,
+                        help="Draw 2D depictions of every compound into <results>/depictions/ "
+                             "(per compound and grid pages; cached, so re-runs draw nothing)")
+    parser.add_argument("--depict-size", type=int, default=300, metavar="PX",
+                        help="Depiction size in pixels (default: 300)")
+    parser.add_argument("--grid-page", type=int, default=36, metavar="N",
+                        help="Compounds per grid page (default: 36)")
+    parser.add_argument("--descriptors", type=str, nargs="?", const="default", default=None,
+                        metavar="LIST",
+                        help="Compute RDKit descriptors for every compound: comma-separated names, "
+                             f"'default' or 'all' (available: {', '.join(DESCRIPTORS)}). Given without "
+                             f"a list: {', '.join(DEFAULT_DESCRIPTORS)}. "
+                             "Backfill earlier results with: run_batch.py add-descriptors")
+    parser.add_argument("--no-fingerprints", action="store_true",
+                        help="Do not add Morgan fingerprints to <results>/fingerprints/ "
+                             "(used by: query_results.py similar)")
+    parser.add_argument("--profile", type=Path, nargs="?", const=PROFILE_DEFAULT, default=None,
+                        metavar="PATH",
+                        help="Profile the run: writes PATH.folded (flame graph) or PATH.pstats, and "
+                             "PATH.txt with the hottest functions per pipeline stage "
+                             "(default PATH: <results>/profile-<time>). RDKit then runs in-process "
+                             "unless --rdkit-workers is given, since work in worker processes "
+                             "is not profiled.")
+    parser.add_argument("--profile-mode", choices=PROFILE_MODES, default="sampling",
+                        help="sampling (low overhead, default) or cprofile (exact call counts)")
+    parser.add_argument("--profile-top", type=int, default=15, metavar="N",
+                        help="Functions listed per stage in the profile report (default: 15)")
+    args = parser.parse_args(argv)
 
-    summary = process_csv(args.csv, args.results)
+    if args.columnar and not args.columnar.name.lower().endswith(COLUMNAR_SUFFIXES):
+        parser.error("--columnar must end in .parquet, .arrow or .feather")
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        descriptors = parse_descriptor_names(args.descriptors) if args.descriptors else ()
+    except ValueError as e:
+        parser.error(str(e))
+    if args.substructure:
+        from src.substructure import compile_query
+        try:
+            compile_query(args.substructure)
+        except ValueError as e:
+            parser.error(str(e))
+
+    profile_out = None
+    rdkit_workers = args.rdkit_workers
+    if args.profile is not None:
+        profile_out = (args.results / time.strftime("profile-%Y%m%d-%H%M%S")
+                       if args.profile is PROFILE_DEFAULT else args.profile)
+        # The profilers only see this process; RDKit in pool workers would be missing
+        if rdkit_workers is None:
+            rdkit_workers = 0
+            logging.warning("--profile: running RDKit in-process (--rdkit-workers 0) so it appears in "
+                            "the profile; pass --rdkit-workers N to profile a parallel run without it.")
+        elif rdkit_workers > 0:
+            logging.warning("--profile with --rdkit-workers %d: RDKit work done in the worker processes "
+                            "(3D generation, matching, depictions) is NOT in the profile.", rdkit_workers)
+    with profiled(profile_out, args.profile_mode, args.profile_top) if profile_out else nullcontext():
+        summary = process_csv(
+            args.csv,
+            args.results,
+            embed_budget=args.embed_budget or None,
+            adaptive=args.adaptive,
+            cpu_budget=args.cpu_budget,
+            keep_conformers=args.keep_conformers,
+            lookup_workers=args.lookup_workers,
+            rdkit_workers=rdkit_workers,
+            max_in_flight=args.max_in_flight,
+            dedup=None if args.dedup == "none" else args.dedup,
+            resume=args.resume,
+            fresh=args.fresh,
+            shard=shard,
+            store=args.store,
+            columnar=args.columnar,
+            fingerprints=not args.no_fingerprints,
+            substructure=args.substructure,
+            depict=args.depict,
+            depict_size=args.depict_size,
+            grid_page=args.grid_page,
+            descriptors=descriptors,
+        )
     print(f"\nSummary written to: {summary}")
 
 if __name__ == "__main__":
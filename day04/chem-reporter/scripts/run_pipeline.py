@@ -12,8 +12,8 @@ import logging
 from pathlib import Path
 from datetime import datetime
 
-from src.io_utils import build_outputs
-from src.config import HTTP_TIMEOUT, USER_AGENT  
+from src.config import HTTP_TIMEOUT, USER_AGENT
+from src.profiling import PROFILE_MODES, profiled, stage
 
 def _setup_logging(verbose: bool):
     level = logging.DEBUG if verbose else logging.INFO
@@ -27,9 +27,39 @@ def parse_args():
     p.add_argument("--name", required=True, help="Folder/name for results.")
     p.add_argument("--num-confs", type=int, default=10, help="RDKit conformers.")
     p.add_argument("--random-seed", type=int, default=0, help="Random seed.")
+    p.add_argument("--keep-conformers", action="store_true",
+                   help="Write every optimized conformer to structure.sdf, not only the best one.")
     p.add_argument("--verbose", action="store_true", help="Verbose logging.")
+    p.add_argument("--profile", type=Path, nargs="?", const=Path("results/profile"), default=None,
+                   metavar="PATH",
+                   help="Profile the run: writes PATH.folded (flame graph) or PATH.pstats, and "
+                        "PATH.txt with the hottest functions per stage (default: results/profile).")
+    p.add_argument("--profile-mode", choices=PROFILE_MODES, default="sampling",
+                   help="sampling (default) or cprofile.")
+    p.add_argument("--profile-top", type=int, default=15, metavar="N",
+                   help="Functions listed per stage in the profile report.")
     return p.parse_args()
 
+def _build(args) -> str:
+    # Heavy imports (RDKit, requests) happen here, inside the profiled region
+    with stage("input"):
+        from src.io_utils import sdf_props, write_outputs
+        from src.pipeline import build_structure
+        from src.pubchem import resolve
+        from src.rdkit_utils import EmbedOptions
+
+    with stage("resolve"):
+        result = resolve(args.smiles)
+        result.preferred_name = args.name
+    with stage("structure"):
+        embed = EmbedOptions(num_confs=args.num_confs, random_seed=args.random_seed,
+                             keep_conformers=args.keep_conformers)
+        sdf_text, result.structure, error, _, _ = build_structure(args.smiles, embed, sdf_props(result))
+        if error:
+            raise RuntimeError(f"3D generation failed: {error}")
+    with stage("write"):
+        return write_outputs(result, base_dir="results", embed=embed, sdf_text=sdf_text)
+
 def main():
     args = parse_args()
     _setup_logging(args.verbose)
@@ -37,19 +67,16 @@ def main():
     logging.info("Starting pipeline…")
     logging.debug(f"HTTP_TIMEOUT={HTTP_TIMEOUT}, USER_AGENT={USER_AGENT}")
 
-    # 🔧 Mappatura corretta dei parametri richiesti da io_utils.build_outputs
-    out = build_outputs(
-        smiles=args.smiles,
-        results_dir=Path("results"),
-        preferred_name=args.name,
-        num_confs=args.num_confs,
-        random_seed=args.random_seed,
-    )
+    if args.profile:
+        with profiled(args.profile, args.profile_mode, args.profile_top):
+            out = _build(args)
+    else:
+        out = _build(args)
 
     print(json.dumps({
         "name": args.name,
         "created_at": datetime.utcnow().isoformat() + "Z",
-        "results_dir": str(Path("results") / args.name),
+        "results_dir": out,
         "status": "ok",
     }, indent=2))
 
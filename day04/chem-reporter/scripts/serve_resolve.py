@@ -0,0 +1,55 @@
+# scripts/serve_resolve.py
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# Allow "python scripts/serve_resolve.py" to import src/*
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src import pubchem
+from src.service import ResolveService, serve
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Local HTTP/JSON service resolving SMILES to names and melting points."
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port (default: 8765)")
+    parser.add_argument("--window-ms", type=float, default=20.0,
+                        help="Coalesce requests arriving within this many ms into one batch (default: 20)")
+    parser.add_argument("--max-batch", type=int, default=100, help="Largest micro-batch (default: 100)")
+    parser.add_argument("--lookup-workers", type=int, default=4,
+                        help="Threads for per-compound PubChem requests (default: 4)")
+    parser.add_argument("--cache", type=Path, default=None,
+                        help="PubChem response cache directory (default: $PUBCHEM_CACHE or "
+                             "results/.pubchem_cache)")
+    parser.add_argument("--offline", action="store_true",
+                        help="Answer only from the cache; never contact PubChem (or the mirror)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+    from src.config import settings
+    cache_dir = args.cache or Path(settings.cache_dir or "results/.pubchem_cache")
+    pubchem.configure_cache(str(cache_dir), offline=args.offline or settings.offline)
+
+    service = ResolveService(window=args.window_ms / 1000, max_batch=args.max_batch,
+                             lookup_workers=args.lookup_workers)
+    server = serve(args.host, args.port, service)
+    print(f"Resolve service on http://{args.host}:{server.server_port}/resolve "
+          f"(cache: {cache_dir}{', offline' if args.offline or settings.offline else ''}; "
+          f"upstream: {settings.pubchem_base})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
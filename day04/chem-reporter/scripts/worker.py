@@ -0,0 +1,67 @@
+# scripts/worker.py
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+# Allow "python scripts/worker.py" to import src/*
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src import daemon
+
+
+def main() -> None:
+    # "batch" forwards everything after it to run_batch.py unchanged
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        sys.exit(daemon.run_batch_via_worker(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(
+        description="Long-lived chem-reporter worker (keeps RDKit, the HTTP pool and caches warm)."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="Run the worker in the foreground")
+    start = sub.add_parser("start", help="Start the worker in the background")
+    for p in (serve, start):
+        p.add_argument("--idle-timeout", type=float, default=None, metavar="SECONDS",
+                       help="Exit after this long without requests")
+    sub.add_parser("stop", help="Stop the running worker")
+    sub.add_parser("status", help="Show whether a worker is running")
+    sub.add_parser("batch", help="Run 'run_batch.py ARGS...' on the worker (in-process if none)")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+        daemon.WorkerDaemon(idle_timeout=args.idle_timeout).serve_forever()
+    elif args.command == "start":
+        if daemon.is_running():
+            print("Worker already running.")
+            return
+        daemon.start_worker(idle_timeout=args.idle_timeout)
+        for _ in range(600):  # warm-up imports RDKit; give it up to a minute
+            time.sleep(0.1)
+            if daemon.is_running():
+                print("Worker started.")
+                return
+        sys.exit("Worker did not come up; run 'python scripts/worker.py serve' to see why.")
+    elif args.command == "stop":
+        try:
+            daemon.request("shutdown")
+        except daemon.WorkerUnavailable:
+            print("No worker running.")
+            return
+        print("Worker stopped.")
+    else:
+        try:
+            info = daemon.request("ping")
+        except daemon.WorkerUnavailable:
+            print("No worker running.")
+            sys.exit(1)
+        print(f"Worker pid {info['pid']}: up {info['uptime_s']:.0f} s, "
+              f"{info['requests']} requests, {info['cached']} cached lookups.")
+
+
+if __name__ == "__main__":
+    main()
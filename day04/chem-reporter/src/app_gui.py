@@ -1,12 +1,22 @@
 # src/app_gui.py
 from __future__ import annotations
 
+import copy
+import importlib
+import queue
+import threading
 import tkinter as tk
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from tkinter import ttk, messagebox
 import traceback
+from typing import Any, Callable, Dict, Optional
 
-from src.pubchem import resolve
-from src.io_utils import write_outputs
+from src.models import Result
+from src.daemon import resolve_via_worker
+from src.pubchem import RESOLVE_STAGES
+from src.writer import OutputWriter
 # at top of src/app_gui.py
 import logging
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
@@ -14,15 +24,70 @@ logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 HELP_TEXT = (
     "Enter a SMILES string and click Search.\n"
     "Example: CC(=O)OC1=CC=CC=C1C(=O)O  (aspirin)\n"
+    "\n"
+    "You can add more SMILES while one is running; they are processed in order.\n"
+    "Cancel stops the running lookup (or the selected queued ones).\n"
+    "\n"
+    "The SMILES is checked as you type; once it is valid the lookup starts\n"
+    "in the background, so Search is usually instant.\n"
 )
 
+STAGES = (*RESOLVE_STAGES, "write")
+STAGE_LABELS = {
+    "cid": "Looking up CID…",
+    "iupac_name": "Fetching IUPAC name…",
+    "title": "Fetching title…",
+    "melting_points": "Fetching melting points…",
+    "write": "Writing results…",
+}
+POLL_MS = 50
+VALIDATE_DELAY_MS = 300     # debounce for as-you-type validation
+PREFETCH_CACHE_SIZE = 32    # speculative lookups kept per session
+
+
+class Cancelled(Exception):
+    """Raised inside the worker to abandon the current job."""
+
+
+@dataclass
+class _Job:
+    number: int  # row in the queue list
+    smiles: str
+    state: str = "queued"
+    cancel: threading.Event = field(default_factory=threading.Event)
+
+
+@dataclass
+class _Prefetch:
+    smiles: str
+    future: Optional["Future[Result]"] = None
+    cancel: threading.Event = field(default_factory=threading.Event)
+    claimed: bool = False  # a Search is using it; never cancel
+
+    def usable(self) -> bool:
+        """Started, not abandoned, and not failed."""
+        if self.future is None or self.cancel.is_set():
+            return False
+        return not (self.future.done() and self.future.exception() is not None)
+
 
 class ChemReporterApp(ttk.Frame):
+    """
+    Single-compound window. Lookups run on a worker thread, one job at a
+    time, and report back through an event queue that the Tk loop drains
+    with after(); the window never blocks on the network or RDKit.
+
+    While the user types, the entry is validated (debounced, off the event
+    loop) and a valid SMILES is looked up speculatively on a separate,
+    lower-priority thread; Search then picks up the cached or in-flight
+    lookup instead of starting from scratch.
+    """
+
     def __init__(self, master: tk.Tk) -> None:
         super().__init__(master, padding=12)
         self.master.title("Chem-Reporter (Tk)")
-        self.master.geometry("640x220")
-        self.master.minsize(520, 180)
+        self.master.geometry("640x380")
+        self.master.minsize(520, 300)
         self.grid(sticky="nsew")
 
         self.master.columnconfigure(0, weight=1)
@@ -39,24 +104,78 @@ class ChemReporterApp(ttk.Frame):
         self.smiles_entry.grid(row=1, column=1, sticky="ew", padx=(8, 8))
         self.columnconfigure(1, weight=1)
 
+        # Inline validity of the entry
+        self.valid_lbl = ttk.Label(self, text="")
+        self.valid_lbl.grid(row=2, column=1, sticky="w", padx=(8, 8))
+
         # Buttons
         self.search_btn = ttk.Button(self, text="Search", command=self.on_search)
         self.search_btn.grid(row=1, column=2, sticky="e")
 
-        self.help_btn = ttk.Button(self, text="Help", command=self.on_help)
-        self.help_btn.grid(row=2, column=2, sticky="e", pady=(8, 0))
-
-        self.exit_btn = ttk.Button(self, text="Exit", command=self.master.destroy)
-        self.exit_btn.grid(row=3, column=2, sticky="e", pady=(8, 0))
+        # Progress of the running job
+        self.progress = ttk.Progressbar(self, mode="determinate", maximum=len(STAGES))
+        self.progress.grid(row=3, column=0, columnspan=2, sticky="ew", pady=(8, 0))
+        self.cancel_btn = ttk.Button(self, text="Cancel", command=self.on_cancel, state="disabled")
+        self.cancel_btn.grid(row=3, column=2, sticky="e", pady=(8, 0))
 
         # Status
         self.status_var = tk.StringVar(value="")
         self.status_lbl = ttk.Label(self, textvariable=self.status_var, foreground="green")
-        self.status_lbl.grid(row=3, column=0, columnspan=2, sticky="w", pady=(8, 0))
+        self.status_lbl.grid(row=4, column=0, columnspan=3, sticky="w", pady=(4, 0))
+
+        # Queue of submitted SMILES
+        self.jobs_list = tk.Listbox(self, height=6, selectmode="extended", activestyle="none")
+        self.jobs_list.grid(row=5, column=0, columnspan=2, rowspan=2, sticky="nsew", pady=(8, 0))
+        self.rowconfigure(6, weight=1)
+
+        self.help_btn = ttk.Button(self, text="Help", command=self.on_help)
+        self.help_btn.grid(row=5, column=2, sticky="ne", pady=(8, 0))
+
+        self.exit_btn = ttk.Button(self, text="Exit", command=self.on_exit)
+        self.exit_btn.grid(row=6, column=2, sticky="se", pady=(8, 0))
 
         # Bind Enter to Search
         self.smiles_entry.bind("<Return>", lambda _e: self.on_search())
 
+        # Output files are written off the event loop
+        self.writer = OutputWriter("results")
+        self.master.protocol("WM_DELETE_WINDOW", self.on_exit)
+
+        # Worker thread <-> event loop
+        self._jobs: "queue.Queue[Optional[_Job]]" = queue.Queue()
+        self._events: "queue.Queue[tuple]" = queue.Queue()
+        self._all_jobs: Dict[int, _Job] = {}
+        self._current: Optional[_Job] = None
+        self._worker = threading.Thread(target=self._work, name="gui-worker", daemon=True)
+        self._worker.start()
+        self.after(POLL_MS, self._drain_events)
+
+        # As-you-type validation and speculative lookups
+        self._validator = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gui-validate")
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gui-prefetch")
+        self._prefetched: "OrderedDict[str, _Prefetch]" = OrderedDict()  # canonical SMILES -> lookup
+        self._speculative: Optional[_Prefetch] = None  # most recent, possibly in flight
+        self._prefetch_lock = threading.Lock()
+        self._validate_after: Optional[str] = None
+        self.smiles_var.trace_add("write", lambda *_: self._schedule_validate())
+        # Load RDKit while the user starts typing, not before the window shows
+        self._validator.submit(importlib.import_module, "src.rdkit_utils")
+
+    # ------------------------------------------------------------------
+    # UI actions (event loop)
+    # ------------------------------------------------------------------
+    def on_exit(self) -> None:
+        for job in self._all_jobs.values():
+            job.cancel.set()
+        self._jobs.put(None)
+        with self._prefetch_lock:
+            for entry in self._prefetched.values():
+                entry.cancel.set()
+        self._validator.shutdown(wait=False, cancel_futures=True)
+        self._prefetcher.shutdown(wait=False, cancel_futures=True)
+        self.writer.close()  # finish and sync pending writes
+        self.master.destroy()
+
     def on_help(self) -> None:
         messagebox.showinfo("Help", HELP_TEXT, parent=self)
 
@@ -66,18 +185,222 @@ class ChemReporterApp(ttk.Frame):
             messagebox.showwarning("Missing input", "Please enter a SMILES string.", parent=self)
             return
 
-        self.status_var.set("Fetching from PubChem…")
-        self.update_idletasks()
+        job = _Job(number=len(self._all_jobs), smiles=smiles)
+        self._all_jobs[job.number] = job
+        self.jobs_list.insert("end", self._describe(job))
+        self.smiles_var.set("")
+        self._jobs.put(job)
+        if self._current is None:
+            self.status_lbl.configure(foreground="green")
+            self.status_var.set("Queued…")
+
+    def on_cancel(self) -> None:
+        """Cancel the selected queued jobs, or else the running one."""
+        selected = [self._all_jobs[i] for i in self.jobs_list.curselection()]
+        targets = [j for j in selected if j.state == "queued"] or ([self._current] if self._current else [])
+        for job in targets:
+            job.cancel.set()
+            if job.state == "queued":
+                self._set_state(job, "cancelled")
+            else:
+                self.status_var.set("Cancelling…")
+
+    # ------------------------------------------------------------------
+    # Worker thread: never touches Tk, only posts events
+    # ------------------------------------------------------------------
+    def _work(self) -> None:
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            if job.cancel.is_set():
+                continue
+
+            def progress(stage: str, job: _Job = job) -> None:
+                if job.cancel.is_set():
+                    raise Cancelled()
+                self._events.put(("stage", job, stage))
+
+            self._events.put(("start", job, None))
+            try:
+                result = self._lookup(job, progress)
+                progress("write")
+                # 2D structure + metadata now; the 3D conformer follows in the background
+                out_dir = self.writer.submit(result, tiered=True).result()
+            except Cancelled:
+                self._events.put(("cancelled", job, None))
+            except Exception as e:
+                self._events.put(("error", job, e))
+            else:
+                self._events.put(("done", job, out_dir))
+
+    def _lookup(self, job: _Job, progress: Callable[[str], None]) -> Result:
+        """resolve() via the worker, reusing a speculative lookup of the same molecule if any."""
+        entry = self._claim_prefetch(job.smiles)
+        if entry is None:
+            return resolve_via_worker(job.smiles, progress=progress)
+
+        progress(RESOLVE_STAGES[0])
+        while not wait([entry.future], timeout=POLL_MS / 1000).done:
+            if job.cancel.is_set():
+                raise Cancelled()
+        try:
+            result = entry.future.result()
+        except Exception:
+            # The speculative lookup failed; do it for real (and report that error)
+            self._drop_prefetch(entry)
+            return resolve_via_worker(job.smiles, progress=progress)
+        progress(RESOLVE_STAGES[-1])
+        result = copy.deepcopy(result)  # write_outputs fills result.structure
+        result.input_smiles = job.smiles
+        return result
+
+    def _claim_prefetch(self, smiles: str) -> Optional[_Prefetch]:
+        from src.rdkit_utils import canonicalize_smiles
+
         try:
-            result = resolve(smiles)
-            out_dir = write_outputs(result)
-            self.status_var.set(f"Done. Saved to: {out_dir}")
-            messagebox.showinfo("Success", f"Output folder:\n{out_dir}", parent=self)
-        except Exception as e:
-            self.status_lbl.configure(foreground="red")
-            self.status_var.set("Failed.")
-            tb = "".join(traceback.format_exception(type(e), e, e.__traceback__))
-            messagebox.showerror("Error", f"An error occurred:\n\n{tb}", parent=self)
+            canonical = canonicalize_smiles(smiles)
+        except ValueError:
+            return None
+        with self._prefetch_lock:
+            entry = self._prefetched.get(canonical)
+            if entry is not None and entry.usable():
+                entry.claimed = True
+                self._prefetched.move_to_end(canonical)
+                return entry
+            # Searches come first: stop speculating on something else
+            spec = self._speculative
+            if spec is not None and not spec.claimed:
+                spec.cancel.set()
+            return None
+
+    def _drop_prefetch(self, entry: _Prefetch) -> None:
+        with self._prefetch_lock:
+            self._drop_prefetch_locked(entry)
+
+    def _drop_prefetch_locked(self, entry: _Prefetch) -> None:
+        for key, value in list(self._prefetched.items()):
+            if value is entry:
+                del self._prefetched[key]
+
+    def _validate(self, text: str) -> None:
+        """Validator thread: parse with RDKit and post the outcome."""
+        from src.rdkit_utils import canonicalize_smiles  # first call loads RDKit, off the event loop
+
+        try:
+            canonical = canonicalize_smiles(text)
+        except ValueError:
+            self._events.put(("invalid", text, None))
+        else:
+            self._events.put(("valid", text, canonical))
+
+    @staticmethod
+    def _speculate(entry: _Prefetch) -> Result:
+        """Prefetch thread: a lookup nobody asked for yet; abandoned if superseded."""
+        def progress(_stage: str) -> None:
+            if entry.cancel.is_set():
+                raise Cancelled()
+        return resolve_via_worker(entry.smiles, progress=progress)
+
+    # ------------------------------------------------------------------
+    # Event loop side
+    # ------------------------------------------------------------------
+    def _drain_events(self) -> None:
+        try:
+            while True:
+                kind, subject, payload = self._events.get_nowait()
+                if kind in ("valid", "invalid"):
+                    self._validated(kind, subject, payload)
+                else:
+                    self._handle(kind, subject, payload)
+        except queue.Empty:
+            pass
+        self.after(POLL_MS, self._drain_events)
+
+    def _schedule_validate(self) -> None:
+        """Debounce keystrokes: validate once typing pauses."""
+        if self._validate_after is not None:
+            self.after_cancel(self._validate_after)
+        self._validate_after = self.after(VALIDATE_DELAY_MS, self._validate_entry)
+
+    def _validate_entry(self) -> None:
+        self._validate_after = None
+        text = self.smiles_var.get().strip()
+        if not text:
+            self.valid_lbl.configure(text="")
+            return
+        self._validator.submit(self._validate, text)
+
+    def _validated(self, kind: str, text: str, canonical: Optional[str]) -> None:
+        if text != self.smiles_var.get().strip():
+            return  # typed on since; a newer check is coming
+        if kind == "invalid":
+            self.valid_lbl.configure(text="✗ not a valid SMILES", foreground="red")
+            return
+        self.valid_lbl.configure(text="✓ valid SMILES", foreground="green")
+        self._start_prefetch(text, canonical)
+
+    def _start_prefetch(self, smiles: str, canonical: str) -> None:
+        if self._current is not None or not self._jobs.empty():
+            return  # low priority: never compete with a running search
+        with self._prefetch_lock:
+            cached = self._prefetched.get(canonical)
+            if cached is not None and cached.usable():
+                self._prefetched.move_to_end(canonical)
+                return
+            spec = self._speculative
+            if spec is not None and not spec.claimed and not spec.future.done():
+                spec.cancel.set()  # superseded by what the user typed since
+                self._drop_prefetch_locked(spec)
+            entry = self._speculative = _Prefetch(smiles)
+            entry.future = self._prefetcher.submit(self._speculate, entry)
+            self._prefetched[canonical] = entry
+            while len(self._prefetched) > PREFETCH_CACHE_SIZE:
+                self._prefetched.popitem(last=False)
+
+    def _handle(self, kind: str, job: _Job, payload: Any) -> None:
+        if kind == "start":
+            self._current = job
+            self.progress.configure(value=0)
+            self.cancel_btn.configure(state="normal")
+            self.status_lbl.configure(foreground="green")
+            self._set_state(job, "running")
+            return
+        if kind == "stage":
+            self.progress.configure(value=STAGES.index(payload))
+            self.status_var.set(f"{job.smiles}: {STAGE_LABELS.get(payload, payload)}")
+            return
+
+        # Job finished one way or another
+        self._current = None
+        self.cancel_btn.configure(state="disabled")
+        if kind == "done":
+            self.progress.configure(value=len(STAGES))
+            self._set_state(job, f"done → {payload}")
+            self.status_var.set(f"Done. Saved to: {payload} (3D structure in progress)")
+        elif kind == "cancelled":
+            self.progress.configure(value=0)
+            self._set_state(job, "cancelled")
+            self.status_var.set("Cancelled.")
+        else:
+            self.progress.configure(value=0)
+            self._set_state(job, f"failed: {payload}")
+            self._show_error(payload)
+
+    def _set_state(self, job: _Job, state: str) -> None:
+        job.state = state
+        self.jobs_list.delete(job.number)
+        self.jobs_list.insert(job.number, self._describe(job))
+
+    @staticmethod
+    def _describe(job: _Job) -> str:
+        return f"{job.smiles}  [{job.state}]"
+
+    def _show_error(self, e: BaseException) -> None:
+        self.status_lbl.configure(foreground="red")
+        self.status_var.set("Failed.")
+        tb = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+        messagebox.showerror("Error", f"An error occurred:\n\n{tb}", parent=self)
 
 
 def main() -> None:
@@ -0,0 +1,270 @@
+# src/catalog.py
+"""
+Indexed catalog of a results folder.
+
+`write_outputs` records every compound folder it writes in
+<results>/catalog.sqlite, so questions like "was CID 2244 already done?" or
+"everything melting between 120 and 160 °C" are answered from B-tree
+indexes instead of walking and parsing every metadata.json:
+
+    entries         one row per compound folder; indexed on CID, canonical
+                    SMILES, preferred name and IUPAC name
+    melting_points  numeric bounds (°C) of each melting-point entry;
+                    indexed on low and high
+
+A catalog for a tree written before it existed is built with `rebuild`
+(scripts/query_results.py --rebuild).
+
+Sharded runs (`run_batch.py --shard`) may share one results directory over
+a network filesystem, where SQLite's locking cannot be trusted, so each
+shard indexes into its own catalog_<tag>.sqlite; `merge-summaries` folds
+those into catalog.sqlite (`merge`).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from .pubchem import melting_point_bounds
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FILENAME = "catalog.sqlite"
+
+
+def catalog_filename(tag: str = "") -> str:
+    """catalog.sqlite, or catalog_<tag>.sqlite for one shard of a sharded run."""
+    return f"catalog_{tag}.sqlite" if tag else CATALOG_FILENAME
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    folder           TEXT PRIMARY KEY,
+    cid              INTEGER,
+    canonical_smiles TEXT,
+    input_smiles     TEXT,
+    preferred_name   TEXT COLLATE NOCASE,
+    iupac_name       TEXT COLLATE NOCASE,
+    mp_low_c         REAL,
+    mp_high_c        REAL,
+    created_at       TEXT,
+    indexed_at       TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_cid ON entries(cid);
+CREATE INDEX IF NOT EXISTS entries_smiles ON entries(canonical_smiles);
+CREATE INDEX IF NOT EXISTS entries_name ON entries(preferred_name);
+CREATE INDEX IF NOT EXISTS entries_iupac ON entries(iupac_name);
+
+CREATE TABLE IF NOT EXISTS melting_points (
+    folder  TEXT NOT NULL REFERENCES entries(folder) ON DELETE CASCADE,
+    low_c   REAL NOT NULL,
+    high_c  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS melting_points_low ON melting_points(low_c);
+CREATE INDEX IF NOT EXISTS melting_points_high ON melting_points(high_c);
+CREATE INDEX IF NOT EXISTS melting_points_folder ON melting_points(folder);
+"""
+
+_MAX_CHAR = "\U0010ffff"
+
+_COLUMNS = ("folder", "cid", "canonical_smiles", "input_smiles", "preferred_name",
+            "iupac_name", "mp_low_c", "mp_high_c", "created_at")
+
+
+class ResultsCatalog:
+    """
+    SQLite index of the compound folders under one results directory.
+    Thread-safe; every `update` is its own small transaction (WAL mode, so
+    commits are cheap and readers never block the writer).
+    """
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def update(self, folder: str, metadata: Dict[str, Any]) -> None:
+        """Insert or replace the entry for `folder` from its metadata.json content."""
+        from .rdkit_utils import canonicalize_smiles
+
+        smiles = metadata.get("input_smiles") or ""
+        try:
+            canonical = canonicalize_smiles(smiles) if smiles else None
+        except Exception:
+            canonical = None
+        bounds = [
+            melting_point_bounds(mp.get("value"), mp.get("unit"))
+            for mp in metadata.get("melting_points") or []
+        ]
+        bounds = [(low, high) for low, high in bounds if low is not None]
+        row = (
+            folder, metadata.get("cid"), canonical, smiles, metadata.get("preferred_name"),
+            metadata.get("iupac_name"),
+            min((low for low, _ in bounds), default=None),
+            max((high for _, high in bounds), default=None),
+            metadata.get("created_at"),
+            datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        )
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM melting_points WHERE folder = ?", (folder,))
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO entries ({', '.join(_COLUMNS)}, indexed_at) "
+                f"VALUES ({', '.join('?' * (len(_COLUMNS) + 1))})",
+                row,
+            )
+            self._conn.executemany("INSERT INTO melting_points VALUES (?, ?, ?)",
+                                   [(folder, low, high) for low, high in bounds])
+
+    def remove(self, folder: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries WHERE folder = ?", (folder,))
+
+    def merge(self, path: str | os.PathLike, folders_in: Optional[str | os.PathLike] = None) -> int:
+        """
+        Copy every entry of another catalog (e.g. a shard's) into this one,
+        replacing entries for the same folder; returns the number copied.
+
+        Folder names are relative to the catalog's directory. `folders_in`
+        is where the other catalog's folders live if not next to this one
+        (a shard's results directory whose folders were not gathered here);
+        its entries are then stored relative to this catalog.
+        """
+        prefix = ""
+        if folders_in is not None:
+            here, there = os.path.dirname(self.path), os.path.abspath(folders_in)
+            try:
+                prefix = os.path.relpath(there, here)
+            except ValueError:  # another drive (Windows)
+                prefix = there
+            prefix = "" if prefix == os.curdir else prefix + os.sep
+        with self._lock:
+            self._conn.execute("ATTACH DATABASE ? AS other", (os.fspath(path),))
+            try:
+                with self._conn:
+                    self._conn.execute("DELETE FROM melting_points WHERE folder IN "
+                                       "(SELECT ? || folder FROM other.entries)", (prefix,))
+                    copied = self._conn.execute(
+                        f"INSERT OR REPLACE INTO entries ({', '.join(_COLUMNS)}, indexed_at) "
+                        f"SELECT ? || folder, {', '.join(_COLUMNS[1:])}, indexed_at FROM other.entries", (prefix,)
+                    ).rowcount
+                    self._conn.execute("INSERT INTO melting_points (folder, low_c, high_c) "
+                                       "SELECT ? || folder, low_c, high_c FROM other.melting_points",
+                                       (prefix,))
+            finally:
+                self._conn.execute("DETACH DATABASE other")
+        return copied
+
+    def rebuild(self, base_dir: str | os.PathLike) -> int:
+        """Index every <base_dir>/*/metadata.json; drops entries whose folder is gone."""
+        seen = set()
+        for name in sorted(os.listdir(base_dir)):
+            meta_path = os.path.join(base_dir, name, "metadata.json")
+            if not os.path.isfile(meta_path):
+                continue
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    self.update(name, json.load(f))
+                seen.add(name)
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping %s: %s", meta_path, e)
+        with self._lock:
+            stale = [r[0] for r in self._conn.execute("SELECT folder FROM entries") if r[0] not in seen]
+        for folder in stale:
+            self.remove(folder)
+        return len(seen)
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def query(
+        self,
+        cid: Optional[int] = None,
+        smiles: Optional[str] = None,
+        name: Optional[str] = None,
+        mp_min: Optional[float] = None,
+        mp_max: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Entries matching every given criterion.
+
+        `smiles` is canonicalized before the lookup. `name` matches the
+        preferred or IUPAC name, case-insensitively; a trailing "*" makes it
+        a prefix match. `mp_min` / `mp_max` (°C) select compounds with a
+        melting-point entry overlapping that interval.
+        """
+        where, params = [], []
+        if cid is not None:
+            where.append("e.cid = ?")
+            params.append(int(cid))
+        if smiles:
+            from .rdkit_utils import canonicalize_smiles
+
+            where.append("e.canonical_smiles = ?")
+            params.append(canonicalize_smiles(smiles))
+        if name:
+            if name.endswith("*"):
+                # Prefix as an index range: [prefix, prefix + highest code point)
+                lo, hi = name[:-1], name[:-1] + _MAX_CHAR
+                where.append("((e.preferred_name >= ? AND e.preferred_name < ?) "
+                             "OR (e.iupac_name >= ? AND e.iupac_name < ?))")
+                params += [lo, hi, lo, hi]
+            else:
+                where.append("(e.preferred_name = ? OR e.iupac_name = ?)")
+                params += [name, name]
+        if mp_min is not None or mp_max is not None:
+            bounds, mp_params = [], []
+            if mp_max is not None:
+                bounds.append("m.low_c <= ?")
+                mp_params.append(float(mp_max))
+            if mp_min is not None:
+                bounds.append("m.high_c >= ?")
+                mp_params.append(float(mp_min))
+            where.append(f"e.folder IN (SELECT m.folder FROM melting_points m WHERE {' AND '.join(bounds)})")
+            params += mp_params
+
+        sql = f"SELECT {', '.join('e.' + c for c in _COLUMNS)} FROM entries e"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY e.folder"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, params)]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+_catalogs: Dict[str, ResultsCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def catalog_for(base_dir: str | os.PathLike, filename: str = CATALOG_FILENAME) -> ResultsCatalog:
+    """The shared catalog of a results directory (opened once per process)."""
+    path = os.path.abspath(os.path.join(base_dir, filename))
+    with _catalogs_lock:
+        catalog = _catalogs.get(path)
+        if catalog is None:
+            catalog = _catalogs[path] = ResultsCatalog(path)
+        return catalog
@@ -0,0 +1,144 @@
+# src/checkpoint.py
+"""
+Checkpoint journal for resumable batch runs.
+
+One journal per input file lives in <results>/.checkpoints/, named after the
+input's content hash, so the same file is recognized on the next run even
+if it was renamed, and an edited file starts from scratch.
+
+The journal is an append-only JSON-lines file:
+    {"input": ..., "sha256": ..., "started": ...}        header
+    {"row": 17, "record": {...summary row...}}           one per finished row
+    {"complete": true, "finished": ...}                  written at the end
+
+Each row is a single write() followed by a flush, so a crash can at worst
+leave a truncated last line, which `load` ignores.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict
+
+_HASH_CHUNK = 1 << 20
+
+
+def file_sha256(path: str | os.PathLike) -> str:
+    """SHA-256 of a file's bytes, read in 1 MiB chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class CheckpointJournal:
+    """
+    Records finished rows of one batch input so an interrupted run can skip
+    them. Use `for_input` to locate the journal, `load` to read what a
+    previous run finished, then `start` / `record` / `mark_complete`.
+
+    fsync is batched (every `fsync_every` rows or `fsync_interval` seconds):
+    a flushed row survives a process crash; a power loss may lose the last
+    few rows, which are then simply redone.
+    """
+
+    def __init__(self, path: str | os.PathLike, input_path: str = "", input_hash: str = "",
+                 fsync_every: int = 200, fsync_interval: float = 2.0) -> None:
+        self.path = Path(path)
+        self.input_path = input_path
+        self.input_hash = input_hash
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.complete = False
+        self._fh = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    @classmethod
+    def for_input(cls, input_path: str | os.PathLike, results_dir: str | os.PathLike,
+                  tag: str = "") -> "CheckpointJournal":
+        """Journal for `input_path` under `results_dir`; `tag` separates e.g. shards."""
+        digest = file_sha256(input_path)
+        name = f"{Path(input_path).name}-{digest[:16]}{('-' + tag) if tag else ''}.jsonl"
+        return cls(Path(results_dir) / ".checkpoints" / name, str(input_path), digest)
+
+    def load(self) -> Dict[int, Dict[str, Any]]:
+        """
+        Return {row_index: summary record} for every finished row, and set
+        `complete` if the previous run reached the end.
+        """
+        done: Dict[int, Dict[str, Any]] = {}
+        self.complete = False
+        if not self.path.exists():
+            return done
+        with self.path.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # truncated tail from a crash
+                if "row" in entry:
+                    done[int(entry["row"])] = entry["record"]
+                elif entry.get("complete"):
+                    self.complete = True
+        return done
+
+    def start(self, fresh: bool = False) -> None:
+        """Open for appending; `fresh=True` discards previous entries."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if fresh and self.path.exists():
+            self.path.unlink()
+        new = not self.path.exists()
+        torn = False
+        if not new and self.path.stat().st_size:
+            with self.path.open("rb") as fh:
+                fh.seek(-1, os.SEEK_END)
+                torn = fh.read(1) != b"\n"
+        self._fh = self.path.open("a", encoding="utf-8", newline="\n")
+        if torn:
+            self._fh.write("\n")  # close off a line cut short by a crash
+        if new:
+            self._append({
+                "input": self.input_path,
+                "sha256": self.input_hash,
+                "started": datetime.now().isoformat(timespec="seconds"),
+            })
+        self.complete = False
+
+    def record(self, row: int, record: Dict[str, Any]) -> None:
+        """Mark input row `row` as finished with its summary record."""
+        self._append({"row": row, "record": record})
+        self._unsynced += 1
+        now = time.monotonic()
+        if self._unsynced >= self.fsync_every or now - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def mark_complete(self) -> None:
+        self._append({"complete": True, "finished": datetime.now().isoformat(timespec="seconds")})
+        self.complete = True
+        self.sync()
+
+    def sync(self) -> None:
+        if self._fh is None:
+            return
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self.sync()
+            self._fh.close()
+            self._fh = None
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        if self._fh is None:
+            raise RuntimeError("CheckpointJournal.start() must be called first.")
+        self._fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._fh.flush()
@@ -0,0 +1,186 @@
+# src/columnar.py
+"""
+Columnar (Parquet / Arrow) export of batch results for analytics.
+
+One row per compound with flat columns for filtering (CID, names,
+canonical SMILES, melting-point range in °C, error, stage timings, and the
+RDKit descriptors of the run, if any) and the individual melting-point
+entries as a nested list column:
+
+    import pyarrow.parquet as pq
+    pq.read_table("results/batch_20250101.parquet", columns=["cid", "mp_low_c"])
+
+Rows are buffered and written `row_group_size` at a time, so readers can
+skip row groups and columns they do not need, and memory stays bounded.
+Requires the optional `pyarrow` package.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+from .io_utils import _iter_melting_points
+from .pubchem import melting_point_bounds
+
+logger = logging.getLogger(__name__)
+
+COLUMNAR_SUFFIXES = (".parquet", ".arrow", ".feather")
+
+_MP_FIELDS = ("value", "unit", "low_c", "high_c", "source", "notes", "source_url")
+_TIMING_STAGES = ("resolve", "structure", "write")
+
+
+def _schema(descriptors: Sequence[str] = ()):
+    import pyarrow as pa
+
+    melting_point = pa.struct([
+        ("value", pa.string()),
+        ("unit", pa.string()),
+        ("low_c", pa.float64()),
+        ("high_c", pa.float64()),
+        ("source", pa.string()),
+        ("notes", pa.string()),
+        ("source_url", pa.string()),
+    ])
+    return pa.schema([
+        ("row", pa.int64()),
+        ("input_smiles", pa.string()),
+        ("canonical_smiles", pa.string()),
+        ("cid", pa.int64()),
+        ("iupac_name", pa.string()),
+        ("title", pa.string()),
+        ("mp_low_c", pa.float64()),
+        ("mp_high_c", pa.float64()),
+        ("melting_points", pa.list_(melting_point)),
+        ("num_confs", pa.int32()),
+        ("error", pa.string()),
+        ("resolve_s", pa.float64()),
+        ("structure_s", pa.float64()),
+        ("write_s", pa.float64()),
+        ("embed_s", pa.float64()),
+        ("elapsed_s", pa.float64()),
+        *((name, pa.float64()) for name in descriptors),
+    ])
+
+
+def _float(value: Any) -> Optional[float]:
+    try:
+        return None if value in (None, "") else float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def compound_row(record: Dict[str, Any], result: Any = None,
+                 timings: Optional[Dict[str, float]] = None,
+                 descriptors: Sequence[str] = ()) -> Dict[str, Any]:
+    """
+    Build one columnar row from a batch summary record, the resolved
+    `Result` (None if the row failed before lookup), the stage timings and
+    the `descriptors` columns of the record.
+    """
+    from .rdkit_utils import canonicalize_smiles
+
+    smiles = record.get("input_smiles") or ""
+    try:
+        canonical = canonicalize_smiles(smiles) if record.get("valid") else None
+    except Exception:
+        canonical = None
+
+    entries: List[Dict[str, Any]] = []
+    for mp in _iter_melting_points(getattr(result, "melting_points", None)):
+        low, high = melting_point_bounds(mp["value"], mp["unit"])
+        entries.append({**mp, "low_c": low, "high_c": high})
+    lows = [e["low_c"] for e in entries if e["low_c"] is not None]
+    highs = [e["high_c"] for e in entries if e["high_c"] is not None]
+
+    timings = timings or {}
+    row = {
+        "row": int(record["row"]),
+        "input_smiles": smiles,
+        "canonical_smiles": canonical,
+        "cid": getattr(result, "cid", None) or (int(record["cid"]) if str(record.get("cid", "")).isdigit() else None),
+        "iupac_name": getattr(result, "iupac_name", None) or record.get("iupac_name") or None,
+        "title": getattr(result, "preferred_name", None),
+        "mp_low_c": min(lows) if lows else None,
+        "mp_high_c": max(highs) if highs else None,
+        "melting_points": [{f: e[f] for f in _MP_FIELDS} for e in entries],
+        "num_confs": int(record["num_confs"]) if str(record.get("num_confs", "")).isdigit() else None,
+        "error": record.get("error") or None,
+        "embed_s": _float(record.get("embed_s")),
+        "elapsed_s": _float(record.get("elapsed_s")),
+    }
+    for stage in _TIMING_STAGES:
+        row[f"{stage}_s"] = timings.get(stage)
+    for name in descriptors:
+        row[name] = _float(record.get(name))
+    return row
+
+
+class ColumnarWriter:
+    """
+    Append compound rows to a Parquet file (or an Arrow IPC file for
+    .arrow / .feather paths), one row group per `row_group_size` rows.
+    `descriptors` adds one float column per descriptor name.
+    Call `close` to write the last group and the file footer.
+    """
+
+    def __init__(self, path: str | os.PathLike, row_group_size: int = 50_000,
+                 descriptors: Sequence[str] = ()) -> None:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as exc:
+            raise ImportError(
+                "Columnar export requires the 'pyarrow' package "
+                "(conda install -c conda-forge pyarrow)."
+            ) from exc
+        self.path = os.path.abspath(path)
+        self.row_group_size = max(1, row_group_size)
+        self.rows_written = 0
+        self._schema = _schema(descriptors)
+        self._rows: List[Dict[str, Any]] = []
+        self._writer: Any = None
+        self._closed = False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self._rows.append(row)
+        if len(self._rows) >= self.row_group_size:
+            self._flush()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._flush()
+        if self._writer is None:  # no rows at all: still leave a readable, empty file
+            self._open()
+        self._writer.close()
+
+    def _open(self) -> None:
+        if self.path.lower().endswith((".arrow", ".feather")):
+            import pyarrow.ipc as ipc
+
+            self._writer = ipc.new_file(self.path, self._schema)
+        else:
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(self.path, self._schema, compression="zstd")
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+        import pyarrow as pa
+
+        if self._writer is None:
+            self._open()
+        table = pa.Table.from_pylist(self._rows, schema=self._schema)
+        self._writer.write_table(table)
+        self.rows_written += len(self._rows)
+        self._rows = []
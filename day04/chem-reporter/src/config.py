@@ -1,48 +1,71 @@
 # src/config.py
 from __future__ import annotations
 import os
-from dataclasses import dataclass
-from typing import Optional
-from dotenv import load_dotenv
+from dataclasses import dataclass, field
+from typing import Any, Optional
 
-load_dotenv()  # load environment variables from .env if present
+# .env is read (python-dotenv) the first time the settings below are used,
+# not at import, so modules that never touch the network do not pay for it.
 
 # ------------------------------------------------------------------
 # Network settings
 # ------------------------------------------------------------------
-# - Increase TIMEOUT_SECONDS if your network is slow or PubChem is laggy.
-# - USER_AGENT is sent with every HTTP request; keep it informative.
-TIMEOUT_SECONDS = 15
-USER_AGENT = "Chem-Reporter/1.0 (Windows; Tkinter)"
+# - Increase _DEFAULT_TIMEOUT_SECONDS if your network is slow or PubChem is laggy.
+# - _DEFAULT_USER_AGENT is sent with every HTTP request; keep it informative.
+_DEFAULT_TIMEOUT_SECONDS = 15
+_DEFAULT_USER_AGENT = "Chem-Reporter/1.0 (Windows; Tkinter)"
 
 # Backward compatibility with older code
-HTTP_TIMEOUT = TIMEOUT_SECONDS
-DEFAULT_TIMEOUT = TIMEOUT_SECONDS  # <-- add this to avoid NameError
+DEFAULT_TIMEOUT = _DEFAULT_TIMEOUT_SECONDS  # <-- add this to avoid NameError
 
 # ------------------------------------------------------------------
 # Dataclass-based configuration (optional but kept for clarity)
 # ------------------------------------------------------------------
+def _env(name: str, default: Any) -> Any:
+    if isinstance(default, bool):
+        return field(default_factory=lambda: os.getenv(name, "1" if default else "").strip().lower()
+                     in ("1", "true", "yes", "on"))
+    return field(default_factory=lambda: type(default)(os.getenv(name, default)))
+
 @dataclass(frozen=True)
 class Settings:
-    http_timeout: int = int(os.getenv("HTTP_TIMEOUT", TIMEOUT_SECONDS))
-    user_agent: str = os.getenv("USER_AGENT", USER_AGENT)
-    pubchem_base: str = os.getenv("PUBCHEM_BASE", "https://pubchem.ncbi.nlm.nih.gov/rest/pug")
-    pugview_base: str = os.getenv("PUGVIEW_BASE", "https://pubchem.ncbi.nlm.nih.gov/rest/pug_view")
+    http_timeout: int = _env("HTTP_TIMEOUT", _DEFAULT_TIMEOUT_SECONDS)
+    user_agent: str = _env("USER_AGENT", _DEFAULT_USER_AGENT)
+    pubchem_base: str = _env("PUBCHEM_BASE", "https://pubchem.ncbi.nlm.nih.gov/rest/pug")
+    pugview_base: str = _env("PUGVIEW_BASE", "https://pubchem.ncbi.nlm.nih.gov/rest/pug_view")
+    # On-disk PubChem response cache (src/http_cache.py); empty = off
+    cache_dir: str = _env("PUBCHEM_CACHE", "")
+    # Answer only from the cache, never touch the network
+    offline: bool = _env("PUBCHEM_OFFLINE", False)
 
     @classmethod
     def load(cls) -> "Settings":
+        from dotenv import load_dotenv
+
+        load_dotenv()  # load environment variables from .env if present
         # Future: validation or .env schema
         return cls()
 
-settings = Settings.load()
+# expose runtime config expected by other modules:
+#   settings, USER_AGENT, TIMEOUT_SECONDS, HTTP_TIMEOUT
+# (resolved on first access, see __getattr__)
+_settings: Optional[Settings] = None
 
-# expose runtime config expected by other modules
-USER_AGENT = settings.user_agent
-TIMEOUT_SECONDS = settings.http_timeout
-HTTP_TIMEOUT = settings.http_timeout
+def __getattr__(name: str) -> Any:
+    global _settings
+    if name not in ("settings", "USER_AGENT", "TIMEOUT_SECONDS", "HTTP_TIMEOUT"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _settings is None:
+        _settings = Settings.load()
+    return {
+        "settings": _settings,
+        "USER_AGENT": _settings.user_agent,
+        "TIMEOUT_SECONDS": _settings.http_timeout,
+        "HTTP_TIMEOUT": _settings.http_timeout,
+    }[name]
 # ------------------------------------------------------------------
 # Developer note:
 # TIMEOUT_SECONDS and USER_AGENT are global defaults used by all
-# network utilities. Change them here if needed.
+# network utilities. Change the _DEFAULT_* values above if needed.
 # Settings dataclass provides optional .env overrides for advanced use.
 # ------------------------------------------------------------------
@@ -0,0 +1,480 @@
+# src/daemon.py
+"""
+Long-lived local worker.
+
+Every launcher action used to start a fresh process that paid conda
+activation plus the RDKit / requests / dotenv imports before doing any work.
+The worker is started once and keeps all of that loaded, together with the
+pooled PubChem HTTP session and a cache of recent lookups. Clients talk to it
+over a local socket (Unix domain socket, or a named pipe on Windows):
+
+    python scripts/worker.py start          # background worker
+    python scripts/worker.py batch input/test_molecules.csv --rdkit-workers 0
+    python scripts/worker.py status | stop
+
+    from src import daemon
+    result = daemon.resolve_via_worker("CCO", progress=print)
+
+A request is one dict ({"op": "resolve", "smiles": ...}); the worker answers
+with a stream of (kind, payload) events, "progress" / "log" while working and
+a final "result" or "error". If no worker is running, the client helpers
+raise WorkerUnavailable internally and do the job in-process instead.
+
+Connection details (address and a random auth key) live in worker.json in a
+per-user runtime directory ($CHEM_REPORTER_RUNTIME, default
+<tmp>/chem-reporter-<user>), readable only by that user.
+
+This module imports only the standard library at the top, so clients stay
+fast to start; the worker imports the heavy modules when it starts.
+"""
+from __future__ import annotations
+
+import contextlib
+import copy
+import getpass
+import importlib.util
+import io
+import json
+import logging
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+INFO_FILENAME = "worker.json"
+
+EventCallback = Callable[[str, Any], None]
+
+
+class WorkerUnavailable(RuntimeError):
+    """No worker is running (or it cannot be reached)."""
+
+
+class WorkerError(RuntimeError):
+    """The worker ran the job and it failed; the message is the remote error."""
+
+
+def runtime_dir() -> Path:
+    """Per-user directory holding the worker's address and auth key."""
+    base = os.environ.get("CHEM_REPORTER_RUNTIME")
+    if base:
+        return Path(base)
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = "user"
+    return Path(tempfile.gettempdir()) / f"chem-reporter-{user}"
+
+
+def _address() -> tuple[str, str]:
+    if sys.platform == "win32":
+        try:
+            user = getpass.getuser()
+        except Exception:
+            user = "user"
+        return rf"\\.\pipe\chem-reporter-{user}", "AF_PIPE"
+    return str(runtime_dir() / "worker.sock"), "AF_UNIX"
+
+
+def _load_run_batch() -> Any:
+    """scripts/run_batch.py as a module (it is a script, not part of src)."""
+    module = sys.modules.get("chem_reporter_run_batch")
+    if module is None:
+        path = PROJECT_ROOT / "scripts" / "run_batch.py"
+        spec = importlib.util.spec_from_file_location("chem_reporter_run_batch", path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+class _LineWriter(io.TextIOBase):
+    """File-like object passing each complete line of text to `emit`."""
+
+    def __init__(self, emit: Callable[[str], None]) -> None:
+        self._emit = emit
+        self._buffer = ""
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            self._emit(line)
+        return len(text)
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._emit(self._buffer)
+            self._buffer = ""
+
+
+class _EmitHandler(logging.Handler):
+    def __init__(self, emit: Callable[[str], None]) -> None:
+        super().__init__()
+        self._emit = emit
+        self.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._emit(self.format(record))
+        except Exception:
+            pass
+
+
+def _run_batch_main(argv: List[str], log: Callable[[str], None]) -> int:
+    """run_batch.py's main with its output sent line by line to `log`; returns the exit code."""
+    run_batch = _load_run_batch()
+    out = _LineWriter(log)
+    handler = _EmitHandler(log)
+    root = logging.getLogger()
+    root.addHandler(handler)
+    try:
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+            try:
+                run_batch.main(argv)
+                code = 0
+            except SystemExit as e:  # argparse errors, --help
+                code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            finally:
+                out.flush()
+    finally:
+        root.removeHandler(handler)
+    return code
+
+
+def _batch_child(argv: List[str], cwd: str, conn: Connection) -> None:
+    """Child-process side of a worker batch: run it in `cwd`, sending lines then the exit code."""
+    def log(line: str) -> None:
+        with contextlib.suppress(OSError):
+            conn.send(("log", line))
+
+    code = 1
+    try:
+        os.chdir(cwd)
+        code = _run_batch_main(argv, log)
+    except Exception as e:
+        log(f"[ERROR] {type(e).__name__}: {e}")
+    finally:
+        with contextlib.suppress(OSError):
+            conn.send(("exit", code))
+        conn.close()
+
+
+# Imported once by the fork server, so batch children start warm
+_BATCH_PRELOAD = [f"{__package__}.{name}" for name in ("rdkit_utils", "pipeline", "pubchem")]
+
+
+def _run_batch_child(argv: List[str], cwd: str, log: Callable[[str], None]) -> int:
+    """
+    Run `_run_batch_main` in a child process of the worker, so its working
+    directory, stdout/stderr redirection and log handler never touch the
+    worker's other threads. The worker itself is never forked: its lookup
+    threads may hold locks (logging, the HTTP session) that a forked child
+    would inherit held. Children come from a fork server instead, a
+    single-threaded process that keeps the heavy imports loaded; where
+    there is none they are spawned and import them themselves.
+    """
+    import multiprocessing
+
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(_BATCH_PRELOAD)
+    else:
+        ctx = multiprocessing.get_context("spawn")
+    reader, writer = ctx.Pipe(duplex=False)
+    child = ctx.Process(target=_batch_child, args=(argv, cwd, writer), name="worker-batch", daemon=True)
+    child.start()
+    writer.close()
+    code: Optional[int] = None
+    with reader:
+        while True:
+            try:
+                kind, payload = reader.recv()
+            except EOFError:
+                break
+            if kind == "exit":
+                code = payload
+            else:
+                log(payload)
+    child.join()
+    if code is None:  # the child died before reporting
+        code = child.exitcode or 1
+    return code
+
+
+# ----------------------------------------------------------------------
+# Worker (server side)
+# ----------------------------------------------------------------------
+class WorkerDaemon:
+    """
+    Serves requests on the local socket, one thread per connection.
+
+    Lookups run concurrently; batch runs are serialized (each one already
+    uses every core) and each runs in a child process, in the client's
+    working directory, so nothing it changes reaches the lookups.
+    With `idle_timeout` (seconds) the worker exits after that long with no
+    requests. Lookups are cached for `cache_ttl` seconds (the last
+    `cache_size` molecules), so a long-lived worker still sees PubChem
+    updates.
+    """
+
+    def __init__(self, idle_timeout: Optional[float] = None, cache_size: int = 256,
+                 cache_ttl: float = 3600.0) -> None:
+        self.idle_timeout = idle_timeout
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        # canonical SMILES -> (time.monotonic() when cached, Result)
+        self._cache: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._batch_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._active = 0
+        self._jobs = 0
+        self._started = time.time()
+        self._last_request = time.monotonic()
+        self._authkey = secrets.token_bytes(32)
+        self._listener: Optional[Listener] = None
+        self._address = _address()
+
+    def serve_forever(self) -> None:
+        if is_running():
+            raise RuntimeError("A chem-reporter worker is already running.")
+        self._warm_up()
+        address, family = self._address
+        directory = runtime_dir()
+        directory.mkdir(parents=True, exist_ok=True, mode=0o700)
+        if family == "AF_UNIX" and os.path.exists(address):
+            os.unlink(address)  # left behind by a worker that died
+        self._listener = Listener(address, family=family, authkey=self._authkey)
+        self._write_info(address, family)
+        if self.idle_timeout:
+            threading.Thread(target=self._watch_idle, name="worker-idle", daemon=True).start()
+        logger.info("Chem-reporter worker %s listening on %s", os.getpid(), address)
+        try:
+            while not self._stopping.is_set():
+                try:
+                    conn = self._listener.accept()
+                except AuthenticationError:
+                    continue
+                except OSError:
+                    if self._stopping.is_set():
+                        break
+                    raise
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self._listener.close()
+            info = directory / INFO_FILENAME
+            with contextlib.suppress(OSError):
+                if json.loads(info.read_text())["pid"] == os.getpid():
+                    info.unlink()
+            logger.info("Chem-reporter worker stopped")
+
+    def stop(self) -> None:
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        # accept() is not interrupted by close() on every platform: wake it up
+        with contextlib.suppress(Exception):
+            address, family = self._address
+            Client(address, family=family, authkey=self._authkey).close()
+
+    def _warm_up(self) -> None:
+        """Import everything a job needs, so the first request is as fast as the rest."""
+        t0 = time.perf_counter()
+        from . import config, io_utils, pipeline, pubchem, rdkit_utils  # noqa: F401
+        rdkit_utils.canonicalize_smiles("c1ccccc1O")
+        pubchem._session()  # requests + .env
+        _load_run_batch()
+        logger.info("Worker warmed up in %.1f s", time.perf_counter() - t0)
+
+    def _write_info(self, address: str, family: str) -> None:
+        info = runtime_dir() / INFO_FILENAME
+        tmp = info.with_suffix(".tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"address": address, "family": family, "pid": os.getpid(),
+                       "authkey": self._authkey.hex()}, f)
+        os.replace(tmp, info)
+
+    def _watch_idle(self) -> None:
+        while not self._stopping.wait(min(self.idle_timeout, 30.0)):
+            with self._lock:
+                idle = self._active == 0 and time.monotonic() - self._last_request > self.idle_timeout
+            if idle:
+                logger.info("Idle for %.0f s, shutting down", self.idle_timeout)
+                self.stop()
+
+    def _handle(self, conn: Connection) -> None:
+        with conn:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                self._active += 1
+                self._jobs += 1
+            op = request.get("op") if isinstance(request, dict) else None
+            try:
+                handler = getattr(self, f"_op_{op}", None)
+                if handler is None:
+                    raise ValueError(f"Unknown request: {op!r}")
+                value = handler(request, lambda kind, payload: conn.send((kind, payload)))
+                conn.send(("result", value))
+            except (EOFError, ConnectionError):
+                logger.info("Client went away during %s", op)
+            except Exception as e:
+                with contextlib.suppress(OSError):
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._last_request = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+    def _op_ping(self, request: Dict[str, Any], emit: EventCallback) -> Dict[str, Any]:
+        with self._lock:
+            return {"pid": os.getpid(), "uptime_s": round(time.time() - self._started, 1),
+                    "requests": self._jobs, "cached": len(self._cache)}
+
+    def _op_shutdown(self, request: Dict[str, Any], emit: EventCallback) -> str:
+        threading.Thread(target=self.stop, daemon=True).start()
+        return "stopping"
+
+    def _op_resolve(self, request: Dict[str, Any], emit: EventCallback) -> Any:
+        """pubchem.resolve, answered from the cache when the molecule was looked up before."""
+        from .pubchem import resolve
+        from .rdkit_utils import canonicalize_smiles
+
+        smiles = request["smiles"]
+        try:
+            key = canonicalize_smiles(smiles)
+        except ValueError:
+            key = None
+        with self._lock:
+            entry = self._cache.get(key) if key else None
+            cached = None
+            if entry is not None:
+                if time.monotonic() - entry[0] < self.cache_ttl:
+                    cached = entry[1]
+                    self._cache.move_to_end(key)
+                else:
+                    del self._cache[key]  # expired: look it up again
+        if cached is not None:
+            result = copy.deepcopy(cached)
+            result.input_smiles = smiles
+            return result
+        # A client that disconnects makes emit() raise, which aborts the lookup
+        result = resolve(smiles, progress=lambda stage: emit("progress", stage))
+        if key:
+            with self._lock:
+                self._cache[key] = (time.monotonic(), copy.deepcopy(result))
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return result
+
+    def _op_batch(self, request: Dict[str, Any], emit: EventCallback) -> int:
+        """run_batch.py with the client's arguments and working directory; streams its output."""
+        def log(line: str) -> None:
+            try:
+                emit("log", line)
+            except (OSError, EOFError):
+                pass  # client gone: finish the batch anyway (it is checkpointed)
+
+        with self._batch_lock:
+            return _run_batch_child(list(request.get("argv") or []), request.get("cwd") or os.getcwd(), log)
+
+
+# ----------------------------------------------------------------------
+# Clients
+# ----------------------------------------------------------------------
+def _connect() -> Connection:
+    try:
+        info = json.loads((runtime_dir() / INFO_FILENAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        raise WorkerUnavailable("No chem-reporter worker is running.") from e
+    try:
+        return Client(info["address"], family=info["family"], authkey=bytes.fromhex(info["authkey"]))
+    except (OSError, EOFError, AuthenticationError, KeyError, ValueError) as e:
+        raise WorkerUnavailable(f"Cannot reach the chem-reporter worker: {e}") from e
+
+
+def request(op: str, on_event: Optional[EventCallback] = None, **fields: Any) -> Any:
+    """
+    Send one request to the worker and return its result. Progress / log
+    events are passed to `on_event(kind, payload)`; an exception raised
+    there closes the connection, which cancels the job where possible.
+    """
+    conn = _connect()
+    with conn:
+        try:
+            conn.send({"op": op, **fields})
+            while True:
+                kind, payload = conn.recv()
+                if kind == "result":
+                    return payload
+                if kind == "error":
+                    raise WorkerError(payload)
+                if on_event is not None:
+                    on_event(kind, payload)
+        except (EOFError, ConnectionError) as e:
+            raise WorkerError("Lost the connection to the chem-reporter worker.") from e
+
+
+def is_running() -> bool:
+    try:
+        request("ping")
+    except (WorkerUnavailable, WorkerError):
+        return False
+    return True
+
+
+def resolve_via_worker(smiles: str, progress: Optional[Callable[[str], None]] = None) -> Any:
+    """pubchem.resolve through the worker, or in-process if none is running."""
+    def on_event(kind: str, payload: Any) -> None:
+        if kind == "progress" and progress is not None:
+            progress(payload)
+
+    try:
+        return request("resolve", on_event, smiles=smiles)
+    except WorkerUnavailable:
+        from .pubchem import resolve
+        return resolve(smiles, progress=progress)
+
+
+def run_batch_via_worker(argv: List[str], log: Callable[[str], None] = print) -> int:
+    """run_batch.py `argv` through the worker, or in-process if none is running; returns the exit code."""
+    try:
+        return request("batch", lambda _kind, line: log(line), argv=list(argv), cwd=os.getcwd())
+    except WorkerUnavailable:
+        return _run_batch_main(list(argv), log)
+
+
+def start_worker(idle_timeout: Optional[float] = None) -> subprocess.Popen:
+    """Start a worker in the background (returns at once; it warms up on its own)."""
+    cmd = [sys.executable, str(PROJECT_ROOT / "scripts" / "worker.py"), "serve"]
+    if idle_timeout:
+        cmd += ["--idle-timeout", str(idle_timeout)]
+    kwargs: Dict[str, Any] = {"cwd": str(PROJECT_ROOT), "stdin": subprocess.DEVNULL,
+                              "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+    if sys.platform == "win32":
+        kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    return subprocess.Popen(cmd, **kwargs)
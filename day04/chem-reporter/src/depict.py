@@ -0,0 +1,264 @@
+# src/depict.py
+"""
+2D depictions (PNG / SVG) of batch results, drawn with RDKit's MolDraw2D.
+
+`run_batch.py --depict png` adds a depiction stage to the batch pipeline:
+
+    <results>/depictions/<key>.png          one image per compound
+    <results>/depictions/grid_<run>_01.png  grid pages of the whole run,
+                                            `per_page` compounds each, in input order
+
+Drawing runs on a process pool, off the writer thread; grid pages are drawn
+as the run's ordered summary fills them, not all at the end. Every image is first written to a
+content-addressed cache, <results>/.depiction_cache/<2 hex>/<sha256>.<fmt>,
+keyed by the canonical SMILES, the legend, the drawing options and the RDKit
+version; per-compound files are hard links to (or copies of) cache entries.
+A re-run, or another batch containing the same compounds, draws nothing.
+"""
+from __future__ import annotations
+
+import hashlib
+import heapq
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEPICTION_DIRNAME = "depictions"
+DEPICTION_CACHE_DIRNAME = ".depiction_cache"
+DEPICTION_FORMATS = ("png", "svg")
+
+
+@dataclass(frozen=True)
+class DrawOptions:
+    """Image settings; all of them are part of the cache key."""
+    fmt: str = "png"
+    width: int = 300
+    height: int = 300
+    per_row: int = 6  # grid columns
+
+
+def _drawer(options: DrawOptions, width: int, height: int, panel: Tuple[int, int] = (-1, -1)):
+    from rdkit.Chem.Draw import rdMolDraw2D
+
+    if options.fmt == "svg":
+        return rdMolDraw2D.MolDraw2DSVG(width, height, *panel)
+    return rdMolDraw2D.MolDraw2DCairo(width, height, *panel)
+
+
+def _mol(smiles: str):
+    from rdkit import Chem
+    from rdkit.Chem import rdDepictor
+
+    mol = Chem.MolFromSmiles(smiles)
+    if mol is None:
+        raise ValueError(f"Invalid SMILES: {smiles}")
+    rdDepictor.Compute2DCoords(mol)
+    return mol
+
+
+def _write_atomic(path: str, data: str | bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data.encode("utf-8") if isinstance(data, str) else data)
+    os.replace(tmp, path)
+
+
+def draw_molecule(smiles: str, legend: str, options: DrawOptions, path: str) -> str:
+    """Pool task: draw one molecule into `path` (written atomically)."""
+    from rdkit.Chem.Draw import rdMolDraw2D
+
+    drawer = _drawer(options, options.width, options.height)
+    rdMolDraw2D.PrepareAndDrawMolecule(drawer, _mol(smiles), legend=legend)
+    drawer.FinishDrawing()
+    _write_atomic(path, drawer.GetDrawingText())
+    return path
+
+
+def draw_grid(entries: List[Tuple[str, str]], options: DrawOptions, path: str) -> str:
+    """Pool task: draw (smiles, legend) pairs as one grid image into `path`."""
+    mols, legends = [], []
+    for smiles, legend in entries:
+        try:
+            mols.append(_mol(smiles))
+            legends.append(legend)
+        except ValueError:
+            continue
+    cols = max(1, min(options.per_row, len(mols)))
+    rows = max(1, -(-len(mols) // cols))
+    drawer = _drawer(options, options.width * cols, options.height * rows, (options.width, options.height))
+    drawer.DrawMolecules(mols, legends=legends)
+    drawer.FinishDrawing()
+    _write_atomic(path, drawer.GetDrawingText())
+    return path
+
+
+def _rdkit_version() -> str:
+    from rdkit import rdBase
+
+    return rdBase.rdkitVersion
+
+
+def _link(source: str, target: str) -> None:
+    """Make `target` the cached image `source` (hard link, or a copy across devices)."""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f"{target}.{threading.get_ident()}.tmp"
+    try:
+        os.link(source, tmp)
+    except OSError:
+        shutil.copyfile(source, tmp)
+    os.replace(tmp, target)
+
+
+class DepictionStage:
+    """
+    Collects compounds from the batch pipeline (`add`, from the writer
+    thread), draws the ones missing from the cache on `workers` processes
+    (0 = in-process), or on `pool` when given (shared with other stages,
+    left running), without waiting for the drawings: each finished image is
+    linked into place by a callback.
+
+    Grid pages follow input order. `advance(row)` says every row up to `row`
+    has been added (the pipeline calls it as its ordered summary advances);
+    each page is drawn as soon as it is full, so only the rows ahead of that
+    point and one page are kept. `close` draws the last page and waits for
+    every image. Counters: `drawn` and `cached` images.
+    """
+
+    def __init__(
+        self,
+        results_dir: str | os.PathLike,
+        options: Optional[DrawOptions] = None,
+        workers: Optional[int] = None,
+        per_page: int = 36,
+        run_tag: str = "",
+        pool: Optional[Executor] = None,
+    ) -> None:
+        self.options = options or DrawOptions()
+        if self.options.fmt not in DEPICTION_FORMATS:
+            raise ValueError(f"Unknown depiction format {self.options.fmt!r}")
+        if workers is None:
+            from .pipeline import default_rdkit_workers
+
+            workers = default_rdkit_workers()
+        self.results_dir = os.path.abspath(results_dir)
+        self.out_dir = os.path.join(self.results_dir, DEPICTION_DIRNAME)
+        self.cache_dir = os.path.join(self.results_dir, DEPICTION_CACHE_DIRNAME)
+        self.per_page = max(1, per_page)
+        self.run_tag = run_tag
+        self.drawn = 0
+        self.cached = 0
+        self._version = _rdkit_version()
+        self._ahead: List[Tuple[int, str, str]] = []  # heap of (row, canonical smiles, legend) past `advance`
+        self._page: List[Tuple[str, str]] = []  # next grid page, in input order
+        self._grids: List[str] = []
+        self._owns_pool = pool is None and workers > 0
+        self._pool = ProcessPoolExecutor(max_workers=workers) if self._owns_pool else pool
+        self._pending = 0  # pool drawings not linked yet
+        self._idle = threading.Condition()
+        self._lock = threading.Lock()
+
+    def _cache_path(self, kind: str, payload: Any) -> str:
+        key = json.dumps({"kind": kind, "payload": payload, "options": asdict(self.options),
+                          "rdkit": self._version}, sort_keys=True)
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.{self.options.fmt}")
+
+    def _render(self, task: Any, args: tuple, path: str, targets: List[str]) -> None:
+        """Draw into the cache unless already there, then link `targets` to it."""
+        if os.path.exists(path):
+            self.cached += 1
+            for target in targets:
+                _link(path, target)
+            return
+        self.drawn += 1
+        if self._pool is None:
+            future: Future = Future()
+            try:
+                future.set_result(task(*args, path))
+            except Exception as e:
+                future.set_exception(e)
+            self._finish(future, targets)
+            return
+        with self._idle:
+            self._pending += 1
+        try:
+            future = self._pool.submit(task, *args, path)
+        except Exception as e:  # e.g. BrokenProcessPool
+            future = Future()
+            future.set_exception(e)
+        future.add_done_callback(lambda done: self._drawn(done, targets))
+
+    def _drawn(self, future: Future, targets: List[str]) -> None:
+        try:
+            self._finish(future, targets)
+        finally:
+            with self._idle:
+                self._pending -= 1
+                self._idle.notify_all()
+
+    @staticmethod
+    def _finish(future: Future, targets: List[str]) -> None:
+        try:
+            path = future.result()
+        except Exception as e:
+            logger.warning("Depiction failed: %s", e)
+            return
+        for target in targets:
+            try:
+                _link(path, target)
+            except OSError as e:
+                logger.warning("Depiction %s not linked: %s", target, e)
+
+    def add(self, row: int, key: str, smiles: str, legend: str = "") -> None:
+        """Queue the depiction of one compound; `key` names its image file."""
+        from .rdkit_utils import canonicalize_smiles
+
+        try:
+            canonical = canonicalize_smiles(smiles)
+        except ValueError:
+            return
+        with self._lock:
+            heapq.heappush(self._ahead, (row, canonical, legend))
+            self._render(draw_molecule, (canonical, legend, self.options),
+                         self._cache_path("molecule", [canonical, legend]),
+                         [os.path.join(self.out_dir, f"{key}.{self.options.fmt}")])
+
+    def advance(self, row: int) -> None:
+        """Every row up to `row` has been added: draw the grid pages they fill."""
+        with self._lock:
+            while self._ahead and self._ahead[0][0] <= row:
+                _, smiles, legend = heapq.heappop(self._ahead)
+                self._page.append((smiles, legend))
+                if len(self._page) == self.per_page:
+                    self._draw_page()
+
+    def _draw_page(self) -> None:
+        chunk, self._page = self._page, []
+        prefix = f"grid_{self.run_tag}_" if self.run_tag else "grid_"
+        target = os.path.join(self.out_dir, f"{prefix}{len(self._grids) + 1:02d}.{self.options.fmt}")
+        self._grids.append(target)
+        self._render(draw_grid, (chunk, self.options), self._cache_path("grid", chunk), [target])
+
+    def close(self) -> List[str]:
+        """Draw the remaining grid pages, wait for every image; returns the grid paths."""
+        self.advance(sys.maxsize)
+        with self._lock:
+            if self._page:
+                self._draw_page()
+        with self._idle:
+            while self._pending:
+                self._idle.wait()
+        with self._lock:
+            if self._owns_pool:
+                self._pool.shutdown(wait=True)
+            self._pool = None
+        return [g for g in self._grids if os.path.exists(g)]
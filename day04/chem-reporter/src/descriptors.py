@@ -0,0 +1,223 @@
+# src/descriptors.py
+"""
+RDKit descriptors for batch results.
+
+`run_batch.py --descriptors` computes a configurable set of descriptors for
+every compound inside the 3D worker task (`pipeline.build_structure`), from
+the Mol that task parses before embedding, so they do not depend on the
+embedding succeeding. The values
+become extra columns of the batch summary and the columnar export, a
+"descriptors" object in metadata.json, and a column of results.sqlite.
+
+Results written before (or without) descriptors are filled in with
+`run_batch.py add-descriptors` (`add_descriptors`), which parses the stored
+SMILES and computes one column of values per descriptor for chunks of
+compounds on a process pool (`DescriptorEngine`). A batch re-run that finds
+a folder up to date but missing descriptors fills in just that folder
+(`add_to_metadata`, on the pipeline's pool).
+
+Available names (DESCRIPTORS): mw, exact_mw, logp, mr, tpsa, hbd, hba,
+rotatable_bonds, rings, aromatic_rings, heavy_atoms, fsp3, charge.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DESCRIPTORS = ("mw", "logp", "tpsa", "hbd", "hba", "rotatable_bonds", "rings", "aromatic_rings")
+
+# Names in the order they are offered; the integer-valued ones are stored as int
+DESCRIPTORS = (
+    "mw", "exact_mw", "logp", "mr", "tpsa", "hbd", "hba", "rotatable_bonds",
+    "rings", "aromatic_rings", "heavy_atoms", "fsp3", "charge",
+)
+_INTEGER = frozenset(("hbd", "hba", "rotatable_bonds", "rings", "aromatic_rings", "heavy_atoms", "charge"))
+_functions: Dict[str, Callable[[Any], Any]] = {}  # per process, filled on first use
+
+
+def parse_descriptor_names(text: str) -> Tuple[str, ...]:
+    """'all', 'default' or a comma-separated list of names; ValueError for unknown names."""
+    text = (text or "").strip().lower()
+    if text in ("", "default"):
+        return DEFAULT_DESCRIPTORS
+    if text == "all":
+        return DESCRIPTORS
+    names = tuple(dict.fromkeys(n.strip() for n in text.split(",") if n.strip()))
+    unknown = [n for n in names if n not in DESCRIPTORS]
+    if unknown:
+        raise ValueError(f"Unknown descriptor(s): {', '.join(unknown)} (available: {', '.join(DESCRIPTORS)})")
+    return names
+
+
+def _registry() -> Dict[str, Callable[[Any], Any]]:
+    if not _functions:
+        from rdkit import Chem
+        from rdkit.Chem import Crippen, Descriptors, rdMolDescriptors as rd
+
+        _functions.update({
+            "mw": Descriptors.MolWt,
+            "exact_mw": rd.CalcExactMolWt,
+            "logp": Crippen.MolLogP,
+            "mr": Crippen.MolMR,
+            "tpsa": rd.CalcTPSA,
+            "hbd": rd.CalcNumHBD,
+            "hba": rd.CalcNumHBA,
+            "rotatable_bonds": rd.CalcNumRotatableBonds,
+            "rings": rd.CalcNumRings,
+            "aromatic_rings": rd.CalcNumAromaticRings,
+            "heavy_atoms": rd.CalcNumHeavyAtoms,
+            "fsp3": rd.CalcFractionCSP3,
+            "charge": Chem.GetFormalCharge,
+        })
+    return _functions
+
+
+def compute(mol: Any, names: Sequence[str]) -> Dict[str, Any]:
+    """
+    {name: value} for one RDKit Mol. Pass hydrogens implicitly (Chem.RemoveHs
+    an embedded Mol first): explicit ones change logP, TPSA and aromaticity.
+    """
+    functions = _registry()
+    out: Dict[str, Any] = {}
+    for name in names:
+        value = functions[name](mol)
+        out[name] = int(value) if name in _INTEGER else round(float(value), 4)
+    return out
+
+
+def compute_chunk(smiles: List[str], names: Sequence[str]) -> Dict[str, List[Any]]:
+    """Pool task: one column (list) per descriptor for a chunk of SMILES; None where parsing fails."""
+    from rdkit import Chem, rdBase
+
+    columns: Dict[str, List[Any]] = {name: [] for name in names}
+    with rdBase.BlockLogs():
+        for s in smiles:
+            mol = Chem.MolFromSmiles(s) if s else None
+            values = compute(mol, names) if mol is not None else {}
+            for name in names:
+                columns[name].append(values.get(name))
+    return columns
+
+
+def add_to_metadata(meta_path: str, names: Sequence[str]) -> Dict[str, Any]:
+    """
+    Pool task: compute `names` from the input SMILES of one compound folder,
+    merge them into its metadata.json (rewritten atomically) and return them.
+    """
+    from rdkit import Chem, rdBase
+
+    from .io_utils import _write_json_atomic
+
+    with open(meta_path, "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    with rdBase.BlockLogs():
+        mol = Chem.MolFromSmiles(metadata.get("input_smiles") or "")
+    if mol is None:
+        raise ValueError(f"Invalid SMILES in {meta_path}")
+    values = compute(mol, names)
+    metadata["descriptors"] = {**(metadata.get("descriptors") or {}), **values}
+    _write_json_atomic(meta_path, metadata)
+    return values
+
+
+class DescriptorEngine:
+    """
+    Computes `names` for a stream of (item, smiles) pairs in chunks of
+    `chunk_size` on `workers` processes (0 = in-process). `chunks` yields
+    (items, columns) per chunk in input order, with a bounded number of
+    chunks in flight.
+    """
+
+    def __init__(self, names: Sequence[str] = DEFAULT_DESCRIPTORS, workers: Optional[int] = None,
+                 chunk_size: int = 512) -> None:
+        if workers is None:
+            from .pipeline import default_rdkit_workers
+
+            workers = default_rdkit_workers()
+        self.names = tuple(names)
+        self.workers = workers
+        self.chunk_size = max(1, chunk_size)
+
+    def _split(self, pairs: Iterable[Tuple[Any, str]]) -> Iterator[List[Tuple[Any, str]]]:
+        chunk: List[Tuple[Any, str]] = []
+        for pair in pairs:
+            chunk.append(pair)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def chunks(self, pairs: Iterable[Tuple[Any, str]]) -> Iterator[Tuple[List[Any], Dict[str, List[Any]]]]:
+        if self.workers <= 0:
+            for chunk in self._split(pairs):
+                yield [item for item, _ in chunk], compute_chunk([s for _, s in chunk], self.names)
+            return
+        pool = ProcessPoolExecutor(max_workers=self.workers)
+        pending: Deque[Tuple[List[Any], Any]] = deque()
+        try:
+            for chunk in self._split(pairs):
+                pending.append(([item for item, _ in chunk],
+                                pool.submit(compute_chunk, [s for _, s in chunk], self.names)))
+                if len(pending) > 2 * self.workers:
+                    items, future = pending.popleft()
+                    yield items, future.result()
+            while pending:
+                items, future = pending.popleft()
+                yield items, future.result()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def rows(self, pairs: Iterable[Tuple[Any, str]]) -> Iterator[Tuple[Any, Dict[str, Any]]]:
+        """(item, {name: value}) per pair, in input order."""
+        for items, columns in self.chunks(pairs):
+            for n, item in enumerate(items):
+                yield item, {name: columns[name][n] for name in self.names}
+
+
+def add_descriptors(base_dir: str | os.PathLike, names: Sequence[str] = DEFAULT_DESCRIPTORS,
+                    workers: Optional[int] = None, chunk_size: int = 512) -> int:
+    """
+    Backfill `names` for every compound already under `base_dir` that lacks
+    any of them: the "descriptors" of its metadata.json, and the descriptors
+    column of results.sqlite. Returns the number of compounds updated.
+    """
+    from .io_utils import _write_json_atomic
+    from .store import STORE_FILENAME, ResultStore
+
+    engine = DescriptorEngine(names, workers=workers, chunk_size=chunk_size)
+    base_dir = os.fspath(base_dir)
+
+    def folders() -> Iterator[Tuple[Tuple[str, Dict[str, Any]], str]]:
+        for name in sorted(os.listdir(base_dir)):
+            meta_path = os.path.join(base_dir, name, "metadata.json")
+            if not os.path.isfile(meta_path):
+                continue
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping %s: %s", meta_path, e)
+                continue
+            if not all(n in (metadata.get("descriptors") or {}) for n in engine.names):
+                yield (meta_path, metadata), metadata.get("input_smiles") or ""
+
+    updated = 0
+    for (meta_path, metadata), values in engine.rows(folders()):
+        metadata["descriptors"] = {**(metadata.get("descriptors") or {}), **values}
+        _write_json_atomic(meta_path, metadata)
+        updated += 1
+
+    store_path = os.path.join(base_dir, STORE_FILENAME)
+    if os.path.exists(store_path):
+        with ResultStore(store_path) as store:
+            missing = ((folder, smiles) for folder, smiles, stored in store.descriptor_rows()
+                       if not all(n in stored for n in engine.names))
+            updated += store.set_descriptors(engine.rows(missing))
+    return updated
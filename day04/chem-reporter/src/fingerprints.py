@@ -0,0 +1,480 @@
+# src/fingerprints.py
+"""
+Morgan fingerprint store and bulk Tanimoto similarity search.
+
+Batch runs add the fingerprint of every computed compound to
+<results>/fingerprints/ (fingerprints_shard2of8/ etc. for sharded runs, so
+shards never write the same files):
+
+    meta.json       fingerprint type, radius and bit count
+    bits.u64        one row of n_bits/64 little-endian uint64 words per compound
+    pattern.u64     RDKit pattern fingerprint of each row (PATTERN_BITS bits),
+                    the substructure prescreen used by src/substructure.py
+    popcount.u16    bits set per row; its length is the committed row count
+    offsets.u64     byte offset of each row's line in records.jsonl
+    records.jsonl   key (folder or store key), canonical SMILES, CID, name and
+                    melting-point range (°C) of each row
+
+The fixed-size files are opened with numpy.memmap, so a search touches only
+the pages it reads and a library of millions of compounds never has to be
+loaded: `search` ANDs the query with a chunk of rows, counts bits with
+numpy.bitwise_count, and keeps the top-k Tanimoto scores above a threshold.
+Only the records of the hits are read from records.jsonl.
+
+A compound added again (same canonical SMILES) keeps its row; only its
+record is replaced. Stores written before pattern.u64 existed get it filled
+in the next time a batch opens them.
+"""
+from __future__ import annotations
+
+import glob
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_DIRNAME = "fingerprints"
+DEFAULT_RADIUS = 2
+DEFAULT_BITS = 2048
+PATTERN_BITS = 2048
+
+_PATTERN_BYTES = PATTERN_BITS // 8
+_CHUNK_ROWS = 1 << 16  # rows per search step: 16 MB of 2048-bit fingerprints
+_local = threading.local()
+
+
+def _generator(radius: int, n_bits: int):
+    # Fingerprint generators are not shared between threads
+    key = (radius, n_bits)
+    generators = getattr(_local, "generators", None)
+    if generators is None:
+        generators = _local.generators = {}
+    if key not in generators:
+        from rdkit.Chem import rdFingerprintGenerator
+
+        generators[key] = rdFingerprintGenerator.GetMorganGenerator(radius=radius, fpSize=n_bits)
+    return generators[key]
+
+
+def _as_mol(mol_or_smiles: Any):
+    if not isinstance(mol_or_smiles, str):
+        return mol_or_smiles
+    from rdkit import Chem
+
+    mol = Chem.MolFromSmiles(mol_or_smiles)
+    if mol is None:
+        raise ValueError(f"Invalid SMILES: {mol_or_smiles}")
+    return mol
+
+
+def morgan_words(mol_or_smiles: Any, radius: int = DEFAULT_RADIUS, n_bits: int = DEFAULT_BITS) -> "np.ndarray":
+    """Morgan fingerprint of a molecule (or SMILES) packed into n_bits/64 uint64 words."""
+    import numpy as np
+
+    bits = _generator(radius, n_bits).GetFingerprintAsNumPy(_as_mol(mol_or_smiles))
+    return np.packbits(bits, bitorder="little").view("<u8")
+
+
+def pattern_words(mol_or_smiles: Any, n_bits: int = PATTERN_BITS) -> "np.ndarray":
+    """
+    RDKit pattern fingerprint packed into uint64 words. Every bit set for a
+    substructure query is also set for any molecule containing it, so a
+    molecule missing one of the query's bits cannot match.
+    """
+    import numpy as np
+    from rdkit import Chem, DataStructs
+
+    bits = np.zeros(n_bits, dtype=np.uint8)
+    DataStructs.ConvertToNumpyArray(Chem.PatternFingerprint(_as_mol(mol_or_smiles), fpSize=n_bits), bits)
+    return np.packbits(bits, bitorder="little").view("<u8")
+
+
+def compound_fingerprint(mol_or_smiles: Any, radius: int = DEFAULT_RADIUS,
+                         n_bits: int = DEFAULT_BITS) -> Tuple[str, bytes, bytes]:
+    """
+    What `FingerprintStore.add` stores for a compound: (canonical SMILES,
+    Morgan words, pattern words), the words as bytes so that a pool worker
+    can compute them and hand them back cheaply.
+    """
+    from rdkit import Chem
+
+    mol = _as_mol(mol_or_smiles)
+    return (Chem.MolToSmiles(mol), morgan_words(mol, radius, n_bits).tobytes(),
+            pattern_words(mol).tobytes())
+
+
+def _popcount_rows(words: "np.ndarray") -> "np.ndarray":
+    """Bits set in each row of a 2-D uint64 array."""
+    import numpy as np
+
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int32)
+    table = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    return table[words.view(np.uint8)].sum(axis=1, dtype=np.int32)
+
+
+def _all_ones(n_bits: int) -> "np.ndarray":
+    import numpy as np
+
+    return np.full(n_bits // 64, np.iinfo(np.uint64).max, dtype="<u8")
+
+
+def fingerprint_dirs(base_dir: str | os.PathLike) -> List[str]:
+    """Every fingerprint store under a results directory (one per shard)."""
+    pattern = os.path.join(os.fspath(base_dir), FINGERPRINT_DIRNAME + "*", "meta.json")
+    return sorted(os.path.dirname(p) for p in glob.glob(pattern))
+
+
+class FingerprintStore:
+    """
+    Append-only writer for one fingerprint directory. Thread-safe; rows are
+    visible to readers once their popcount is written (`flush`, `close`).
+    """
+
+    def __init__(self, directory: str | os.PathLike, radius: int = DEFAULT_RADIUS,
+                 n_bits: int = DEFAULT_BITS) -> None:
+        if n_bits % 64:
+            raise ValueError("n_bits must be a multiple of 64")
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        meta_path = os.path.join(self.directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            radius, n_bits = meta["radius"], meta["bits"]
+        else:
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"type": "morgan", "radius": radius, "bits": n_bits, "version": 1}, f)
+        self.radius = radius
+        self.n_bits = n_bits
+        self._row_bytes = n_bits // 8
+        self._lock = threading.Lock()
+
+        self._files = {name: open(os.path.join(self.directory, name), "a+b")
+                       for name in ("bits.u64", "pattern.u64", "popcount.u16", "offsets.u64", "records.jsonl")}
+        self._rows = self._recover()
+        self._row_of = self._load_rows()
+        self._backfill_patterns()
+
+    def _recover(self) -> int:
+        """Cut the fixed-size files back to the last complete row (after a crash)."""
+        sizes = {name: os.fstat(f.fileno()).st_size for name, f in self._files.items()}
+        rows = min(sizes["popcount.u16"] // 2, sizes["bits.u64"] // self._row_bytes,
+                   sizes["offsets.u64"] // 8)
+        if rows:
+            import numpy as np
+
+            offsets = np.fromfile(os.path.join(self.directory, "offsets.u64"), dtype="<u8", count=rows)
+            while rows and offsets[rows - 1] >= sizes["records.jsonl"]:
+                rows -= 1  # its record never reached the disk
+        for name, width in (("bits.u64", self._row_bytes), ("popcount.u16", 2), ("offsets.u64", 8)):
+            if sizes[name] != rows * width:
+                self._files[name].truncate(rows * width)
+        if sizes["pattern.u64"] > rows * _PATTERN_BYTES:
+            self._files["pattern.u64"].truncate(rows * _PATTERN_BYTES)
+        records = self._files["records.jsonl"]
+        if sizes["records.jsonl"]:
+            records.seek(-1, os.SEEK_END)
+            if records.read(1) != b"\n":
+                records.write(b"\n")  # end a half-written record; nothing points at it
+        return rows
+
+    def _load_rows(self) -> Dict[str, int]:
+        """Canonical SMILES -> row, from the records the offsets point at."""
+        import numpy as np
+
+        row_of: Dict[str, int] = {}
+        if not self._rows:
+            return row_of
+        offsets = np.fromfile(os.path.join(self.directory, "offsets.u64"), dtype="<u8", count=self._rows)
+        wanted = {int(off): row for row, off in enumerate(offsets)}
+        records = self._files["records.jsonl"]
+        records.seek(0)
+        position = 0
+        for line in records:
+            row = wanted.get(position)
+            if row is not None:
+                row_of[json.loads(line)["smiles"]] = row
+            position += len(line)
+        return row_of
+
+    def _backfill_patterns(self) -> None:
+        """Pattern fingerprints for rows that have none (older store, or a crash)."""
+        done = os.fstat(self._files["pattern.u64"].fileno()).st_size // _PATTERN_BYTES
+        if done >= self._rows:
+            return
+        logger.info("Adding substructure fingerprints to %d rows of %s", self._rows - done, self.directory)
+        smiles_of = {row: smiles for smiles, row in self._row_of.items()}
+        for row in range(done, self._rows):
+            try:
+                words = pattern_words(smiles_of[row])
+            except (KeyError, ValueError):
+                words = _all_ones(PATTERN_BITS)  # unknown: never screened out
+            self._files["pattern.u64"].write(words.tobytes())
+        self._files["pattern.u64"].flush()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._rows
+
+    def __enter__(self) -> "FingerprintStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def add(self, key: str, smiles: str, cid: Optional[int] = None, name: Optional[str] = None,
+            mp_low_c: Optional[float] = None, mp_high_c: Optional[float] = None,
+            fingerprint: Optional[Tuple[str, bytes, bytes]] = None) -> int:
+        """
+        Add (or update) one compound; returns its row. `fingerprint` is its
+        `compound_fingerprint` if already computed (e.g. on the batch
+        pool); otherwise it is computed here. Raises ValueError for invalid
+        SMILES.
+        """
+        import numpy as np
+
+        if fingerprint is not None and len(fingerprint[1]) == self._row_bytes:
+            canonical, words_bytes, pattern_bytes = fingerprint
+        else:
+            from rdkit import Chem
+
+            mol = Chem.MolFromSmiles(smiles) if smiles else None
+            if mol is None:
+                raise ValueError(f"Invalid SMILES: {smiles!r}")
+            canonical = Chem.MolToSmiles(mol)
+            with self._lock:
+                known = canonical in self._row_of
+            # A compound already stored (rows are never dropped) only gets its record replaced
+            words_bytes, pattern_bytes = (b"", b"") if known else compound_fingerprint(
+                mol, self.radius, self.n_bits)[1:]
+        record = {"key": key, "smiles": canonical, "cid": cid, "name": name,
+                  "mp_low_c": mp_low_c, "mp_high_c": mp_high_c}
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            records = self._files["records.jsonl"]
+            records.seek(0, os.SEEK_END)
+            offset = records.tell()
+            records.write(line)
+            offset_bytes = offset.to_bytes(8, "little")
+
+            row = self._row_of.get(canonical)
+            if row is not None:
+                # Same fingerprint: only point the row at its new record
+                records.flush()
+                self._files["offsets.u64"].flush()
+                with open(os.path.join(self.directory, "offsets.u64"), "r+b") as f:
+                    f.seek(row * 8)
+                    f.write(offset_bytes)
+                return row
+
+            words = np.frombuffer(words_bytes, dtype="<u8")
+            row = self._row_of[canonical] = self._rows
+            self._files["offsets.u64"].write(offset_bytes)
+            self._files["bits.u64"].write(words_bytes)
+            self._files["pattern.u64"].write(pattern_bytes)
+            self._files["popcount.u16"].write(int(_popcount_rows(words[None, :])[0]).to_bytes(2, "little"))
+            self._rows += 1
+            return row
+
+    def add_metadata(self, key: str, metadata: Dict[str, Any],
+                     fingerprint: Optional[Tuple[str, bytes, bytes]] = None) -> Optional[int]:
+        """Add a compound from its metadata.json content; None if it has no usable SMILES."""
+        from .pubchem import melting_point_bounds
+
+        bounds = [melting_point_bounds(mp.get("value"), mp.get("unit"))
+                  for mp in metadata.get("melting_points") or []]
+        bounds = [(low, high) for low, high in bounds if low is not None]
+        try:
+            return self.add(
+                key, metadata.get("input_smiles") or "", cid=metadata.get("cid"),
+                name=metadata.get("preferred_name") or metadata.get("iupac_name"),
+                mp_low_c=min((low for low, _ in bounds), default=None),
+                mp_high_c=max((high for _, high in bounds), default=None),
+                fingerprint=fingerprint,
+            )
+        except ValueError:
+            return None
+
+    def merge(self, directory: str | os.PathLike) -> int:
+        """
+        Add every compound of another store (e.g. a shard's) to this one,
+        reusing its fingerprints when both use the same radius and size;
+        returns the number of compounds copied.
+        """
+        directory = os.fspath(directory)
+        meta, bits, popcount = _open_rows(directory)
+        if bits is None:
+            return 0
+        same = (meta["radius"], meta["bits"]) == (self.radius, self.n_bits)
+        _, patterns = open_patterns(directory)
+        copied = 0
+        for start in range(0, len(popcount), _CHUNK_ROWS):
+            records = read_records(directory, range(start, min(start + _CHUNK_ROWS, len(popcount))))
+            for row, record in records.items():
+                fingerprint = None
+                if same and patterns is not None and row < len(patterns):
+                    fingerprint = (record["smiles"], bits[row].tobytes(), patterns[row].tobytes())
+                self.add(record["key"], record["smiles"], cid=record.get("cid"), name=record.get("name"),
+                         mp_low_c=record.get("mp_low_c"), mp_high_c=record.get("mp_high_c"),
+                         fingerprint=fingerprint)
+                copied += 1
+        return copied
+
+    def flush(self) -> None:
+        with self._lock:
+            # Records and bits before popcount: a reader never sees a row without them
+            for name in ("records.jsonl", "offsets.u64", "bits.u64", "pattern.u64", "popcount.u16"):
+                self._files[name].flush()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+
+
+def _open_rows(directory: str) -> Tuple[Dict[str, Any], Optional["np.ndarray"], Optional["np.ndarray"]]:
+    """(meta, bits memmap [rows, words], popcount memmap) of a store; None arrays if empty."""
+    import numpy as np
+
+    with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    words = meta["bits"] // 64
+    pop_path, bits_path = os.path.join(directory, "popcount.u16"), os.path.join(directory, "bits.u64")
+    rows = min(os.path.getsize(pop_path) // 2, os.path.getsize(bits_path) // (words * 8),
+               os.path.getsize(os.path.join(directory, "offsets.u64")) // 8)
+    if not rows:
+        return meta, None, None
+    bits = np.memmap(bits_path, dtype="<u8", mode="r", shape=(rows, words))
+    popcount = np.memmap(pop_path, dtype="<u2", mode="r", shape=(rows,))
+    return meta, bits, popcount
+
+
+def open_patterns(directory: str) -> Tuple[int, Optional["np.ndarray"]]:
+    """
+    (committed rows, pattern-fingerprint memmap [n, words]) of a store. The
+    memmap may cover fewer rows than committed (a store from before
+    pattern.u64, not yet backfilled); rows past its end are unscreened.
+    """
+    import numpy as np
+
+    _, _, popcount = _open_rows(directory)
+    rows = 0 if popcount is None else len(popcount)
+    path = os.path.join(directory, "pattern.u64")
+    have = min(rows, os.path.getsize(path) // _PATTERN_BYTES) if os.path.exists(path) else 0
+    if not have:
+        return rows, None
+    return rows, np.memmap(path, dtype="<u8", mode="r", shape=(have, PATTERN_BITS // 64))
+
+
+def read_records(directory: str, rows: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """{row: record} read from records.jsonl; rows whose record is still being written are left out."""
+    import numpy as np
+
+    offsets = np.memmap(os.path.join(directory, "offsets.u64"), dtype="<u8", mode="r")
+    out = {}
+    with open(os.path.join(directory, "records.jsonl"), "rb") as f:
+        for row in sorted(rows):
+            f.seek(int(offsets[row]))
+            line = f.readline()
+            if line.endswith(b"\n"):  # else still being written
+                out[row] = json.loads(line)
+    return out
+
+
+def _scan(bits: "np.ndarray", popcount: "np.ndarray", query: "np.ndarray", query_pop: int,
+          start: int, stop: int, top_k: int, threshold: float) -> Tuple["np.ndarray", "np.ndarray"]:
+    """(rows, scores) of the best `top_k` rows in [start, stop) scoring at least `threshold`."""
+    import numpy as np
+
+    common = _popcount_rows(np.bitwise_and(bits[start:stop], query))
+    union = popcount[start:stop].astype(np.int32) + query_pop - common
+    scores = np.divide(common, union, out=np.zeros(len(common), dtype=np.float64), where=union > 0)
+    hits = np.flatnonzero(scores >= threshold)
+    if len(hits) > top_k:
+        hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+    return hits + start, scores[hits]
+
+
+def search(
+    base_dir: str | os.PathLike,
+    smiles: str,
+    top_k: int = 10,
+    threshold: float = 0.0,
+    workers: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    The `top_k` stored compounds most similar to `smiles` (Tanimoto on Morgan
+    fingerprints), best first, each a record dict plus "similarity". Only
+    scores >= `threshold` are returned. Chunks are scanned on `workers`
+    threads (default: CPU count); NumPy releases the GIL while counting.
+    """
+    import numpy as np
+
+    hits: List[Tuple[float, str, int]] = []
+    query_cache: Dict[Tuple[int, int], Tuple["np.ndarray", int]] = {}
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for directory in fingerprint_dirs(base_dir):
+            meta, bits, popcount = _open_rows(directory)
+            if bits is None:
+                continue
+            fp_key = (meta["radius"], meta["bits"])
+            if fp_key not in query_cache:
+                query = morgan_words(smiles, *fp_key)
+                query_cache[fp_key] = (query, int(_popcount_rows(query[None, :])[0]))
+            query, query_pop = query_cache[fp_key]
+            futures = [pool.submit(_scan, bits, popcount, query, query_pop, start,
+                                   min(start + _CHUNK_ROWS, len(popcount)), top_k, threshold)
+                       for start in range(0, len(popcount), _CHUNK_ROWS)]
+            for future in futures:
+                rows, scores = future.result()
+                hits += [(float(s), directory, int(r)) for r, s in zip(rows, scores)]
+
+    hits.sort(key=lambda h: -h[0])
+    hits = hits[:top_k]
+    by_dir: Dict[str, List[int]] = {}
+    for _, directory, row in hits:
+        by_dir.setdefault(directory, []).append(row)
+    records = {d: read_records(d, rows) for d, rows in by_dir.items()}
+    return [{**records[directory][row], "similarity": round(score, 4)}
+            for score, directory, row in hits if row in records[directory]]
+
+
+def rebuild(base_dir: str | os.PathLike) -> int:
+    """
+    Fingerprint every compound already under `base_dir` (folders with a
+    metadata.json and the results.sqlite store) into a fresh
+    <base_dir>/fingerprints/. Returns the number of compounds added.
+    """
+    import shutil
+
+    from .store import STORE_FILENAME, ResultStore
+
+    target = os.path.join(os.fspath(base_dir), FINGERPRINT_DIRNAME)
+    shutil.rmtree(target, ignore_errors=True)
+    added = 0
+    with FingerprintStore(target) as fps:
+        for name in sorted(os.listdir(base_dir)):
+            meta_path = os.path.join(base_dir, name, "metadata.json")
+            if not os.path.isfile(meta_path):
+                continue
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    added += fps.add_metadata(name, json.load(f)) is not None
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping %s: %s", meta_path, e)
+        store_path = os.path.join(base_dir, STORE_FILENAME)
+        if os.path.exists(store_path):
+            with ResultStore(store_path) as store:
+                for key in store.keys():
+                    added += fps.add_metadata(key, store.get(key) or {}) is not None
+    return added
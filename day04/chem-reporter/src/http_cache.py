@@ -0,0 +1,77 @@
+# src/http_cache.py
+"""
+On-disk cache of PubChem JSON responses.
+
+`pubchem._get` consults it before going to the network and stores every
+successful response, so repeated lookups (re-runs, the resolve service,
+other tools) never hit PubChem twice for the same URL. In offline mode a
+miss raises OfflineMiss instead of making a request, which lets
+chem-reporter run with no network at all against a cache filled earlier
+(or copied from another machine). Enable it with PUBCHEM_CACHE=<dir> and
+PUBCHEM_OFFLINE=1 in the environment / .env, or `pubchem.configure_cache`.
+
+Layout: <dir>/<2 hex>/<sha256 of the URL>.json, each file holding the URL
+and the decoded JSON body; files are written atomically.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+
+
+class OfflineMiss(LookupError):
+    """Offline mode and the response is not in the cache."""
+
+
+class HttpCache:
+    def __init__(self, directory: str | os.PathLike, offline: bool = False) -> None:
+        self.directory = os.path.abspath(directory)
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+        if params:
+            url = f"{url}?{urlencode(sorted(params.items()))}"
+        return url
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + ".json")
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+        """The cached body for `url`, or None."""
+        key = self.key(url, params)
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        hit = entry is not None and entry.get("url") == key
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry["body"] if hit else None
+
+    def put(self, url: str, params: Optional[Dict[str, Any]], body: Any) -> None:
+        key = self.key(url, params)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"url": key, "body": body}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"directory": self.directory, "offline": self.offline,
+                    "hits": self.hits, "misses": self.misses}
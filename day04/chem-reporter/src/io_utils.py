@@ -2,11 +2,28 @@
 # src/io_utils.py
 # src/io_utils.py
 from __future__ import annotations
+import csv
+import gzip
+import hashlib
+import io
 import json
+import logging
 import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from dataclasses import asdict
 from datetime import datetime
-from typing import Any, Dict, Iterable, Optional
-from .rdkit_utils import smiles_to_sdf
+from typing import IO, TYPE_CHECKING, Any, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from .rdkit_utils import EmbedOptions
+
+# RDKit (via rdkit_utils) is imported inside the functions that draw or embed
+# structures, so reading CSVs or importing this module stays cheap.
+
+logger = logging.getLogger(__name__)
 
 
 # Try to import your dataclasses, but keep the code robust if fields differ
@@ -111,20 +128,103 @@ def _iter_melting_points(mps: Optional[Iterable[Any]]) -> Iterable[Dict[str, Any
     return out
 
 
-def write_outputs(result: Any, base_dir: str = "results") -> str:
+def sdf_props(result: Any) -> Dict[str, Any]:
+    """SD fields attached to structure.sdf for a resolved compound."""
+    cid = getattr(result, "cid", None)
+    return {
+        "CID": "" if cid is None else str(cid),
+        "IUPAC": getattr(result, "iupac_name", None) or "",
+    }
+
+
+def _write_json_atomic(path: str, data: Dict[str, Any]) -> None:
     """
-    Create results/<CompoundName>/ and write:
-      - metadata.json   (rich, machine-friendly)
-      - IUPAC.txt       (plain text)
-      - melting_point.csv
-      - structure.sdf   (with minimal properties)
-    Returns the absolute path to the created folder.
+    Write JSON to a temp file next to `path`, then rename it into place,
+    so readers never see a half-written file.
     """
-    folder_name = _result_folder_name(result)
-    out_dir = os.path.abspath(os.path.join(base_dir, folder_name))
-    _ensure_dir(out_dir)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+# ------------------------------------------------------------------
+# Background 3D generation (tiered output)
+# ------------------------------------------------------------------
+# A single worker keeps ETKDG/MMFF runs from competing with each other;
+# the executor is created on first use so batch runs never start it.
+_background_3d: Optional[ThreadPoolExecutor] = None
+_pending_3d: Dict[str, Future] = {}
+_background_lock = threading.Lock()
+
+
+def _background_executor() -> ThreadPoolExecutor:
+    global _background_3d
+    with _background_lock:
+        if _background_3d is None:
+            _background_3d = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chem-reporter-3d")
+        return _background_3d
+
+
+def _generate_3d(out_dir: str, smiles: str, props: Dict[str, Any],
+                 embed: Optional[EmbedOptions] = None) -> str:
+    """
+    Replace the 2D structure.sdf in `out_dir` with an optimized 3D conformer
+    and record the outcome in metadata.json ("structure_3d": done/failed).
+    """
+    sdf_path = os.path.join(out_dir, "structure.sdf")
+    meta_path = os.path.join(out_dir, "metadata.json")
+    from .rdkit_utils import build_3d_mol, embed_info, write_sdf
+
+    status, error, info = "done", None, None
+    try:
+        tmp = sdf_path + ".tmp"
+        mol = build_3d_mol(smiles, embed)
+        write_sdf(mol, tmp, props=props)
+        os.replace(tmp, sdf_path)
+        info = embed_info(mol)
+    except Exception as e:
+        status, error = "failed", str(e)
+        logger.warning("3D generation failed for %s: %s", smiles, e)
+
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        metadata["structure_3d"] = status
+        metadata["structure_3d_error"] = error
+        if info is not None:
+            metadata["structure"] = info
+        _write_json_atomic(meta_path, metadata)
+    except Exception as e:
+        logger.warning("Could not update %s: %s", meta_path, e)
+    return status
 
-    # Metadata
+
+def _forget_3d(out_dir: str, future: Future) -> None:
+    with _background_lock:
+        if _pending_3d.get(out_dir) is future:
+            del _pending_3d[out_dir]
+
+
+def wait_for_3d(out_dir: Optional[str] = None, timeout: Optional[float] = None) -> bool:
+    """
+    Block until background 3D generation has finished, either for one output
+    folder or for all pending folders. Returns True if nothing is left running.
+    """
+    with _background_lock:
+        if out_dir is not None:
+            futures = [f for d, f in _pending_3d.items() if d == os.path.abspath(out_dir)]
+        else:
+            futures = list(_pending_3d.values())
+    _, not_done = wait(futures, timeout=timeout)
+    return not not_done
+
+
+def build_metadata(result: Any, structure_3d: str = "done") -> Dict[str, Any]:
+    """
+    The metadata.json content for a resolved compound (without "structure");
+    "descriptors" only if the result has any.
+    """
     created_at = getattr(result, "created_at", None)
     if not created_at:
         created_at = datetime.utcnow().isoformat() + "Z"
@@ -134,34 +234,338 @@ def write_outputs(result: Any, base_dir: str = "results") -> str:
         "input_smiles": getattr(result, "input_smiles", ""),
         "cid": getattr(result, "cid", None),
         "iupac_name": getattr(result, "iupac_name", None),
-        "preferred_name": getattr(result, "preferred_name", None),  
+        "preferred_name": getattr(result, "preferred_name", None),
         "sources": _coerce_sources(getattr(result, "sources", None)),
         "melting_points": list(_iter_melting_points(getattr(result, "melting_points", None))),
         "errors": getattr(result, "errors", None),
+        "structure_3d": structure_3d,
     }
+    descriptors = getattr(result, "descriptors", None)
+    if descriptors:
+        metadata["descriptors"] = dict(descriptors)
+    return metadata
 
-    with open(os.path.join(out_dir, "metadata.json"), "w", encoding="utf-8") as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
 
-    # IUPAC.txt
-    with open(os.path.join(out_dir, "IUPAC.txt"), "w", encoding="utf-8") as f:
-        f.write(str(getattr(result, "iupac_name", "") or ""))
+def _write_if_changed(path: str, text: str) -> bool:
+    """
+    Write `text` to `path` (UTF-8, no newline translation) unless the file
+    already holds exactly that content. Returns True if it was written.
+    """
+    data = text.encode("utf-8")
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return True
 
-    # melting_point.csv
-    csv_path = os.path.join(out_dir, "melting_point.csv")
-    with open(csv_path, "w", encoding="utf-8") as f:
-        f.write("source,value,unit,notes,source_url\n")
-        for row in metadata["melting_points"]:
-            notes = "" if row["notes"] is None else row["notes"].replace("\n", " ").strip()
-            source_url = "" if row["source_url"] is None else row["source_url"]
-            f.write(f"{row['source']},{row['value']},{row['unit']},{notes},{source_url}\n")
 
-    # structure.sdf
-    props: Dict[str, Any] = {
-        "CID": "" if metadata["cid"] is None else str(metadata["cid"]),
-        "IUPAC": metadata["iupac_name"] or "",
+def write_text_files(out_dir: str, metadata: Dict[str, Any]) -> None:
+    """Write IUPAC.txt and melting_point.csv for one compound folder (if changed)."""
+    _write_if_changed(os.path.join(out_dir, "IUPAC.txt"), str(metadata.get("iupac_name") or ""))
+
+    lines = ["source,value,unit,notes,source_url\n"]
+    for row in metadata["melting_points"]:
+        notes = "" if row["notes"] is None else row["notes"].replace("\n", " ").strip()
+        source_url = "" if row["source_url"] is None else row["source_url"]
+        lines.append(f"{row['source']},{row['value']},{row['unit']},{notes},{source_url}\n")
+    _write_if_changed(os.path.join(out_dir, "melting_point.csv"), "".join(lines))
+
+
+# Bump when the layout or content of output folders changes, so folders
+# written by an older version are not mistaken for up to date.
+OUTPUT_FORMAT_VERSION = 1
+_OUTPUT_FILES = ("metadata.json", "IUPAC.txt", "melting_point.csv", "structure.sdf")
+
+
+def content_hash(result: Any, embed: Optional[EmbedOptions] = None) -> str:
+    """
+    SHA-256 over everything an output folder is derived from: canonical
+    SMILES, the resolved record (minus its timestamp), the 3D embedding
+    options and the RDKit version.
+    """
+    from rdkit import rdBase
+    from .rdkit_utils import EmbedOptions, canonicalize_smiles
+
+    record = build_metadata(result)
+    del record["created_at"], record["structure_3d"]
+    record.pop("descriptors", None)  # derived from the SMILES, like the structure
+    smiles = record["input_smiles"] or ""
+    try:
+        canonical = canonicalize_smiles(smiles)
+    except Exception:
+        canonical = smiles
+    payload = {
+        "format": OUTPUT_FORMAT_VERSION,
+        "canonical_smiles": canonical,
+        "record": record,
+        "embed": asdict(embed or EmbedOptions()),
+        "rdkit": rdBase.rdkitVersion,
     }
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def unchanged_outputs(result: Any, base_dir: str = "results",
+                      embed: Optional[EmbedOptions] = None) -> Optional[Dict[str, Any]]:
+    """
+    If the folder for `result` is complete and was produced from identical
+    inputs (same `content_hash`), return its metadata; otherwise None.
+    """
+    out_dir = os.path.abspath(os.path.join(base_dir, _result_folder_name(result)))
+    try:
+        with open(os.path.join(out_dir, "metadata.json"), "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if metadata.get("structure_3d") != "done" or metadata.get("content_hash") != content_hash(result, embed):
+        return None
+    if not all(os.path.isfile(os.path.join(out_dir, name)) for name in _OUTPUT_FILES):
+        return None
+    metadata["output_dir"] = out_dir
+    return metadata
+
+
+def _index_folder(base_dir: str, folder_name: str, metadata: Dict[str, Any],
+                  catalog: Optional[str] = None) -> None:
+    """Record a written folder in the results catalog; never fails the write."""
+    try:
+        from .catalog import CATALOG_FILENAME, catalog_for
+
+        catalog_for(base_dir, catalog or CATALOG_FILENAME).update(folder_name, metadata)
+    except Exception as e:
+        logger.warning("Could not update results catalog for %s: %s", folder_name, e)
+
+
+def write_outputs(
+    result: Any,
+    base_dir: str = "results",
+    tiered: bool = False,
+    embed: Optional[EmbedOptions] = None,
+    sdf_text: Optional[str] = None,
+    index: bool = True,
+    catalog: Optional[str] = None,
+) -> str:
+    """
+    Create results/<CompoundName>/ and write:
+      - metadata.json   (rich, machine-friendly)
+      - IUPAC.txt       (plain text)
+      - melting_point.csv
+      - structure.sdf   (with minimal properties)
+    Returns the absolute path to the created folder.
+
+    With `tiered=True` the structure is first written with 2D coordinates and
+    the call returns right away; the 3D conformer is generated by a background
+    worker that replaces structure.sdf when done. Progress is visible in
+    metadata.json as "structure_3d": "pending" -> "done" / "failed"
+    (see `wait_for_3d`).
+
+    `embed` controls 3D generation (conformer count, time budget, adaptive
+    mode; see `rdkit_utils.EmbedOptions`). How the conformers were produced
+    is recorded in metadata.json under "structure" and, for `Result`
+    objects, on `result.structure`.
+
+    `sdf_text` is a structure already generated elsewhere (e.g. by a batch
+    worker process, see `pipeline.build_structure`); it is written verbatim
+    and its embed info is taken from `result.structure`.
+
+    With `index=True` the folder is also recorded in the results catalog
+    (<base_dir>/catalog.sqlite, see catalog.py) for fast lookups; `catalog`
+    names another file under base_dir (a shard's catalog_<tag>.sqlite).
+
+    metadata.json stores a `content_hash` of the inputs (see `content_hash`).
+    If the folder already holds complete outputs with the same hash, nothing
+    is generated or written (the folder is still indexed); otherwise only
+    files whose content changed are rewritten.
+    """
+    folder_name = _result_folder_name(result)
+    out_dir = os.path.abspath(os.path.join(base_dir, folder_name))
+
+    existing = unchanged_outputs(result, base_dir, embed)
+    if existing is not None:
+        if hasattr(result, "structure"):
+            result.structure = existing.get("structure") or {}
+        if index:
+            # e.g. a shard's own catalog, or one rebuilt since the folder was written
+            _index_folder(base_dir, folder_name, existing, catalog)
+        return out_dir
+
+    _ensure_dir(out_dir)
+    metadata = build_metadata(result, structure_3d="pending" if tiered and sdf_text is None else "done")
+    metadata["content_hash"] = content_hash(result, embed)
+    write_text_files(out_dir, metadata)
+
+    # structure.sdf
+    from .rdkit_utils import build_3d_mol, embed_info, sdf_block, smiles_to_2d_mol
+
+    props = sdf_props(result)
     sdf_path = os.path.join(out_dir, "structure.sdf")
-    smiles_to_sdf(metadata["input_smiles"], sdf_path, props=props)
+    if sdf_text is not None:
+        _write_if_changed(sdf_path, sdf_text)
+        metadata["structure"] = dict(getattr(result, "structure", None) or {})
+    elif tiered:
+        _write_if_changed(sdf_path, sdf_block(smiles_to_2d_mol(metadata["input_smiles"]), props=props))
+    else:
+        mol = build_3d_mol(metadata["input_smiles"], embed)
+        keep = bool(embed and embed.keep_conformers)
+        _write_if_changed(sdf_path, sdf_block(mol, props=props, all_conformers=keep))
+        metadata["structure"] = embed_info(mol)
+        if hasattr(result, "structure"):
+            result.structure = metadata["structure"]
+
+    # metadata.json goes last so it never claims a structure that is not on disk
+    _write_json_atomic(os.path.join(out_dir, "metadata.json"), metadata)
+    if index:
+        _index_folder(base_dir, folder_name, metadata, catalog)
+
+    if tiered and sdf_text is None:
+        future = _background_executor().submit(
+            _generate_3d, out_dir, metadata["input_smiles"], props, embed
+        )
+        with _background_lock:
+            _pending_3d[out_dir] = future
+        future.add_done_callback(lambda f, d=out_dir: _forget_3d(d, f))
 
     return out_dir
+
+
+# ------------------------------------------------------------------
+# Batch input (streaming CSV)
+# ------------------------------------------------------------------
+
+SMILES_COLUMN_CANDIDATES = ("smiles", "SMILES")
+
+
+def open_text_input(path: str | os.PathLike, stack: ExitStack) -> IO[str]:
+    """
+    Open a (possibly compressed) text file for streaming reads:
+    .gz via gzip, .zst/.zstd via zstandard, anything else as plain text.
+    Every handle is registered on `stack`, which owns closing them.
+    """
+    name = str(path).lower()
+    if name.endswith(".gz"):
+        return stack.enter_context(gzip.open(path, "rt", newline="", encoding="utf-8-sig"))
+    if name.endswith((".zst", ".zstd")):
+        try:
+            import zstandard
+        except ImportError as exc:
+            raise ImportError(
+                "Reading .zst input requires the 'zstandard' package "
+                "(conda install -c conda-forge zstandard)."
+            ) from exc
+        raw = stack.enter_context(open(path, "rb"))
+        reader = stack.enter_context(zstandard.ZstdDecompressor().stream_reader(raw))
+        return stack.enter_context(io.TextIOWrapper(reader, encoding="utf-8-sig", newline=""))
+    return stack.enter_context(open(path, "r", newline="", encoding="utf-8-sig"))
+
+
+class SmilesCsvReader:
+    """
+    Stream rows of a SMILES CSV without loading the file into memory.
+
+        with SmilesCsvReader("library.csv.gz") as reader:
+            for index, smiles, row in reader:
+                ...
+
+    The SMILES column is detected from the header (`SMILES_COLUMN_CANDIDATES`).
+    With `buffer_size > 0` a background thread reads ahead into a bounded
+    queue, so decompression and CSV parsing overlap with processing while
+    memory stays capped at `buffer_size` rows.
+    Raises ValueError for an empty file or a missing SMILES column.
+    """
+
+    _END = object()
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        candidates: Sequence[str] = SMILES_COLUMN_CANDIDATES,
+        buffer_size: int = 0,
+    ) -> None:
+        self.path = path
+        self.candidates = tuple(candidates)
+        self.buffer_size = buffer_size
+        self.column: Optional[str] = None
+        self.fieldnames: list[str] = []
+        self._stack = ExitStack()
+        self._reader: Optional[Iterator[Dict[str, str]]] = None
+        self._first: Optional[Dict[str, str]] = None
+        self._closed = threading.Event()
+
+    def __enter__(self) -> "SmilesCsvReader":
+        try:
+            fh = open_text_input(self.path, self._stack)
+            reader = csv.DictReader(fh)
+            self._first = next(reader, None)
+            if self._first is None:
+                raise ValueError("Input CSV is empty.")
+            self.fieldnames = list(reader.fieldnames or [])
+            self.column = next((c for c in self.candidates if c in self.fieldnames), None)
+            if self.column is None:
+                raise ValueError(f"CSV must contain one of these columns: {self.candidates}")
+            self._reader = reader
+        except BaseException:
+            self._stack.close()
+            raise
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._closed.set()
+        self._stack.close()
+
+    def _rows(self) -> Iterator[Tuple[int, str, Dict[str, str]]]:
+        if self._reader is None:
+            raise RuntimeError("SmilesCsvReader must be used as a context manager.")
+        index = 1
+        if self._first is not None:
+            row, self._first = self._first, None
+            yield index, (row.get(self.column) or "").strip(), row
+            index += 1
+        for row in self._reader:
+            yield index, (row.get(self.column) or "").strip(), row
+            index += 1
+
+    def __iter__(self) -> Iterator[Tuple[int, str, Dict[str, str]]]:
+        if self.buffer_size <= 0:
+            yield from self._rows()
+            return
+
+        buf: "queue.Queue[Any]" = queue.Queue(maxsize=self.buffer_size)
+
+        def _put(item: Any) -> bool:
+            # Blocks while the buffer is full; gives up once the reader is closed
+            while not self._closed.is_set():
+                try:
+                    buf.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def _fill() -> None:
+            try:
+                for item in self._rows():
+                    if not _put(item):
+                        return
+            except BaseException as exc:
+                _put(exc)
+                return
+            _put(self._END)
+
+        threading.Thread(target=_fill, name="csv-prefetch", daemon=True).start()
+        while True:
+            item = buf.get()
+            if item is self._END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
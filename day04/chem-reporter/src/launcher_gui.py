@@ -1,8 +1,12 @@
 # src/launcher_gui.py
-import subprocess, os, threading
+import os, sys, threading
 from pathlib import Path
 import tkinter as tk
 from tkinter import filedialog, messagebox
+
+# Allow "python src/launcher_gui.py" as well as "python -m src.launcher_gui"
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from src import daemon
 # --- at top of src/launcher_gui.py ---
 import logging
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
@@ -12,16 +16,30 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 SCRIPTS = PROJECT_ROOT / "scripts"
 RESULTS = PROJECT_ROOT / "results"
 ICON_PATH = PROJECT_ROOT / "assets" / "icon.ico"
+WORKER_IDLE_TIMEOUT = 30 * 60  # seconds; the background worker exits after this long unused
+
+def ensure_worker():
+    """Start the background worker (src/daemon.py) unless one is already running."""
+    try:
+        if not daemon.is_running():
+            daemon.start_worker(idle_timeout=WORKER_IDLE_TIMEOUT)
+    except Exception as e:
+        logging.warning("Could not start the chem-reporter worker: %s", e)
 
-def run_and_open(cmd, status_lbl, buttons):
+def run_and_open(job, status_lbl, buttons):
+    """Run `job(log)` (returns an exit code) off the UI thread, then open the results."""
     for b in buttons: b.config(state="disabled")
     status_lbl.config(text="Running...")
 
+    def log(line):
+        if line.strip():
+            status_lbl.config(text=line if len(line) <= 80 else line[:77] + "...")
+
     def worker():
         try:
-            proc = subprocess.run(cmd, cwd=PROJECT_ROOT)
-            if proc.returncode != 0:
-                messagebox.showerror("Chem-Reporter", f"Exit code: {proc.returncode}")
+            code = job(log)
+            if code != 0:
+                messagebox.showerror("Chem-Reporter", f"Exit code: {code}")
             else:
                 if RESULTS.exists():
                     os.startfile(RESULTS)  # Windows: apre la cartella results
@@ -34,7 +52,9 @@ def run_and_open(cmd, status_lbl, buttons):
     threading.Thread(target=worker, daemon=True).start()
 
 def run_manual(status_lbl, buttons):
-    run_and_open(["cmd", "/c", str(SCRIPTS / "run_app.bat")], status_lbl, buttons)
+    # Opened in this process: no new interpreter, conda activation or RDKit import per window
+    from src.app_gui import ChemReporterApp
+    ChemReporterApp(tk.Toplevel(status_lbl.winfo_toplevel()))
 
 def run_csv(status_lbl, buttons):
     path = filedialog.askopenfilename(
@@ -44,7 +64,9 @@ def run_csv(status_lbl, buttons):
     )
     if not path:
         return
-    run_and_open(["cmd", "/c", str(SCRIPTS / "run_batch.bat"), path], status_lbl, buttons)
+    # Runs on the warm worker if it is up, otherwise in this process
+    argv = [path, "--results", str(RESULTS)]
+    run_and_open(lambda log: daemon.run_batch_via_worker(argv, log=log), status_lbl, buttons)
 
 def main():
     root = tk.Tk()
@@ -68,6 +90,7 @@ def main():
     btn_manual.pack(pady=6)
     btn_csv.pack(pady=6)
 
+    threading.Thread(target=ensure_worker, daemon=True).start()
     root.mainloop()
 
 if __name__ == "__main__":
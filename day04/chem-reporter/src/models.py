@@ -29,6 +29,12 @@ class Result:
     # Keep optional diagnostics compatible with existing code
     errors: List[str] = field(default_factory=list)
 
+    # How the 3D structure was generated (filled by io_utils.write_outputs)
+    structure: Dict[str, Any] = field(default_factory=dict)
+
+    # RDKit descriptors, {name: value} (filled by the batch pipeline, see descriptors.py)
+    descriptors: Dict[str, Any] = field(default_factory=dict)
+
     def to_dict(self) -> Dict[str, Any]:
         return {
             "input_smiles": self.input_smiles,
@@ -0,0 +1,896 @@
+# src/pipeline.py
+"""
+Concurrent batch executor for Chem-Reporter.
+
+Each row of a batch goes through three stages, each with its own workers:
+
+    reader (caller thread)
+      -> lookup threads      validate SMILES + PubChem resolve (I/O-bound)
+      -> RDKit dispatcher    3D structure in a process pool (CPU-bound)
+      -> writer thread       summary CSV, journal; files via an OutputWriter
+
+Stages are connected by bounded queues, and a window of at most
+`max_in_flight` rows is admitted at a time, so a slow stage applies
+backpressure all the way to the reader and memory stays bounded no matter
+how large the input is. The writer re-orders finished rows and appends them
+to the summary CSV in input order, flushing every row, so the summary of a
+crashed run still holds everything finished before the crash.
+
+Rows listed in `restored` (finished by an earlier, interrupted run; see
+checkpoint.py) skip every stage and go straight to the summary; newly
+finished rows are appended to the `journal`, except rows that failed for a
+transient reason (network errors, an offline cache miss, a failed write or
+a dead worker process), which a resumed run tries again.
+
+After a row is resolved, its output folder is checked against the content
+hash of its inputs (io_utils.content_hash); if it is already up to date the
+row skips 3D generation and writing altogether. If that folder lacks some
+of the requested `descriptors`, only those are computed, on the process
+pool, and added to its metadata.json.
+
+With `columnar` (see columnar.py) every computed compound is also added as
+one row of a Parquet / Arrow dataset; rows restored from the journal are
+added from their journal record and stored metadata.
+
+With `fingerprints` (see fingerprints.py) the Morgan fingerprint of every
+compound written (or found up to date) goes into the similarity-search store
+(computed by the 3D task, so the writer only appends it), and with
+`depictions` (see depict.py) its 2D image is drawn.
+
+With `descriptors` (names from descriptors.py) the 3D task also computes
+those RDKit descriptors, from the parsed molecule before embedding it (so a
+failed embedding keeps them); they become extra summary columns, columns of
+the columnar export and part of the stored compound.
+
+Journal entries are held back until the outputs they describe are durable:
+until the OutputWriter has fsynced the folders written so far or, with a
+`store` (see store.py; compounds then go into one SQLite database instead
+of per-compound folders), until the store has committed them.
+
+With `dedup` set, rows naming the same compound (same canonical SMILES or
+InChIKey) form a duplicate group: only the first one is resolved, embedded
+and written, and its outcome is copied to the others. Once that first row
+is written only its outcome is kept (the most recent `dedup_cache` in
+memory, the rest in a temporary SQLite file), so memory does not grow with
+the number of distinct compounds.
+
+The RDKit dispatcher does not hand molecules to the pool in arrival order:
+it keeps the ready ones in a heap and starts the most expensive first
+(longest-processing-time-first), so a large macrocycle that arrives late
+does not keep one core busy after the rest have gone idle. Costs come from
+an EmbedCostModel that is refitted on the timings observed during the run.
+"""
+from __future__ import annotations
+
+import csv
+import heapq
+import json
+import logging
+import os
+import queue
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import IO, Any, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .checkpoint import CheckpointJournal
+from .io_utils import _index_folder, sdf_props, unchanged_outputs
+from .columnar import ColumnarWriter, compound_row
+from .fingerprints import FingerprintStore
+from .store import ResultStore
+from .writer import OutputWriter
+from .rdkit_utils import (
+    ConformerBudget,
+    EmbedCostModel,
+    EmbedOptions,
+    build_3d_mol,
+    dedup_key,
+    embed_info,
+    sdf_block,
+    validate_smiles,
+)
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_FIELDS = [
+    "row", "input_smiles", "valid", "cid", "iupac_name", "output_dir", "error",
+    "num_confs", "embed_s", "elapsed_s", "dup_group",
+]
+
+# Fields a duplicate row takes over from the first row of its group
+_SHARED_FIELDS = ("valid", "cid", "iupac_name", "output_dir", "error", "num_confs", "embed_s")
+
+_STOP = object()
+_WRITTEN = object()  # tags an item coming back from the OutputWriter
+
+# How often the dispatcher re-checks its queue while every pool slot is busy
+_DISPATCH_POLL = 0.02
+
+
+def is_transient(exc: BaseException) -> bool:
+    """
+    Whether a failure may go away on a retry: anything but bad input
+    (ValueError, e.g. an invalid SMILES or no CID for it) and HTTP 4xx
+    answers other than 408 / 429.
+    """
+    if isinstance(exc, ValueError):
+        return False
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500 and status not in (408, 429):
+        return False
+    return True
+
+
+def new_record(index: int, smiles: str) -> Dict[str, Any]:
+    """Blank summary row for input row `index`."""
+    record: Dict[str, Any] = {name: "" for name in SUMMARY_FIELDS}
+    record.update(row=index, input_smiles=smiles, valid=False)
+    return record
+
+
+def build_structure(
+    smiles: str,
+    options: EmbedOptions,
+    props: Dict[str, Any],
+    descriptors: Sequence[str] = (),
+    fingerprint: Optional[Tuple[int, int]] = None,
+) -> Tuple[Optional[str], Dict[str, Any], Optional[str], Dict[str, Any], Optional[Tuple[str, bytes, bytes]]]:
+    """
+    Process-pool task: build the 3D structure for one molecule.
+    Returns (sdf_text, embed_info, error, descriptor values, fingerprint);
+    errors come back as text so that nothing RDKit-specific has to be
+    pickled across processes. Descriptors, and with
+    `fingerprint=(radius, n_bits)` its `fingerprints.compound_fingerprint`
+    (which the writer then only appends to the store), are computed first,
+    from the parsed 2D molecule, so they are returned even when embedding
+    fails; either is left empty if it cannot be computed.
+    """
+    from rdkit import Chem
+
+    values: Dict[str, Any] = {}
+    fp = None
+    mol = Chem.MolFromSmiles(smiles) if descriptors or fingerprint else None
+    if mol is not None:
+        if descriptors:
+            from .descriptors import compute
+
+            try:
+                values = compute(mol, descriptors)
+            except Exception as e:
+                logger.warning("Descriptors of %s not computed: %s", smiles, e)
+        if fingerprint is not None:
+            from .fingerprints import compound_fingerprint
+
+            try:
+                fp = compound_fingerprint(mol, *fingerprint)
+            except Exception as e:
+                logger.warning("Fingerprint of %s not computed: %s", smiles, e)
+    try:
+        mol = build_3d_mol(smiles, options)
+        sdf = sdf_block(mol, props=props, all_conformers=options.keep_conformers)
+        return sdf, embed_info(mol), None, values, fp
+    except Exception as e:
+        return None, {}, str(e), values, fp
+
+
+def default_rdkit_workers() -> int:
+    """Leave one core for the lookup/writer threads."""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+@dataclass
+class _Group:
+    """A duplicate group whose first row is still being processed."""
+    gid: int
+    key: str
+    waiting: List["_Item"] = field(default_factory=list)
+
+
+class _FinishedGroups:
+    """
+    Outcomes of duplicate groups whose first row has been written, as
+    key -> (gid, shared summary fields, transient). The `capacity` most
+    recently used stay in memory; older ones are moved to a SQLite file in a
+    temporary directory, so memory stays bounded however many distinct
+    compounds a run sees. Not thread-safe (the pipeline holds its lock).
+    """
+
+    def __init__(self, capacity: int = 100_000) -> None:
+        self.capacity = max(1, capacity)
+        self._recent: "OrderedDict[str, Tuple[int, Dict[str, Any], bool]]" = OrderedDict()
+        self._dir: Optional[str] = None
+        self._db: Optional[sqlite3.Connection] = None
+
+    def get(self, key: str) -> Optional[Tuple[int, Dict[str, Any], bool]]:
+        entry = self._recent.get(key)
+        if entry is not None:
+            self._recent.move_to_end(key)
+            return entry
+        if self._db is None:
+            return None
+        row = self._db.execute("SELECT gid, outcome, transient FROM groups WHERE key = ?", (key,)).fetchone()
+        return (row[0], json.loads(row[1]), bool(row[2])) if row else None
+
+    def put(self, key: str, gid: int, outcome: Dict[str, Any], transient: bool) -> None:
+        self._recent[key] = (gid, outcome, transient)
+        self._recent.move_to_end(key)
+        if len(self._recent) > self.capacity:
+            old_key, (old_gid, old_outcome, old_transient) = self._recent.popitem(last=False)
+            if self._db is None:
+                self._dir = tempfile.mkdtemp(prefix="chem-reporter-dedup-")
+                self._db = sqlite3.connect(os.path.join(self._dir, "groups.sqlite"),
+                                           isolation_level=None, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=OFF")
+                self._db.execute("PRAGMA synchronous=OFF")
+                self._db.execute("CREATE TABLE groups (key TEXT PRIMARY KEY, gid INTEGER, "
+                                 "outcome TEXT, transient INTEGER)")
+            self._db.execute("INSERT OR REPLACE INTO groups VALUES (?, ?, ?, ?)",
+                             (old_key, old_gid, json.dumps(old_outcome), int(old_transient)))
+
+    def __len__(self) -> int:
+        spilled = self._db.execute("SELECT COUNT(*) FROM groups").fetchone()[0] if self._db else 0
+        return len(self._recent) + spilled
+
+    def close(self) -> None:
+        self._recent.clear()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+
+
+@dataclass
+class _Item:
+    seq: int
+    index: int
+    smiles: str
+    record: Dict[str, Any]
+    started: float = field(default_factory=time.perf_counter)
+    result: Any = None
+    options: Optional[EmbedOptions] = None
+    sdf_text: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    group: Optional[_Group] = None
+    duplicate: bool = False
+    restored: bool = False
+    unchanged: bool = False  # output folder already up to date
+    backfill: bool = False  # ... but its metadata.json lacks requested descriptors
+    transient: bool = False  # failed for a reason a retry may fix; not journaled
+    cost: Optional[Tuple[Tuple[float, ...], int]] = None  # EmbedCostModel.describe()
+    fingerprint: Optional[Tuple[str, bytes, bytes]] = None  # computed on the pool
+
+
+class SummaryWriter:
+    """
+    Append summary rows in input order. Rows may arrive out of order (keyed
+    by a 0-based sequence number); they are held back until every earlier
+    row has been written, and the file is flushed after each write.
+    """
+
+    def __init__(self, fh: IO[str], fieldnames: List[str] = SUMMARY_FIELDS) -> None:
+        self._fh = fh
+        self._writer = csv.DictWriter(fh, fieldnames=fieldnames, extrasaction="ignore")
+        self._writer.writeheader()
+        self._fh.flush()
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._next = 0
+        self.rows_written = 0
+        self.last_row: Any = None  # input row of the last record written
+
+    def add(self, seq: int, record: Dict[str, Any]) -> int:
+        """Queue a finished row; returns how many rows were written to disk."""
+        self._pending[seq] = record
+        written = 0
+        while self._next in self._pending:
+            record = self._pending.pop(self._next)
+            self._writer.writerow(record)
+            self.last_row = record.get("row")
+            self._next += 1
+            written += 1
+        if written:
+            self._fh.flush()
+            self.rows_written += written
+        return written
+
+
+class BatchPipeline:
+    """
+    Run validate -> resolve -> 3D structure -> write_outputs for a stream of
+    (row_index, smiles) pairs and write an ordered summary.
+
+    Parameters
+    ----------
+    results_dir : str
+        Base directory for per-compound output folders.
+    embed : EmbedOptions, optional
+        3D generation settings (conformers, time budget, adaptive mode).
+    budget : ConformerBudget, optional
+        Shared CPU budget for adaptive conformer counts.
+    resolver : callable, optional
+        SMILES -> Result lookup; defaults to `pubchem.resolve`.
+    lookup_workers : int
+        Threads doing PubChem lookups.
+    rdkit_workers : int, optional
+        Processes for 3D generation; 0 runs RDKit in the dispatcher thread.
+    pool : Executor, optional
+        Run 3D generation on this process pool (e.g. shared with other
+        stages; not shut down here) instead of one of its own; at most
+        `rdkit_workers` structures are in it at a time.
+    max_in_flight : int
+        Rows admitted into the pipeline before the reader blocks.
+    dedup : str, optional
+        "smiles" or "inchikey" to compute each distinct compound once;
+        None processes every row independently.
+    dedup_cache : int
+        Finished duplicate groups kept in memory; older ones are looked up
+        from a temporary SQLite file.
+    journal : CheckpointJournal, optional
+        Receives every newly finished row, except transient failures (must
+        already be started).
+    restored : dict, optional
+        {row_index: summary record} of rows finished by a previous run.
+    cost_model : EmbedCostModel, optional
+        Orders 3D work longest-first; a fresh model is trained during the run.
+    store : ResultStore, optional
+        Write compounds into this store instead of per-compound folders;
+        `output_dir` in the summary is then the compound's store key.
+    columnar : ColumnarWriter, optional
+        Receives one row per computed compound (duplicates are not
+        repeated; restored rows are added from their journal record).
+    fingerprints : FingerprintStore, optional
+        Receives the fingerprint of every compound written or up to date.
+    depictions : DepictionStage, optional
+        Draws every compound written or up to date; told how far the
+        ordered summary has got, so it can draw each full grid page.
+    descriptors : sequence of str
+        Descriptor names (see descriptors.py) to compute for every compound.
+    catalog : str, optional
+        File name of the results catalog under `results_dir` (default
+        catalog.sqlite; a shard uses its own, see catalog.catalog_filename).
+    log : callable
+        Receives one progress line per finished row.
+    """
+
+    def __init__(
+        self,
+        results_dir: str,
+        *,
+        embed: Optional[EmbedOptions] = None,
+        budget: Optional[ConformerBudget] = None,
+        resolver: Optional[Callable[[str], Any]] = None,
+        lookup_workers: int = 4,
+        rdkit_workers: Optional[int] = None,
+        pool: Optional[Executor] = None,
+        max_in_flight: int = 64,
+        dedup: Optional[str] = None,
+        dedup_cache: int = 100_000,
+        journal: Optional[CheckpointJournal] = None,
+        restored: Optional[Dict[int, Dict[str, Any]]] = None,
+        cost_model: Optional[EmbedCostModel] = None,
+        store: Optional[ResultStore] = None,
+        columnar: Optional[ColumnarWriter] = None,
+        fingerprints: Optional[FingerprintStore] = None,
+        depictions: Optional[Any] = None,
+        descriptors: Sequence[str] = (),
+        catalog: Optional[str] = None,
+        log: Callable[[str], None] = print,
+    ) -> None:
+        if resolver is None:
+            from .pubchem import resolve as resolver
+        self.results_dir = str(results_dir)
+        self.embed = embed or EmbedOptions()
+        self.budget = budget
+        self.resolver = resolver
+        self.lookup_workers = max(1, lookup_workers)
+        self.rdkit_workers = default_rdkit_workers() if rdkit_workers is None else rdkit_workers
+        self.pool = pool
+        self.max_in_flight = max(1, max_in_flight)
+        self.dedup = dedup
+        self.journal = journal
+        self.restored = restored or {}
+        self.cost_model = cost_model or EmbedCostModel()
+        self.store = store
+        self.columnar = columnar
+        self.fingerprints = fingerprints
+        self.depictions = depictions
+        self.descriptors = tuple(descriptors)
+        self.catalog = catalog
+        self.log = log
+        self.stats: Dict[str, int] = {
+            "rows": 0, "ok": 0, "errors": 0, "deduplicated": 0, "restored": 0, "unchanged": 0,
+        }
+
+        self._lookup_q: "queue.Queue[Any]" = queue.Queue(maxsize=self.max_in_flight)
+        self._rdkit_q: "queue.Queue[Any]" = queue.Queue(maxsize=self.max_in_flight)
+        self._write_q: "queue.Queue[Any]" = queue.Queue(maxsize=self.max_in_flight)
+        self._window = threading.Semaphore(self.max_in_flight)
+        # One slot per worker: molecules wait in the dispatcher's heap, not in
+        # the pool's FIFO queue, so the scheduling choice is made as late as possible
+        self._pool_slots = threading.Semaphore(max(1, self.rdkit_workers))
+        self._failure: Optional[BaseException] = None
+        self._summary: Optional[SummaryWriter] = None
+        self._held = 0  # rows admitted but not yet written (writer thread only)
+        self._groups: Dict[str, _Group] = {}  # first row still in flight
+        self._finished_groups = _FinishedGroups(dedup_cache)
+        self._groups_lock = threading.Lock()
+        # (OutputWriter.written when finished, row, record): waiting for an fsync or store commit
+        self._unjournaled: Deque[Tuple[int, int, Dict[str, Any]]] = deque()
+        self._output: Optional[OutputWriter] = None
+        # Keep duplicate-group ids unique across resumed runs
+        self._gid_offset = max(
+            (int(r["dup_group"]) for r in self.restored.values() if str(r.get("dup_group", "")).isdigit()),
+            default=0,
+        )
+        self._last_gid = self._gid_offset
+        self._restored_groups: set = set()  # dup_group ids of restored rows in the columnar export
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def run(self, rows: Iterable[Tuple[int, str]], summary_fh: IO[str]) -> Dict[str, int]:
+        """
+        Process every (row_index, smiles) pair and write the summary CSV to
+        `summary_fh`. Returns counters: rows / ok / errors / deduplicated /
+        restored / unchanged.
+        """
+        self._summary = SummaryWriter(summary_fh, SUMMARY_FIELDS + list(self.descriptors))
+        if self.store is None:
+            self._output = OutputWriter(self.results_dir, max_pending=self.max_in_flight,
+                                        catalog=self.catalog)
+        pool: Optional[Executor] = self.pool
+        if pool is None and self.rdkit_workers > 0:
+            pool = ProcessPoolExecutor(self.rdkit_workers)
+
+        lookups = [
+            threading.Thread(target=self._lookup_loop, name=f"lookup-{n}", daemon=True)
+            for n in range(self.lookup_workers)
+        ]
+        dispatcher = threading.Thread(target=self._rdkit_loop, args=(pool,), name="rdkit-dispatch", daemon=True)
+        writer = threading.Thread(target=self._write_loop, name="writer", daemon=True)
+        for t in (*lookups, dispatcher, writer):
+            t.start()
+
+        try:
+            for seq, (index, smiles) in enumerate(rows):
+                self._window.acquire()
+                if self._failure is not None:
+                    break
+                item = _Item(seq, index, smiles, new_record(index, smiles))
+                previous = self.restored.get(index)
+                if previous is not None:
+                    item.record.update(previous)
+                    item.restored = True
+                    self._write_q.put(item)
+                else:
+                    self._lookup_q.put(item)
+        finally:
+            for _ in lookups:
+                self._lookup_q.put(_STOP)
+            for t in lookups:
+                t.join()
+            self._rdkit_q.put(_STOP)
+            dispatcher.join()
+            self._write_q.put(_STOP)
+            writer.join()
+            if self._output is not None:
+                self._output.close()
+            if self.store is not None:
+                self.store.commit()
+            self._flush_journal(everything=True)  # every output is synced or committed now
+            if pool is not None and pool is not self.pool:
+                pool.shutdown(wait=True, cancel_futures=True)
+            with self._groups_lock:
+                self._finished_groups.close()
+
+        if self._failure is not None:
+            raise self._failure
+        return self.stats
+
+    # ------------------------------------------------------------------
+    # Stages
+    # ------------------------------------------------------------------
+    def _lookup_loop(self) -> None:
+        while True:
+            item = self._lookup_q.get()
+            if item is _STOP:
+                return
+            self._lookup(item)
+
+    def _lookup(self, item: _Item) -> None:
+        record = item.record
+        t0 = time.perf_counter()
+        try:
+            if not item.smiles:
+                record["error"] = "Empty SMILES cell"
+            else:
+                record["valid"] = bool(validate_smiles(item.smiles))
+                if not record["valid"]:
+                    record["error"] = "Invalid SMILES"
+                elif self.dedup and self._join_group(item):
+                    return  # a duplicate: parked until the group's first row is written
+                else:
+                    item.result = self.resolver(item.smiles)
+                    record["cid"] = str(item.result.cid or "")
+                    record["iupac_name"] = item.result.iupac_name or ""
+                    if self.store is None:
+                        self._check_unchanged(item)
+        except Exception as e:
+            record["error"] = str(e)
+            item.result = None
+            item.transient = is_transient(e)
+        item.timings["resolve"] = time.perf_counter() - t0
+
+        if item.result is None or (item.unchanged and not item.backfill):
+            self._write_q.put(item)
+        else:
+            self._rdkit_q.put(item)
+
+    def _check_unchanged(self, item: _Item) -> None:
+        existing = unchanged_outputs(item.result, self.results_dir, self.embed)
+        if existing is None:
+            return
+        item.unchanged = True
+        _index_folder(self.results_dir, os.path.basename(existing["output_dir"]), existing, self.catalog)
+        info = existing.get("structure") or {}
+        item.result.structure = info
+        item.record["output_dir"] = existing["output_dir"]
+        item.record["num_confs"] = info.get("num_confs", "")
+        if info.get("seconds") is not None:
+            item.record["embed_s"] = f"{info['seconds']:.2f}"
+        if self.descriptors:
+            values = existing.get("descriptors") or {}
+            if all(name in values for name in self.descriptors):
+                self._set_descriptors(item, values)
+            else:
+                item.backfill = True  # computed on the pool, see _submit_structure
+
+    def _set_descriptors(self, item: _Item, values: Dict[str, Any]) -> None:
+        values = {name: values.get(name) for name in self.descriptors}
+        item.result.descriptors = values
+        item.record.update({name: "" if value is None else value for name, value in values.items()})
+
+    def _join_group(self, item: _Item) -> bool:
+        """
+        Attach `item` to the duplicate group of its compound. Returns False if
+        it is the first row of the group (and must be processed), True if it
+        is a duplicate that has been parked or already sent to the writer.
+        """
+        key = dedup_key(item.smiles, self.dedup)
+        if key is None:
+            return False
+        with self._groups_lock:
+            group = self._groups.get(key)
+            if group is not None:
+                item.group = group
+                item.duplicate = True
+                item.record["dup_group"] = group.gid
+                group.waiting.append(item)
+                return True
+            finished = self._finished_groups.get(key)
+            if finished is None:
+                self._last_gid += 1
+                group = self._groups[key] = _Group(gid=self._last_gid, key=key)
+                item.group = group
+                item.record["dup_group"] = group.gid
+                return False
+            gid, outcome, transient = finished
+            item.duplicate = True
+            item.record["dup_group"] = gid
+            item.record.update(outcome)
+            item.transient = transient
+        self._write_q.put(item)
+        return True
+
+    def _rdkit_loop(self, pool: Optional[Executor]) -> None:
+        ready: List[Tuple[float, int, _Item]] = []
+        stopping = False
+        while ready or not stopping:
+            # Take in everything queued; block only when there is nothing to run
+            while not stopping:
+                try:
+                    item = self._rdkit_q.get(block=not ready)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                else:
+                    heapq.heappush(ready, self._schedule_key(item))
+            if ready and self._pool_slots.acquire(timeout=_DISPATCH_POLL):
+                self._submit_structure(heapq.heappop(ready)[2], pool)
+        # Wait for outstanding pool tasks before the writer is told to stop
+        slots = max(1, self.rdkit_workers)
+        for _ in range(slots):
+            self._pool_slots.acquire()
+        for _ in range(slots):
+            self._pool_slots.release()
+
+    def _schedule_key(self, item: _Item) -> Tuple[float, int, _Item]:
+        """
+        Heap key: arrival time minus predicted cost. Among molecules waiting
+        together the most expensive runs first; a cheap one is overtaken only
+        by newcomers that are expensive enough to make up for its wait, so
+        nothing starves and the ordered summary keeps moving.
+        """
+        if not item.backfill:
+            item.cost = self.cost_model.describe(item.smiles, self.embed)
+        predicted = self.cost_model.predict(*item.cost) if item.cost else 0.0
+        return time.perf_counter() - predicted, item.seq, item
+
+    def _submit_structure(self, item: _Item, pool: Optional[Executor]) -> None:
+        """Start 3D generation for `item`; the caller holds a pool slot."""
+        if item.backfill:
+            from .descriptors import add_to_metadata
+
+            args = (os.path.join(item.record["output_dir"], "metadata.json"), self.descriptors)
+            if pool is None:
+                future: Future = Future()
+                try:
+                    future.set_result(add_to_metadata(*args))
+                except Exception as e:
+                    future.set_exception(e)
+                self._backfill_done(item, future)
+                return
+            try:
+                future = pool.submit(add_to_metadata, *args)
+            except Exception as e:
+                self._submit_failed(item, e)
+                return
+            future.add_done_callback(lambda f, it=item: self._backfill_done(it, f))
+            return
+        try:
+            item.options = self.budget.plan(item.smiles, self.embed) if self.budget else self.embed
+        except Exception as e:
+            self._pool_slots.release()
+            item.record["error"] = str(e)
+            self._write_q.put(item)
+            return
+
+        fps = self.fingerprints
+        args = (item.smiles, item.options, sdf_props(item.result), self.descriptors,
+                (fps.radius, fps.n_bits) if fps is not None else None)
+        t0 = time.perf_counter()
+        if pool is None:
+            self._structure_done(item, t0, build_structure(*args))
+            return
+        try:
+            future = pool.submit(build_structure, *args)
+        except Exception as e:
+            self._submit_failed(item, e)
+            return
+        future.add_done_callback(lambda f, it=item, start=t0: self._structure_done(it, start, f))
+
+    def _submit_failed(self, item: _Item, exc: Exception) -> None:
+        """The pool refused the task (e.g. BrokenProcessPool after a worker was killed)."""
+        self._pool_slots.release()
+        logger.error("Could not start RDKit work for row %s: %s", item.index, exc)
+        item.record["error"] = str(exc) or type(exc).__name__
+        item.transient = True
+        self._write_q.put(item)
+
+    def _structure_done(self, item: _Item, t0: float, outcome: Any) -> None:
+        try:
+            if isinstance(outcome, Future):
+                outcome = outcome.result()
+            item.sdf_text, info, error, values, item.fingerprint = outcome
+        except Exception as e:  # e.g. a worker process died
+            item.sdf_text, info, error, values = None, {}, str(e), {}
+            item.transient = True
+        finally:
+            self._pool_slots.release()
+        item.timings["structure"] = time.perf_counter() - t0
+
+        item.result.structure = info
+        if values:
+            self._set_descriptors(item, values)
+        if error:
+            item.record["error"] = error
+        if info:
+            item.record["num_confs"] = info.get("num_confs", "")
+            if info.get("seconds") is not None:
+                item.record["embed_s"] = f"{info['seconds']:.2f}"
+                if self.budget:
+                    self.budget.charge(info["seconds"], info.get("num_confs", 1))
+                if item.cost:
+                    # The count `predict` was given: the adaptive one unless a budget fixed it
+                    requested = item.cost[1] if item.options.adaptive else item.options.num_confs
+                    self.cost_model.observe(item.cost[0], requested, info["seconds"])
+        self._write_q.put(item)
+
+    def _backfill_done(self, item: _Item, future: Future) -> None:
+        try:
+            self._set_descriptors(item, future.result())
+        except Exception as e:  # the folder stays as it was; the next run tries again
+            logger.warning("Descriptors for row %s not added: %s", item.index, e)
+        finally:
+            self._pool_slots.release()
+        self._write_q.put(item)
+
+    def _write_loop(self) -> None:
+        stopping = False
+        while True:
+            if not stopping:
+                message = self._write_q.get()
+            else:
+                try:
+                    message = self._write_q.get_nowait()
+                except queue.Empty:
+                    return
+            if message is _STOP:
+                # Writes still in the OutputWriter come back as _WRITTEN messages
+                if self._output is not None:
+                    self._output.flush()
+                stopping = True
+                continue
+            if isinstance(message, tuple):  # (_WRITTEN, item, future)
+                _tag, item, future = message
+                handler = lambda it=item, f=future: self._written(it, f)
+            else:
+                item = message
+                self._held += 1
+                handler = lambda it=item: self._finish(it)
+            if self._failure is None:
+                try:
+                    handler()
+                except BaseException as e:  # summary file unusable: abort the run
+                    self._failure = e
+                    logger.error("Batch writer failed: %s", e)
+            if self._failure is not None:
+                # Nothing more will be flushed; free the window so the reader can stop
+                with self._groups_lock:
+                    for group in self._groups.values():
+                        self._held += len(group.waiting)
+                        group.waiting.clear()
+                for _ in range(self._held):
+                    self._window.release()
+                self._held = 0
+
+    def _finish(self, item: _Item) -> None:
+        record = item.record
+        if item.restored:
+            self.stats["restored"] += 1
+            self.stats["rows"] += 1
+            self.stats["errors" if record.get("error") else "ok"] += 1
+            if self.columnar is not None:
+                self._add_restored_row(item)
+            self._write_summary(item)
+            return
+        if item.duplicate:
+            self.stats["deduplicated"] += 1
+        elif item.unchanged:
+            self.stats["unchanged"] += 1
+        elif item.sdf_text is not None and not record["error"]:
+            item.timings["write"] = time.perf_counter()
+            if self.store is None:
+                # File I/O runs on the OutputWriter; the row completes in _written
+                future = self._output.submit(item.result, embed=self.embed, sdf_text=item.sdf_text)
+                future.add_done_callback(lambda f, it=item: self._write_q.put((_WRITTEN, it, f)))
+                return
+            try:
+                record["output_dir"] = self.store.add(item.result, item.sdf_text)
+            except Exception as e:
+                record["error"] = str(e)
+                item.transient = True
+            item.timings["write"] = time.perf_counter() - item.timings["write"]
+        self._complete(item)
+
+    def _written(self, item: _Item, future: "Future[str]") -> None:
+        try:
+            item.record["output_dir"] = str(future.result())
+        except Exception as e:
+            item.record["error"] = str(e)
+            item.transient = True
+        item.timings["write"] = time.perf_counter() - item.timings["write"]
+        self._complete(item)
+
+    def _complete(self, item: _Item) -> None:
+        """Summary, journal and duplicate fan-out for a row whose outputs are done."""
+        record = item.record
+        record["elapsed_s"] = f"{time.perf_counter() - item.started:.2f}"
+
+        self.stats["rows"] += 1
+        note = f" (duplicate, group {record['dup_group']})" if item.duplicate else ""
+        if item.unchanged:
+            note = " (unchanged, skipped)"
+        if record["error"]:
+            self.stats["errors"] += 1
+            self.log(f"[{item.index}] ERROR: {item.smiles} → {record['error']}{note}")
+        else:
+            self.stats["ok"] += 1
+            self.log(f"[{item.index}] OK: {item.smiles} → CID={record['cid']}{note}")
+
+        if self.columnar is not None and not item.duplicate:
+            self.columnar.add(compound_row(record, item.result, item.timings, self.descriptors))
+        if not item.duplicate and not record["error"] and record.get("output_dir"):
+            if self.fingerprints is not None:
+                self._add_fingerprint(item)
+            if self.depictions is not None:
+                self._add_depiction(item)
+        self._write_summary(item)
+        if self.journal is not None and not item.transient:
+            written = self._output.written if self._output is not None else 0
+            self._unjournaled.append((written, item.index, record))
+            self._flush_journal()
+
+        if item.group is not None and not item.duplicate:
+            # Fan the outcome out to duplicates that arrived before it was known
+            outcome = {name: record.get(name, "") for name in _SHARED_FIELDS + self.descriptors}
+            with self._groups_lock:
+                # Only the compact outcome outlives the group
+                self._groups.pop(item.group.key, None)
+                self._finished_groups.put(item.group.key, item.group.gid, outcome, item.transient)
+                waiting, item.group.waiting = item.group.waiting, []
+            for dup in waiting:
+                dup.record.update(outcome)
+                dup.transient = item.transient
+                self._held += 1
+                self._finish(dup)
+
+    def _add_restored_row(self, item: _Item) -> None:
+        """
+        Columnar row for a row finished by an earlier run, from its journal
+        record and stored metadata, so a resumed run's export is complete.
+        """
+        from types import SimpleNamespace
+
+        record = item.record
+        gid = str(record.get("dup_group") or "")
+        if gid:
+            if gid in self._restored_groups:
+                return  # duplicates are not repeated, as in a single run
+            self._restored_groups.add(gid)
+        metadata: Optional[Dict[str, Any]] = None
+        output_dir = record.get("output_dir")
+        if output_dir and not record.get("error"):
+            try:
+                if self.store is not None:
+                    metadata = self.store.get(output_dir)
+                else:
+                    with open(os.path.join(output_dir, "metadata.json"), "r", encoding="utf-8") as f:
+                        metadata = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Stored outputs of restored row %s not readable: %s", item.index, e)
+        result = SimpleNamespace(**{k: (metadata or {}).get(k) for k in
+                                    ("cid", "iupac_name", "preferred_name", "melting_points")})
+        self.columnar.add(compound_row(record, result, None, self.descriptors))
+
+    def _add_fingerprint(self, item: _Item) -> None:
+        from .io_utils import build_metadata
+
+        try:
+            self.fingerprints.add_metadata(os.path.basename(item.record["output_dir"]),
+                                           build_metadata(item.result), fingerprint=item.fingerprint)
+        except Exception as e:  # a missing fingerprint must not fail the row
+            logger.warning("Fingerprint for row %s not stored: %s", item.index, e)
+
+    def _add_depiction(self, item: _Item) -> None:
+        result = item.result
+        legend = (getattr(result, "preferred_name", None) or getattr(result, "iupac_name", None)
+                  or (f"CID {result.cid}" if getattr(result, "cid", None) else ""))
+        try:
+            self.depictions.add(item.index, os.path.basename(item.record["output_dir"]), item.smiles, legend)
+        except Exception as e:
+            logger.warning("Depiction for row %s not queued: %s", item.index, e)
+
+    def _write_summary(self, item: _Item) -> None:
+        written = self._summary.add(item.seq, item.record)
+        for _ in range(written):
+            self._window.release()
+        self._held -= written
+        if written and self.depictions is not None:
+            self.depictions.advance(self._summary.last_row)  # grid pages up to here are final
+
+    def _flush_journal(self, everything: bool = False) -> None:
+        """Journal the rows whose outputs are durable (all of them once outputs are closed)."""
+        if self.store is not None and self.store.uncommitted and not everything:
+            return
+        synced = self._output.synced if self._output is not None else 0
+        while self._unjournaled and (everything or self._unjournaled[0][0] <= synced):
+            _written, index, record = self._unjournaled.popleft()
+            self.journal.record(index, record)
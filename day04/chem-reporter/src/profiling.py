@@ -0,0 +1,317 @@
+# src/profiling.py
+"""
+Built-in profiling for batch and single-compound runs (`--profile`).
+
+Two profilers, both covering every thread of the run:
+
+  sampling (default)  a background thread snapshots all Python stacks every
+                      few milliseconds (sys._current_frames); low overhead,
+                      so timings stay realistic. Writes <out>.folded, one
+                      "stage;frame;frame... count" line per distinct stack,
+                      which flamegraph.pl, speedscope and inferno read as is.
+  cprofile            deterministic: one cProfile.Profile per thread.
+                      Exact call counts, higher overhead. Writes <out>.pstats
+                      (snakeviz, `python -m pstats`, flameprof).
+
+Either way <out>.txt holds the top-N hot functions per pipeline stage, so a
+regression shows up in the stage it belongs to. Stages follow the thread
+names used by src/pipeline.py, src/writer.py and src/io_utils.py:
+
+  input      main thread, CSV reading and row dispatch (csv-prefetch)
+  resolve    PubChem lookups (lookup-N)
+  structure  RDKit 3D generation run in-process (rdkit-dispatch)
+  write      output files, store, catalog (writer, output-writer, chem-reporter-3d)
+
+Code that does several stages on one thread (run_pipeline.py) marks them
+with `with stage("resolve"): ...`, which takes precedence over the thread name.
+
+RDKit work done by --rdkit-workers processes is not visible from the
+parent, so `run_batch.py --profile` runs it in-process (the "structure"
+stage) unless --rdkit-workers is given explicitly, and warns if it is.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+PROFILE_MODES = ("sampling", "cprofile")
+STAGES = ("input", "resolve", "structure", "write", "other")
+
+# Thread name prefix -> stage
+_STAGE_BY_THREAD: Tuple[Tuple[str, str], ...] = (
+    ("MainThread", "input"),
+    ("csv-prefetch", "input"),
+    ("lookup-", "resolve"),
+    ("rdkit-dispatch", "structure"),
+    ("writer", "write"),
+    ("output-writer", "write"),
+    ("chem-reporter-3d", "write"),
+)
+
+# Innermost frames of a thread that is blocked, not working
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("queue.py", "put"),
+    ("selectors.py", "select"),
+}
+# ... and the built-ins cProfile charges blocking time to
+_IDLE_BUILTINS = {
+    "<method 'acquire' of '_thread.lock' objects>",
+    "<method 'acquire' of '_thread.RLock' objects>",
+}
+
+
+# Thread ident -> stage set by `stage()`; read by the profilers
+_stage_overrides: Dict[int, str] = {}
+_active: Optional["DeterministicProfiler"] = None
+
+
+def stage_of(thread_name: str, ident: Optional[int] = None) -> str:
+    if ident is not None and ident in _stage_overrides:
+        return _stage_overrides[ident]
+    for prefix, name in _STAGE_BY_THREAD:
+        if thread_name.startswith(prefix):
+            return name
+    return "other"
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Attribute the current thread's work inside the block to stage `name`."""
+    ident = threading.get_ident()
+    previous = _stage_overrides.get(ident)
+    _stage_overrides[ident] = name
+    if _active is not None:
+        _active.switch()
+    try:
+        yield
+    finally:
+        if previous is None:
+            _stage_overrides.pop(ident, None)
+        else:
+            _stage_overrides[ident] = previous
+        if _active is not None:
+            _active.switch()
+
+
+def _short_path(filename: str) -> str:
+    """site-packages/rdkit/Chem/x.py -> rdkit/Chem/x.py; project files relative to the repo."""
+    norm = filename.replace("\\", "/")
+    marker = "-packages/"
+    if marker in norm:
+        return norm.split(marker, 1)[1]
+    root = str(Path(__file__).resolve().parents[1]).replace("\\", "/") + "/"
+    if norm.startswith(root):
+        return norm[len(root):]
+    return os.path.basename(norm)
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the stacks of all other threads every `interval` seconds."""
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.samples: "Counter[Tuple[str, Tuple[str, ...]]]" = Counter()
+        self.idle: "Counter[str]" = Counter()
+        self.elapsed = 0.0
+        self._labels: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self._start
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = _frame_label(code)
+        return label
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                name = stage_of(names.get(ident, ""), ident)
+                leaf = frame.f_code
+                if (os.path.basename(leaf.co_filename), leaf.co_name) in _IDLE_LEAVES:
+                    self.idle[name] += 1
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples[(name, tuple(stack))] += 1
+
+    def write_folded(self, path: Path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for (name, stack), count in sorted(self.samples.items()):
+                f.write(";".join((name, *stack)) + f" {count}\n")
+
+    def report(self, top: int = 15) -> str:
+        busy: "Counter[str]" = Counter()
+        self_counts: Dict[str, Counter] = defaultdict(Counter)
+        total_counts: Dict[str, Counter] = defaultdict(Counter)
+        for (name, stack), count in self.samples.items():
+            busy[name] += count
+            self_counts[name][stack[-1]] += count
+            for label in set(stack):
+                total_counts[name][label] += count
+
+        all_busy = sum(busy.values()) or 1
+        lines = [f"Sampling profile: {self.elapsed:.2f} s wall, {self.interval * 1000:.0f} ms interval, "
+                 f"{all_busy} busy samples", ""]
+        for name in STAGES:
+            if not busy[name] and not self.idle[name]:
+                continue
+            n = busy[name]
+            lines.append(f"[{name}] {n} busy samples ({100 * n / all_busy:.1f}% of busy), "
+                         f"{self.idle[name]} idle")
+            if n:
+                lines.append(f"  {'self%':>6} {'total%':>7}  function")
+                for label, count in self_counts[name].most_common(top):
+                    lines.append(f"  {100 * count / n:6.1f} {100 * total_counts[name][label] / n:7.1f}  {label}")
+            lines.append("")
+        return "\n".join(lines)
+
+
+class DeterministicProfiler:
+    """
+    One cProfile.Profile per thread (and per `stage()` block), grouped by
+    stage when reporting.
+    """
+
+    def __init__(self) -> None:
+        self.profiles: List[Tuple[str, object]] = []
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+        self._current = threading.local()
+
+    def _new_profile(self):
+        import cProfile
+
+        profile = cProfile.Profile()
+        with self._lock:
+            self.profiles.append((stage_of(threading.current_thread().name, threading.get_ident()), profile))
+        self._current.profile = profile
+        profile.enable()
+        return profile
+
+    def switch(self) -> None:
+        """The current thread's stage changed: continue in a new profile."""
+        profile = getattr(self._current, "profile", None)
+        if profile is not None:
+            profile.disable()
+        self._new_profile()
+
+    def _bootstrap(self, frame, event, arg) -> None:
+        # First profile event in a new thread: replace this hook with a real profiler
+        sys.setprofile(None)
+        self._new_profile()
+
+    def start(self) -> None:
+        global _active
+        self._start = time.perf_counter()
+        threading.setprofile(self._bootstrap)
+        self._new_profile()
+        _active = self
+
+    def stop(self) -> None:
+        global _active
+        _active = None
+        threading.setprofile(None)
+        self._current.profile.disable()  # other threads' profiles stop with their threads
+        self.elapsed = time.perf_counter() - self._start
+
+    def _stats(self, only: Optional[str] = None):
+        import pstats
+
+        stats = None
+        for name, profile in self.profiles:
+            if only is not None and name != only:
+                continue
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            except TypeError:
+                continue  # thread made no calls
+        return stats
+
+    def write_pstats(self, path: Path) -> None:
+        stats = self._stats()
+        if stats is not None:
+            stats.dump_stats(str(path))
+
+    def report(self, top: int = 15) -> str:
+        lines = [f"Deterministic profile: {self.elapsed:.2f} s wall, {len(self.profiles)} thread profiles", ""]
+        for name in STAGES:
+            stats = self._stats(name)
+            if stats is None:
+                continue
+            idle = sum(v[2] for (_, _, func), v in stats.stats.items() if func in _IDLE_BUILTINS)
+            rows = sorted(((k, v) for k, v in stats.stats.items() if k[2] not in _IDLE_BUILTINS),
+                          key=lambda kv: -kv[1][2])[:top]  # by own time
+            lines.append(f"[{name}] {stats.total_tt - idle:.3f} s busy, {idle:.3f} s waiting on locks")
+            lines.append(f"  {'self s':>8} {'cum s':>8} {'calls':>8}  function")
+            for (filename, lineno, func), (_, ncalls, tottime, cumtime, _) in rows:
+                label = f"{func} ({_short_path(filename)}:{lineno})" if lineno else func
+                lines.append(f"  {tottime:8.3f} {cumtime:8.3f} {ncalls:8d}  {label}")
+            lines.append("")
+        return "\n".join(lines)
+
+
+@contextmanager
+def profiled(out: Optional[Path], mode: str = "sampling", top: int = 15,
+             interval: float = 0.005) -> Iterator[None]:
+    """
+    Profile the body of the `with` block. `out` is the output path without
+    suffix (None = results/profile-<timestamp>); the report is printed and
+    written next to the flame graph / pstats file.
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode!r} (expected one of {', '.join(PROFILE_MODES)})")
+    if out is None:
+        out = Path("results") / time.strftime("profile-%Y%m%d-%H%M%S")
+    out.parent.mkdir(parents=True, exist_ok=True)
+
+    profiler = SamplingProfiler(interval) if mode == "sampling" else DeterministicProfiler()
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        if isinstance(profiler, SamplingProfiler):
+            data = out.with_name(out.name + ".folded")
+            profiler.write_folded(data)
+        else:
+            data = out.with_name(out.name + ".pstats")
+            profiler.write_pstats(data)
+        text = profiler.report(top)
+        report = out.with_name(out.name + ".txt")
+        report.write_text(text, encoding="utf-8")
+        print(f"\n{text}\nProfile written to: {data}\nHot-function report: {report}")
@@ -23,15 +23,20 @@ Notes
 
 from dataclasses import asdict
 from datetime import datetime
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 from urllib.parse import quote
 import re
 import unicodedata
 
-import time, logging, requests
+import os, time, logging, threading
 
 from .models import Result, MeltingPoint
-from .config import TIMEOUT_SECONDS, USER_AGENT
+from . import config
+from .http_cache import HttpCache, OfflineMiss
+
+# requests (and .env via config) are loaded on the first HTTP call, so the
+# parsing helpers here can be imported without the network stack.
 
 
 # ------------------------------------------------------------------
@@ -40,7 +45,7 @@ from .config import TIMEOUT_SECONDS, USER_AGENT
 
 _DEG_PATTERN = re.compile(r"(?i)\s*(?:deg(?:rees?)?\s*)?([CF])")
 _NUM_RANGE_PATTERN = re.compile(
-    r"(?P<n1>[-+]?\d+(?:[\.,]\d+)?)\s*(?:[-–—~to]{1,3}\s*(?P<n2>[-+]?\d+(?:[\.,]\d+)?))?"
+    r"(?P<n1>[-+]?\d+(?:[\.,]\d+)?)\s*(?:[-–—~to]{1,3}?\s*(?P<n2>[-+]?\d+(?:[\.,]\d+)?))?"
 )
 
 def _u(text: str | None) -> str:
@@ -102,6 +107,18 @@ def _format_range(vals_c: list[float]) -> str:
         return f"{_fmt_c(vals_c[0])} °C"
     return f"{_fmt_c(vals_c[0])}–{_fmt_c(vals_c[1])} °C"
 
+def melting_point_bounds(value: str | None, unit: str | None = None) -> tuple[float | None, float | None]:
+    """
+    Numeric (low, high) in °C of a melting-point text such as "135 °C",
+    "138–140 °C" or "275 °F"; (None, None) if it holds no number.
+    """
+    raw, _notes = _split_notes(value or "")
+    vals = _parse_numbers(raw)
+    if not vals:
+        return None, None
+    vals_c = _to_celsius(vals, _extract_unit(raw) or _extract_unit(_u(unit)))
+    return vals_c[0], vals_c[-1]
+
 def _norm_key(vals_c: list[float]) -> tuple:
     """
     Deduplication key:
@@ -118,23 +135,96 @@ def _norm_key(vals_c: list[float]) -> tuple:
 # PUG endpoints
 # ------------------------------------------------------------------
 
+# Defaults; the URLs actually used come from config.settings (PUBCHEM_BASE /
+# PUGVIEW_BASE), so a local mirror can stand in for PubChem.
 PUG_BASE = "https://pubchem.ncbi.nlm.nih.gov/rest/pug"
 PUG_VIEW_BASE = "https://pubchem.ncbi.nlm.nih.gov/rest/pug_view"
 logger = logging.getLogger(__name__)
 
+def _pug_base() -> str:
+    return config.settings.pubchem_base.rstrip("/")
+
+def _pugview_base() -> str:
+    return config.settings.pugview_base.rstrip("/")
+
+# Response cache (see src/http_cache.py); configured from the settings on first use
+_UNSET = object()
+_CACHE: Any = _UNSET
+
+def configure_cache(directory: Optional[str], offline: bool = False) -> Optional[HttpCache]:
+    """Use (or, with None, stop using) an on-disk response cache; `offline` never touches the network."""
+    global _CACHE
+    _CACHE = HttpCache(directory, offline=offline) if directory else None
+    if offline and _CACHE is None:
+        raise ValueError("Offline mode needs a cache directory.")
+    return _CACHE
+
+def http_cache() -> Optional[HttpCache]:
+    if _CACHE is _UNSET:
+        settings = config.settings
+        configure_cache(settings.cache_dir or None, offline=settings.offline)
+    return _CACHE
+
+# One pooled session per process: keep-alive connections are reused across
+# lookups (and across jobs in the long-running worker, see src/daemon.py).
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+def _session():
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            import requests
+
+            session = requests.Session()
+            session.headers["User-Agent"] = config.USER_AGENT
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)  # a local mirror
+            _SESSION = session
+        return _SESSION
+
+def _after_fork() -> None:
+    """In a forked child (a worker batch, see src/daemon.py): no shared sockets or held locks."""
+    global _SESSION, _SESSION_LOCK
+    _SESSION = None  # the parent's keep-alive connections stay the parent's
+    _SESSION_LOCK = threading.Lock()
+    if isinstance(_CACHE, HttpCache):
+        _CACHE._lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
 def _get(url: str, params: dict | None = None, *,
-         timeout: int = TIMEOUT_SECONDS, max_retries: int = 3, backoff: float = 0.6) -> requests.Response:
+         timeout: int | None = None, max_retries: int = 3, backoff: float = 0.6) -> Any:
     """
     Lightweight GET with automatic retry/backoff and console logging.
-    Raises the last exception if all attempts fail.
+    Returns the decoded JSON body; raises the last exception if all attempts fail.
+    Answers from the response cache when there is one (OfflineMiss if offline
+    and not cached).
     """
+    cache = http_cache()
+    if cache is not None:
+        body = cache.get(url, params)
+        if body is not None:
+            return body
+        if cache.offline:
+            raise OfflineMiss(f"Not in the offline cache: {url}")
+
+    import requests
+
+    session = _session()
+    timeout = config.TIMEOUT_SECONDS if timeout is None else timeout
     last_err = None
     for attempt in range(1, max_retries + 1):
         try:
-            r = requests.get(url, params=params, timeout=timeout, headers={"User-Agent": USER_AGENT})
+            r = session.get(url, params=params, timeout=timeout)
             r.raise_for_status()
             logger.info("GET OK: %s", url)
-            return r.json()
+            body = r.json()
+            if cache is not None:
+                cache.put(url, params, body)
+            return body
         except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
             last_err = e
             logger.warning("GET failed (%s/%s): %s", attempt, max_retries, e)
@@ -264,7 +354,7 @@ extract_melting_point = _extract_melting_point
 
 def _fetch_cid_from_smiles(smiles: str) -> Optional[int]:
     encoded = quote(smiles, safe="")
-    url = f"{PUG_BASE}/compound/smiles/{encoded}/cids/JSON"
+    url = f"{_pug_base()}/compound/smiles/{encoded}/cids/JSON"
     data = _get(url)
     try:
         return int(data["IdentifierList"]["CID"][0])
@@ -272,8 +362,7 @@ def _fetch_cid_from_smiles(smiles: str) -> Optional[int]:
         return None
 
 def _fetch_iupac_from_cid(cid: int) -> Optional[str]:
-    url = f"{PUG_BASE}/compound/cid/{cid}/property/IUPACName/JSON"
-    data = _get(url)
+    data = _get(_property_url(cid, "IUPACName"))
     try:
         props = data["PropertyTable"]["Properties"][0]
         name = props.get("IUPACName")
@@ -282,8 +371,7 @@ def _fetch_iupac_from_cid(cid: int) -> Optional[str]:
         return None
     
 def _fetch_title_from_cid(cid: int) -> Optional[str]:
-    url = f"{PUG_BASE}/compound/cid/{cid}/property/Title/JSON"
-    data = _get(url)
+    data = _get(_property_url(cid, "Title"))
     try:
         props = data["PropertyTable"]["Properties"][0]
         title = props.get("Title")
@@ -293,7 +381,7 @@ def _fetch_title_from_cid(cid: int) -> Optional[str]:
 
 
 def _fetch_view_json(cid: int) -> Dict[str, Any]:
-    url = f"{PUG_VIEW_BASE}/data/compound/{cid}/JSON"
+    url = f"{_pugview_base()}/data/compound/{cid}/JSON"
     return _get(url)
 
 # ------------------------------------------------------------------
@@ -315,37 +403,184 @@ def fetch_pubchem_by_smiles(smiles: str) -> Dict[str, Any]:
         "iupac_name": iupac,
         "melting_points": [asdict(mp) for mp in mps],
         "sources": {
-            "pubchem_cid": f"{PUG_BASE}/compound/smiles/{quote(smiles, safe='')}/cids/JSON",
-            "pubchem_property": f"{PUG_BASE}/compound/cid/{cid}/property/IUPACName/JSON",
-            "pubchem_title": f"{PUG_BASE}/compound/cid/{cid}/property/Title/JSON",  
-            "pubchem_view": f"{PUG_VIEW_BASE}/data/compound/{cid}/JSON",
+            "pubchem_cid": f"{_pug_base()}/compound/smiles/{quote(smiles, safe='')}/cids/JSON",
+            "pubchem_property": f"{_pug_base()}/compound/cid/{cid}/property/IUPACName/JSON",
+            "pubchem_title": f"{_pug_base()}/compound/cid/{cid}/property/Title/JSON",  
+            "pubchem_view": f"{_pugview_base()}/data/compound/{cid}/JSON",
         },
     }
 
-def resolve(smiles: str) -> Result:
+# Stages reported by resolve(progress=...), in order
+RESOLVE_STAGES = ("cid", "iupac_name", "title", "melting_points")
+
+def resolve(smiles: str, progress: Optional[Callable[[str], None]] = None) -> Result:
+    """
+    Look up CID, IUPAC name, title and melting points for a SMILES.
+
+    `progress`, if given, is called with each stage name from RESOLVE_STAGES
+    before that stage's request; an exception raised by it aborts the lookup
+    (the GUI uses this to cancel between requests).
+    """
+    report = progress or (lambda _stage: None)
+    report("cid")
     cid = _fetch_cid_from_smiles(smiles)
     if cid is None:
         raise ValueError("Could not resolve CID from the provided SMILES.")
 
+    report("iupac_name")
     iupac = _fetch_iupac_from_cid(cid)
-    title = _fetch_title_from_cid(cid)        
+    report("title")
+    title = _fetch_title_from_cid(cid)
+    report("melting_points")
     view = _fetch_view_json(cid)
+    return _build_result(smiles, cid, iupac, title, view)
+
+def _build_result(smiles: str, cid: int, iupac: Optional[str], title: Optional[str],
+                  view: Dict[str, Any]) -> Result:
     melting_points = _extract_melting_points(view)
 
     sources = {
-        "pubchem_cid": f"{PUG_BASE}/compound/smiles/{quote(smiles, safe='')}/cids/JSON",
-        "pubchem_property": f"{PUG_BASE}/compound/cid/{cid}/property/IUPACName/JSON",
-        "pubchem_title": f"{PUG_BASE}/compound/cid/{cid}/property/Title/JSON",      
-        "pubchem_view": f"{PUG_VIEW_BASE}/data/compound/{cid}/JSON",
+        "pubchem_cid": f"{_pug_base()}/compound/smiles/{quote(smiles, safe='')}/cids/JSON",
+        "pubchem_property": f"{_pug_base()}/compound/cid/{cid}/property/IUPACName/JSON",
+        "pubchem_title": f"{_pug_base()}/compound/cid/{cid}/property/Title/JSON",
+        "pubchem_view": f"{_pugview_base()}/data/compound/{cid}/JSON",
     }
 
     return Result(
         input_smiles=smiles,
         cid=cid,
         iupac_name=iupac,
-        preferred_name=title,                  
+        preferred_name=title,
         melting_points=melting_points,
         sources=sources,
         created_at=datetime.now().isoformat(timespec="seconds"),
     )
 
+# ------------------------------------------------------------------
+# Batched lookups
+# ------------------------------------------------------------------
+_PROPERTY_CHUNK = 100  # CIDs per multi-CID property request
+_PROPERTY_FIELDS = (("iupac_name", "IUPACName"), ("title", "Title"))
+_PROPERTY_FALLBACK_WORKERS = 4  # threads for per-CID requests when a batched one fails
+
+def _clean(text: Any) -> Optional[str]:
+    return text.strip() if isinstance(text, str) and text.strip() else None
+
+def _property_url(cid: int, prop: str) -> str:
+    """The single-CID property URL resolve() requests (and the cache is keyed on)."""
+    return f"{_pug_base()}/compound/cid/{cid}/property/{prop}/JSON"
+
+def _cached_properties(cid: int) -> Optional[Dict[str, Optional[str]]]:
+    """Names of one CID from cached single-CID responses, or None unless all are cached."""
+    cache = http_cache()
+    if cache is None:
+        return None
+    names: Dict[str, Optional[str]] = {}
+    for key, prop in _PROPERTY_FIELDS:
+        body = cache.get(_property_url(cid, prop))
+        if body is None:
+            return None
+        try:
+            names[key] = _clean(body["PropertyTable"]["Properties"][0].get(prop))
+        except Exception:
+            names[key] = None
+    return names
+
+def _cache_properties(cid: int, props: Dict[str, Any]) -> None:
+    """Store one CID's entry of a multi-CID response as the single-CID responses resolve() reads."""
+    cache = http_cache()
+    if cache is None:
+        return
+    for _key, prop in _PROPERTY_FIELDS:
+        entry = {"CID": cid, **({prop: props[prop]} if prop in props else {})}
+        cache.put(_property_url(cid, prop), None, {"PropertyTable": {"Properties": [entry]}})
+
+def _fetch_cid_properties(cid: int) -> Union[Dict[str, Optional[str]], Exception]:
+    try:
+        return {"iupac_name": _fetch_iupac_from_cid(cid), "title": _fetch_title_from_cid(cid)}
+    except Exception as e:
+        return e
+
+def _fetch_properties(cids: Sequence[int]) -> Dict[int, Union[Dict[str, Optional[str]], Exception]]:
+    """
+    IUPAC name and title of many CIDs, one property request per 100 CIDs.
+
+    Names already cached per CID (e.g. by resolve()) are read from there, and
+    batched responses are cached per CID too, so the offline cache answers
+    whatever mix of CIDs comes along. CIDs whose batched request fails, or
+    that its response leaves out, are requested one by one; a failure of
+    those is returned as the CID's exception.
+    """
+    out: Dict[int, Union[Dict[str, Optional[str]], Exception]] = {}
+    missing: List[int] = []
+    for cid in dict.fromkeys(cids):
+        names = _cached_properties(cid)
+        if names is None:
+            missing.append(cid)
+        else:
+            out[cid] = names
+
+    retry: List[int] = []
+    for i in range(0, len(missing), _PROPERTY_CHUNK):
+        chunk = missing[i:i + _PROPERTY_CHUNK]
+        try:
+            ids = ",".join(str(c) for c in chunk)
+            data = _get(f"{_pug_base()}/compound/cid/{ids}/property/IUPACName,Title/JSON")
+        except Exception as e:
+            logger.warning("Property request for %d CIDs failed (%s); requesting them one by one", len(chunk), e)
+            retry += chunk
+            continue
+        for props in (data.get("PropertyTable") or {}).get("Properties") or []:
+            try:
+                cid = int(props["CID"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            out[cid] = {"iupac_name": _clean(props.get("IUPACName")), "title": _clean(props.get("Title"))}
+            _cache_properties(cid, props)
+        retry += [c for c in chunk if c not in out]
+
+    if retry:
+        with ThreadPoolExecutor(max_workers=min(_PROPERTY_FALLBACK_WORKERS, len(retry))) as pool:
+            out.update(zip(retry, pool.map(_fetch_cid_properties, retry)))
+    return out
+
+def resolve_many(smiles_list: Sequence[str], workers: int = 4) -> List[Union[Result, Exception]]:
+    """
+    resolve() for many SMILES at once, in input order; a failed lookup is
+    returned as its exception instead of raised.
+
+    Names come from the cache or multi-CID property requests instead of two
+    requests per compound (see `_fetch_properties`); CID and PUG-View
+    requests (one per compound, PubChem has no batch form for them) run on
+    `workers` threads. Repeated SMILES are looked up once.
+    """
+    unique = list(dict.fromkeys(smiles_list))
+
+    def attempt(fn: Callable[[Any], Any], arg: Any) -> Any:
+        try:
+            return fn(arg)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(unique) or 1))) as pool:
+        cids = dict(zip(unique, pool.map(lambda s: attempt(_fetch_cid_from_smiles, s), unique)))
+        found = sorted({c for c in cids.values() if isinstance(c, int)})
+        views = dict(zip(found, pool.map(lambda c: attempt(_fetch_view_json, c), found)))
+    props = _fetch_properties(found) if found else {}
+
+    results: List[Union[Result, Exception]] = []
+    for smiles in smiles_list:
+        cid = cids[smiles]
+        if isinstance(cid, Exception):
+            results.append(cid)
+        elif cid is None:
+            results.append(ValueError("Could not resolve CID from the provided SMILES."))
+        elif isinstance(views[cid], Exception):
+            results.append(views[cid])
+        elif isinstance(props.get(cid), Exception):
+            results.append(props[cid])
+        else:
+            names = props.get(cid) or {}
+            results.append(_build_result(smiles, cid, names.get("iupac_name"), names.get("title"), views[cid]))
+    return results
+
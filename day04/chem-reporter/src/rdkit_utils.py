@@ -6,17 +6,30 @@
 
 from __future__ import annotations
 
+import io
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 
+import numpy as np
 from rdkit import Chem
-from rdkit.Chem import AllChem
+from rdkit.Chem import AllChem, rdMolDescriptors
 
 
 class RDKitGenerationError(Exception):
     """Raised when 3D generation or optimization fails."""
 
 
+class EmbeddingTimeout(RDKitGenerationError):
+    """Raised when 3D generation runs out of its wall-clock budget."""
+
+    def __init__(self, message: str, elapsed: float) -> None:
+        super().__init__(message)
+        self.elapsed = elapsed
+
+
 def _ensure_parent_dir(path: Path) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
 
@@ -52,6 +65,317 @@ def validate_smiles(smiles: str) -> bool:
         return False
 
 
+DEDUP_MODES = ("smiles", "inchikey")
+
+
+def dedup_key(smiles: str, mode: str = "smiles") -> Optional[str]:
+    """
+    Identity key for spotting the same compound written differently:
+    canonical SMILES (fragment order, aromaticity and atom order normalized,
+    so "[Na+].CC(=O)[O-]" == "CC(=O)[O-].[Na+]") or the standard InChIKey.
+    Returns None if the SMILES cannot be parsed.
+    """
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"Unknown dedup mode {mode!r}; expected one of {DEDUP_MODES}")
+    mol = Chem.MolFromSmiles(smiles) if isinstance(smiles, str) and smiles.strip() else None
+    if mol is None:
+        return None
+    if mode == "inchikey":
+        return Chem.MolToInchiKey(mol) or None
+    return Chem.MolToSmiles(mol, canonical=True)
+
+
+# Escalating embedding strategies used when a time budget is set:
+# (label, use random coordinates, cap on conformers, share of remaining budget)
+_EMBED_LADDER = (
+    ("etkdg", False, None, 0.5),
+    ("random_coords", True, None, 0.5),
+    ("single_conf", True, 1, 1.0),
+)
+
+
+def _embed(mol: Chem.Mol, num_confs: int, random_seed: int,
+           use_random_coords: bool = False, timeout: Optional[float] = None,
+           prune_rms: float = 0.1) -> List[int]:
+    params = AllChem.ETKDGv3()
+    params.randomSeed = random_seed
+    params.useRandomCoords = use_random_coords
+    params.pruneRmsThresh = prune_rms
+    if timeout is not None:
+        # RDKit's timeout is whole seconds per fragment; 0 would disable it
+        params.timeout = max(1, int(timeout))
+    # A timed-out or failed embedding comes back as [-1] with no conformer
+    return [cid for cid in AllChem.EmbedMultipleConfs(mol, numConfs=num_confs, params=params) if cid >= 0]
+
+
+# Force-field iterations per conformer, and per step between deadline checks
+_OPT_MAX_ITERS = 200
+_OPT_STEP_ITERS = 10
+
+
+def _minimize(field: Any, deadline: Optional[float]) -> bool:
+    """Minimize in short steps; False if `deadline` cut it short."""
+    field.Initialize()
+    for _ in range(0, _OPT_MAX_ITERS, _OPT_STEP_ITERS):
+        # 0 = converged; not converging is fine, the geometry is still usable
+        if field.Minimize(maxIts=_OPT_STEP_ITERS) == 0:
+            return True
+        if deadline is not None and time.perf_counter() >= deadline:
+            return False
+    return True
+
+
+def _optimize(mol: Chem.Mol, ids: List[int],
+              deadline: Optional[float] = None) -> Tuple[str, str, Dict[int, float]]:
+    """
+    MMFF/UFF-optimize each conformer. Stops early once `deadline` passes,
+    at most `_OPT_STEP_ITERS` force-field iterations late.
+    Returns ("full" | "partial" | "skipped", force field name, and the
+    energy in kcal/mol of every conformer optimized, by conformer id).
+    """
+    # Try MMFF first; fall back to UFF if MMFF is not parameterized
+    mmff_props = AllChem.MMFFGetMoleculeProperties(mol, mmffVariant="MMFF94s")
+    forcefield = "MMFF94s" if mmff_props is not None else "UFF"
+    energies: Dict[int, float] = {}
+    done = 0
+    for cid in ids:
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        if mmff_props is not None:
+            field = AllChem.MMFFGetMoleculeForceField(mol, mmff_props, confId=cid)
+        else:
+            field = AllChem.UFFGetMoleculeForceField(mol, confId=cid)
+        if field is None:
+            raise RDKitGenerationError("No force field parameters for this molecule.")
+        if not _minimize(field, deadline):
+            break
+        energies[cid] = field.CalcEnergy()
+        done += 1
+
+    state = "full" if done == len(ids) else ("partial" if done else "skipped")
+    return state, forcefield, energies
+
+
+def _order_by_energy(mol: Chem.Mol, energies: Dict[int, float]) -> None:
+    """
+    Renumber the conformers of `mol` lowest energy first (conformers without
+    an energy go last), so the default conformer, the one written to SDF,
+    is the best one.
+    """
+    rank = {cid: n for n, cid in enumerate(sorted(energies, key=energies.get))}
+    conformers = sorted((Chem.Conformer(c) for c in mol.GetConformers()),
+                        key=lambda c: rank.get(c.GetId(), len(rank)))
+    mol.RemoveAllConformers()
+    for n, conformer in enumerate(conformers):
+        conformer.SetId(n)
+        mol.AddConformer(conformer)
+
+
+def embed_info(mol: Chem.Mol) -> Dict[str, Any]:
+    """
+    Return how the conformers of `mol` were generated (set by `smiles_to_mol`):
+    strategy, optimization state, conformer count, elapsed seconds, and the
+    force field and energy (kcal/mol) of the first, lowest-energy conformer.
+    These are private RDKit props, so they never end up in the SDF.
+    """
+    info: Dict[str, Any] = {"num_confs": mol.GetNumConformers()}
+    if mol.HasProp("_embed_strategy"):
+        info["strategy"] = mol.GetProp("_embed_strategy")
+    if mol.HasProp("_embed_optimized"):
+        info["optimized"] = mol.GetProp("_embed_optimized")
+    if mol.HasProp("_embed_seconds"):
+        info["seconds"] = mol.GetDoubleProp("_embed_seconds")
+    if mol.HasProp("_embed_energy"):
+        info["forcefield"] = mol.GetProp("_embed_forcefield")
+        info["energy"] = round(mol.GetDoubleProp("_embed_energy"), 4)
+    return info
+
+
+# ------------------------------------------------------------------
+# Conformer budgets
+# ------------------------------------------------------------------
+# Rotatable-bond bands -> conformer count (rigid molecules need one, floppy
+# ones need many to sample their shape), and heavy-atom bands -> RMS pruning
+# threshold (larger molecules tolerate coarser de-duplication).
+_CONFS_BY_ROTORS = ((1, 1), (3, 5), (7, 20), (12, 50))
+_MAX_CONFS = 100
+_PRUNE_BY_HEAVY_ATOMS = ((15, 0.1), (30, 0.3), (50, 0.5))
+_MAX_PRUNE_RMS = 1.0
+
+
+@dataclass(frozen=True)
+class EmbedOptions:
+    """
+    3D generation settings shared by the GUI, batch and output layers.
+    With `adaptive=True`, `num_confs` and `prune_rms` are picked per molecule
+    by `choose_conformer_budget` instead. `time_budget` is a soft wall-clock
+    limit (see `smiles_to_mol`): it may be overrun by about a second.
+    `keep_conformers=True` writes every optimized conformer to structure.sdf
+    (lowest energy first) instead of only the best one.
+    """
+    num_confs: int = 1
+    random_seed: int = 0xF00D
+    prune_rms: float = 0.1
+    time_budget: Optional[float] = None
+    adaptive: bool = False
+    keep_conformers: bool = False
+
+
+def choose_conformer_budget(mol: Chem.Mol) -> Tuple[int, float]:
+    """
+    Pick (num_confs, prune_rms) from the rotatable-bond and heavy-atom count.
+    Benzoic acid gets a single conformer; a 20-rotor peptide gets the maximum.
+    """
+    rotors = rdMolDescriptors.CalcNumRotatableBonds(mol)
+    heavy = mol.GetNumHeavyAtoms()
+
+    num_confs = _MAX_CONFS
+    for max_rotors, n in _CONFS_BY_ROTORS:
+        if rotors <= max_rotors:
+            num_confs = n
+            break
+
+    prune_rms = _MAX_PRUNE_RMS
+    for max_heavy, rms in _PRUNE_BY_HEAVY_ATOMS:
+        if heavy <= max_heavy:
+            prune_rms = rms
+            break
+    return num_confs, prune_rms
+
+
+class ConformerBudget:
+    """
+    Global CPU-seconds budget for 3D generation across a whole batch.
+
+    `plan` scales each molecule's adaptive conformer count down so that the
+    predicted cost (observed seconds per conformer so far) fits in what is
+    left; once the budget is spent every molecule gets a single conformer.
+    `charge` records what a molecule actually cost. Thread-safe.
+    """
+
+    def __init__(self, total_seconds: float) -> None:
+        self.total_seconds = float(total_seconds)
+        self._spent = 0.0
+        self._confs = 0
+        self._lock = threading.Lock()
+
+    @property
+    def spent(self) -> float:
+        return self._spent
+
+    def remaining(self) -> float:
+        return max(0.0, self.total_seconds - self._spent)
+
+    def plan(self, smiles: str, options: Optional[EmbedOptions] = None) -> EmbedOptions:
+        """Return concrete (non-adaptive) embed options for one molecule."""
+        options = options or EmbedOptions(adaptive=True)
+        mol = Chem.MolFromSmiles(smiles)
+        if mol is None:
+            raise ValueError("Invalid SMILES: parsing returned None.")
+        num_confs, prune_rms = choose_conformer_budget(mol)
+
+        with self._lock:
+            remaining = self.remaining()
+            if remaining <= 0:
+                num_confs = 1
+            elif self._confs:
+                per_conf = self._spent / self._confs
+                num_confs = max(1, min(num_confs, int(remaining / per_conf)))
+
+        time_budget = options.time_budget
+        if remaining > 0:
+            time_budget = remaining if time_budget is None else min(time_budget, remaining)
+        return EmbedOptions(
+            num_confs=num_confs,
+            random_seed=options.random_seed,
+            prune_rms=prune_rms,
+            time_budget=time_budget,
+            adaptive=False,
+            keep_conformers=options.keep_conformers,
+        )
+
+    def charge(self, seconds: float, num_confs: int) -> None:
+        with self._lock:
+            self._spent += seconds
+            self._confs += max(1, num_confs)
+
+
+
+# Embedding cost model: seconds ~ conformers * (w . features), with features
+# scaled to be O(1) for drug-sized molecules. The prior weights are only a
+# starting point; EmbedCostModel refits them from observed timings.
+_COST_PRIOR = (0.002, 0.01, 0.01, 0.02)
+_COST_PRIOR_WEIGHT = 2.0
+_COST_REFIT_EVERY = 8
+_MACROCYCLE_SIZE = 12
+
+
+def embed_cost_features(mol: Chem.Mol) -> Tuple[float, ...]:
+    """
+    Per-conformer features that drive ETKDG + force-field cost: a constant,
+    heavy atoms, heavy atoms x rotatable bonds (flexibility) and heavy atoms
+    x ring complexity (rings, bridgeheads and macrocycles are hard to embed).
+    """
+    heavy = mol.GetNumHeavyAtoms()
+    rotors = rdMolDescriptors.CalcNumRotatableBonds(mol)
+    rings = mol.GetRingInfo()
+    macrocycles = sum(1 for ring in rings.AtomRings() if len(ring) >= _MACROCYCLE_SIZE)
+    complexity = rings.NumRings() + 2 * rdMolDescriptors.CalcNumBridgeheadAtoms(mol) + 4 * macrocycles
+    return (1.0, heavy / 10.0, heavy * rotors / 100.0, heavy * complexity / 100.0)
+
+
+class EmbedCostModel:
+    """
+    Predicts 3D-generation seconds per molecule for longest-first scheduling.
+
+    Starts from a structural prior and, as `observe` reports real timings,
+    refits the weights by ridge regression pulled towards that prior, so a
+    handful of observations adjusts the scale and a few dozen adjust the
+    shape. Thread-safe; predictions never go below zero.
+    """
+
+    def __init__(self, prior: Tuple[float, ...] = _COST_PRIOR,
+                 prior_weight: float = _COST_PRIOR_WEIGHT) -> None:
+        self._prior = np.asarray(prior, dtype=float)
+        self._weights = self._prior.copy()
+        self._lambda = prior_weight
+        self._xtx = np.zeros((len(prior), len(prior)))
+        self._xty = np.zeros(len(prior))
+        self.observations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def describe(smiles: str, options: Optional[EmbedOptions] = None) -> Optional[Tuple[Tuple[float, ...], int]]:
+        """(features, expected conformers) for a SMILES, or None if it does not parse."""
+        mol = Chem.MolFromSmiles(smiles)
+        if mol is None:
+            return None
+        options = options or EmbedOptions()
+        num_confs = choose_conformer_budget(mol)[0] if options.adaptive else options.num_confs
+        return embed_cost_features(mol), num_confs
+
+    def predict(self, features: Tuple[float, ...], num_confs: int = 1) -> float:
+        with self._lock:
+            return max(0.0, max(1, num_confs) * float(np.dot(self._weights, features)))
+
+    def observe(self, features: Tuple[float, ...], num_confs: int, seconds: float) -> None:
+        """Record the measured cost of a molecule."""
+        x = max(1, num_confs) * np.asarray(features, dtype=float)
+        with self._lock:
+            self._xtx += np.outer(x, x)
+            self._xty += x * seconds
+            self.observations += 1
+            if self.observations < _COST_REFIT_EVERY or self.observations % _COST_REFIT_EVERY == 0:
+                self._refit()
+
+    def _refit(self) -> None:
+        # argmin ||Xw - y||^2 + lambda ||w - prior||^2
+        ridge = self._lambda * np.eye(len(self._prior))
+        try:
+            self._weights = np.linalg.solve(self._xtx + ridge, self._xty + ridge @ self._prior)
+        except np.linalg.LinAlgError:
+            pass
+
 def smiles_to_mol(
     smiles: str,
     embed_3d: bool = True,
@@ -59,6 +383,9 @@ def smiles_to_mol(
     num_confs: int = 1,
     random_seed: int = 0xF00D,
     optimize: bool = True,
+    time_budget: Optional[float] = None,
+    prune_rms: float = 0.1,
+    adaptive: bool = False,
 ) -> Chem.Mol:
     """
     Convert SMILES to an RDKit Mol object.
@@ -78,11 +405,27 @@ def smiles_to_mol(
         Random seed for deterministic embeddings on CI/Windows.
     optimize : bool
         If True, run force-field optimization (MMFF if available, else UFF).
+    time_budget : float, optional
+        Wall-clock seconds allowed for embedding plus optimization. When set,
+        embedding escalates through cheaper strategies as the budget drains
+        (ETKDG -> random coordinates -> a single conformer) and optimization
+        is cut short or skipped once the deadline passes. See `embed_info`.
+        This is a soft budget: RDKit's embedding timeout has whole-second
+        granularity (at least 1 s) and force-field steps are checked every
+        `_OPT_STEP_ITERS` iterations, so a call can overrun it by about a
+        second.
+    prune_rms : float
+        RMS threshold (Å) below which conformers are pruned as duplicates.
+    adaptive : bool
+        If True, ignore `num_confs`/`prune_rms` and pick them from the
+        molecule's flexibility (see `choose_conformer_budget`).
 
     Returns
     -------
     rdkit.Chem.Mol
-        Molecule with conformer(s) if 3D was requested.
+        Molecule with conformer(s) if 3D was requested; after optimization
+        they are ordered lowest energy first, so the default conformer is
+        the best one.
 
     Raises
     ------
@@ -90,6 +433,8 @@ def smiles_to_mol(
         If the SMILES is invalid.
     RDKitGenerationError
         If 3D embedding or optimization fails.
+    EmbeddingTimeout
+        If no conformer could be embedded within `time_budget`.
     """
     try:
         base = Chem.MolFromSmiles(smiles, sanitize=True)
@@ -101,52 +446,91 @@ def smiles_to_mol(
     mol = Chem.AddHs(base) if add_hydrogens else base
 
     if embed_3d:
-        params = AllChem.ETKDGv3()
-        params.randomSeed = random_seed
-        params.useRandomCoords = False
-        params.pruneRmsThresh = 0.1
-        # Generate one or more conformers:
-        ids = AllChem.EmbedMultipleConfs(mol, numConfs=num_confs, params=params)
-        if not ids:
-            raise RDKitGenerationError("ETKDG embedding failed (no conformers).")
-
-        if optimize:
-            # Try MMFF first; fall back to UFF if MMFF is not parameterized
-            try:
-                mmff_props = AllChem.MMFFGetMoleculeProperties(mol, mmffVariant="MMFF94s")
-                if mmff_props is not None:
-                    for cid in ids:
-                        res = AllChem.MMFFOptimizeMolecule(mol, mmff_props, confId=cid, maxIters=200)
-                        # res: 0=converged, 1=failed; we don't hard-fail on 1 because UFF fallback may still help elsewhere
-                else:
-                    raise RuntimeError("MMFF properties not available; falling back to UFF.")
-            except Exception:
-                for cid in ids:
-                    _ = AllChem.UFFOptimizeMolecule(mol, confId=cid, maxIters=200)
+        if adaptive:
+            num_confs, prune_rms = choose_conformer_budget(base)
+        optimized, forcefield, energies = "skipped", "", {}
+        start = time.perf_counter()
+        if time_budget is None:
+            strategy = "etkdg"
+            ids = _embed(mol, num_confs, random_seed, prune_rms=prune_rms)
+            if not ids:
+                raise RDKitGenerationError("ETKDG embedding failed (no conformers).")
+            if optimize:
+                optimized, forcefield, energies = _optimize(mol, ids)
+        else:
+            deadline = start + time_budget
+            ids = []
+            for strategy, random_coords, cap, share in _EMBED_LADDER:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                n = num_confs if cap is None else min(num_confs, cap)
+                ids = _embed(mol, n, random_seed, random_coords, timeout=remaining * share,
+                             prune_rms=prune_rms)
+                if ids:
+                    break
+            elapsed = time.perf_counter() - start
+            if not ids:
+                if elapsed >= time_budget:
+                    raise EmbeddingTimeout(
+                        f"3D embedding exceeded its {time_budget:g} s budget "
+                        f"(elapsed {elapsed:.1f} s).",
+                        elapsed,
+                    )
+                raise RDKitGenerationError("ETKDG embedding failed (no conformers).")
+            if optimize:
+                optimized, forcefield, energies = _optimize(mol, ids, deadline)
+
+        if energies:
+            _order_by_energy(mol, energies)
+            mol.SetProp("_embed_forcefield", forcefield)
+            mol.SetDoubleProp("_embed_energy", min(energies.values()))
+        mol.SetProp("_embed_strategy", strategy)
+        mol.SetProp("_embed_optimized", optimized)
+        mol.SetDoubleProp("_embed_seconds", time.perf_counter() - start)
 
     return mol
 
 
-def write_sdf(
+def smiles_to_2d_mol(smiles: str) -> Chem.Mol:
+    """
+    Convert SMILES to an RDKit Mol with 2D depiction coordinates.
+
+    This is the cheap tier of structure output: no hydrogens are added and no
+    embedding or force-field optimization is run, so it returns in milliseconds
+    even for molecules where ETKDG is slow.
+
+    Raises
+    ------
+    ValueError
+        If the SMILES is invalid.
+    """
+    try:
+        mol = Chem.MolFromSmiles(smiles, sanitize=True)
+        if mol is None:
+            raise ValueError("Invalid SMILES: parsing returned None.")
+    except Exception as exc:
+        raise ValueError(f"Invalid SMILES: {exc}") from exc
+
+    AllChem.Compute2DCoords(mol)
+    return mol
+
+
+def sdf_block(
     mol: Chem.Mol,
-    output_path: str | Path,
     props: Optional[Dict[str, Any]] = None,
     kekulize: bool = False,
-) -> Path:
+    all_conformers: bool = False,
+) -> str:
     """
-    Write a molecule to an SDF file, attaching provided properties as SD fields.
-
-    Notes
-    -----
-    - If `kekulize` is True, an attempt is made to kekulize a copy for nicer bond representations.
-    - Creates parent directories if they do not exist.
+    Render a molecule as SDF text, attaching provided properties as SD fields.
+    Plain strings pickle cheaply, so worker processes return this instead of
+    the Mol itself. With `all_conformers`, every conformer becomes its own
+    record (in conformer order); otherwise only the default one is written.
     """
     if mol is None:
         raise ValueError("`mol` must be a valid RDKit Mol.")
 
-    out = Path(output_path)
-    _ensure_parent_dir(out)
-
     mol_to_write = Chem.Mol(mol)
     if kekulize:
         try:
@@ -162,10 +546,39 @@ def write_sdf(
                 continue
             mol_to_write.SetProp(str(key), str(val))
 
-    writer = Chem.SDWriter(str(out))
-    # RDKit SDWriter writes one mol at a time; we write the first conformer (or 2D if no 3D)
-    writer.write(mol_to_write)
+    buf = io.StringIO()
+    writer = Chem.SDWriter(buf)
+    # SDWriter writes the default (first) conformer: the lowest-energy one
+    # after smiles_to_mol (or 2D if no 3D)
+    if all_conformers and mol_to_write.GetNumConformers() > 1:
+        for conf in mol_to_write.GetConformers():
+            writer.write(mol_to_write, confId=conf.GetId())
+    else:
+        writer.write(mol_to_write)
     writer.close()
+    return buf.getvalue()
+
+
+def write_sdf(
+    mol: Chem.Mol,
+    output_path: str | Path,
+    props: Optional[Dict[str, Any]] = None,
+    kekulize: bool = False,
+) -> Path:
+    """
+    Write a molecule to an SDF file, attaching provided properties as SD fields.
+
+    Notes
+    -----
+    - If `kekulize` is True, an attempt is made to kekulize a copy for nicer bond representations.
+    - Creates parent directories if they do not exist.
+    """
+    text = sdf_block(mol, props=props, kekulize=kekulize)
+
+    out = Path(output_path)
+    _ensure_parent_dir(out)
+    with open(out, "w", encoding="utf-8", newline="") as fh:
+        fh.write(text)
     return out
 
 
@@ -175,21 +588,52 @@ def smiles_to_sdf(
     props: Optional[Dict[str, Any]] = None,
     num_confs: int = 1,
     random_seed: int = 0xF00D,
+    time_budget: Optional[float] = None,
 ) -> Path:
     """
     Convenience function: validate -> build 3D -> write SDF.
 
     Returns the output Path on success.
     """
+    options = EmbedOptions(num_confs=num_confs, random_seed=random_seed, time_budget=time_budget)
+    mol = build_3d_mol(smiles, options)
+    return write_sdf(mol, output_path=output_path, props=props)
+
+
+def build_3d_mol(smiles: str, options: Optional[EmbedOptions] = None) -> Chem.Mol:
+    """
+    Validate SMILES and build an optimized 3D Mol according to `options`.
+    Use `embed_info` on the result for conformer count and timing.
+    """
     if not validate_smiles(smiles):
         raise ValueError("Invalid SMILES supplied.")
 
-    mol = smiles_to_mol(
+    options = options or EmbedOptions()
+    return smiles_to_mol(
         smiles=smiles,
         embed_3d=True,
         add_hydrogens=True,
-        num_confs=num_confs,
-        random_seed=random_seed,
+        num_confs=options.num_confs,
+        random_seed=options.random_seed,
         optimize=True,
+        time_budget=options.time_budget,
+        prune_rms=options.prune_rms,
+        adaptive=options.adaptive,
     )
+
+
+def smiles_to_2d_sdf(
+    smiles: str,
+    output_path: str | Path,
+    props: Optional[Dict[str, Any]] = None,
+) -> Path:
+    """
+    Convenience function: validate -> 2D coordinates -> write SDF.
+
+    Returns the output Path on success.
+    """
+    if not validate_smiles(smiles):
+        raise ValueError("Invalid SMILES supplied.")
+
+    mol = smiles_to_2d_mol(smiles)
     return write_sdf(mol, output_path=output_path, props=props)
@@ -0,0 +1,319 @@
+# src/service.py
+"""
+Local HTTP/JSON resolve service.
+
+Other tools get names and melting points for SMILES over HTTP instead of
+shelling out to run_batch.py or importing src.pubchem themselves:
+
+    python scripts/serve_resolve.py --port 8765 [--offline]
+
+    GET  /resolve?smiles=CCO         one record (JSON)
+    POST /resolve                    many: a JSON list, {"smiles": [...]}, or one SMILES
+                                     (or {"smiles": ...} object) per line; the answer is
+                                     NDJSON, one line per input in input order, streamed
+                                     as results arrive
+    GET  /health                     counters and cache statistics
+
+Requests arriving within `window` seconds of each other (default 20 ms) are
+coalesced into one micro-batch for `pubchem.resolve_many`, so concurrent
+clients share multi-CID property requests; answers are kept in an in-memory
+cache keyed by canonical SMILES, in front of the on-disk response cache
+(src/http_cache.py) that makes offline operation possible.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from any thread into batches: a batch closes
+    `window` seconds after its first item or at `max_batch` items, and is
+    passed to `fn(items) -> results` (one result or exception per item) on
+    one of `workers` threads. `submit` returns a Future per item.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], Sequence[Any]],
+        window: float = 0.02,
+        max_batch: int = 100,
+        workers: int = 2,
+    ) -> None:
+        self.fn = fn
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.batches = 0
+        self.items = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="micro-batch")
+        self._thread = threading.Thread(target=self._collect, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def close(self) -> None:
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def _collect(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    task = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if task is _STOP:
+                    stopping = True
+                    break
+                batch.append(task)
+            self.batches += 1
+            self.items += len(batch)
+            self._executor.submit(self._run, batch)
+
+    def _run(self, batch: List[Tuple[Any, Future]]) -> None:
+        try:
+            results = list(self.fn([item for item, _ in batch]))
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class ResolveService:
+    """resolve() behind a micro-batcher and a canonical-SMILES cache."""
+
+    def __init__(
+        self,
+        window: float = 0.02,
+        max_batch: int = 100,
+        lookup_workers: int = 4,
+        cache_size: int = 4096,
+        max_pending: int = 1000,
+    ) -> None:
+        self.cache_size = cache_size
+        self.max_pending = max_pending
+        self.requests = 0
+        self.cache_hits = 0
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.RLock()  # done-callbacks may run while it is held
+        self._lookup_workers = lookup_workers
+        self._batcher = MicroBatcher(self._resolve_batch, window=window, max_batch=max_batch)
+
+    def close(self) -> None:
+        self._batcher.close()
+
+    def _resolve_batch(self, smiles_list: List[str]) -> List[Any]:
+        from .pubchem import resolve_many
+
+        return [r if isinstance(r, Exception) else asdict(r)
+                for r in resolve_many(smiles_list, workers=self._lookup_workers)]
+
+    def lookup(self, smiles: str) -> "Future[Dict[str, Any]]":
+        """Future of the record for `smiles` (the dict form of a Result)."""
+        from .rdkit_utils import canonicalize_smiles
+
+        with self._lock:
+            self.requests += 1
+        try:
+            key = canonicalize_smiles(smiles)
+        except ValueError as e:
+            future: Future = Future()
+            future.set_exception(e)
+            return future
+        with self._lock:
+            record = self._cache.get(key)
+            if record is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                future = Future()
+                future.set_result(dict(record, input_smiles=smiles))
+                return future
+            shared = self._inflight.get(key)
+            if shared is None:
+                shared = self._inflight[key] = self._batcher.submit(smiles)
+                shared.add_done_callback(lambda f, key=key: self._store(key, f))
+        # One lookup per molecule; every caller gets a future with its own input_smiles
+        future = Future()
+
+        def relay(f: Future) -> None:
+            if f.exception() is not None:
+                future.set_exception(f.exception())
+            else:
+                future.set_result(dict(f.result(), input_smiles=smiles))
+        shared.add_done_callback(relay)
+        return future
+
+    def _store(self, key: str, future: Future) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+            if future.exception() is None:
+                self._cache[key] = future.result()
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+    def lookup_many(self, smiles: Iterator[str]) -> Iterator[Tuple[int, str, "Future[Dict[str, Any]]"]]:
+        """(index, smiles, future) in input order, keeping at most `max_pending` lookups ahead."""
+        pending: Deque[Tuple[int, str, Future]] = deque()
+        for index, s in enumerate(smiles):
+            pending.append((index, s, self.lookup(s)))
+            if len(pending) >= self.max_pending:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+
+    def health(self) -> Dict[str, Any]:
+        from .pubchem import http_cache
+
+        cache = http_cache()
+        with self._lock:
+            return {
+                "status": "ok",
+                "requests": self.requests,
+                "cache_hits": self.cache_hits,
+                "cached": len(self._cache),
+                "batches": self._batcher.batches,
+                "batched_items": self._batcher.items,
+                "response_cache": cache.stats() if cache is not None else None,
+            }
+
+
+def error_record(smiles: str, exc: BaseException) -> Tuple[int, Dict[str, Any]]:
+    """HTTP status and JSON body for a failed lookup."""
+    from .http_cache import OfflineMiss
+
+    message = str(exc) or type(exc).__name__
+    if isinstance(exc, OfflineMiss) or "Could not resolve CID" in message:
+        status = 404
+    elif isinstance(exc, ValueError):
+        status = 400  # invalid SMILES
+    else:
+        status = 502  # upstream failure
+    return status, {"input_smiles": smiles, "error": message}
+
+
+def _parse_bulk(body: bytes, content_type: str) -> List[str]:
+    text = body.decode("utf-8")
+    if "ndjson" not in content_type and text.lstrip()[:1] in ("[", "{"):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            data = data.get("smiles")
+            data = [data] if isinstance(data, str) else data
+        if isinstance(data, list):
+            return [str(s.get("smiles") if isinstance(s, dict) else s) for s in data]
+    out = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            line = str(json.loads(line).get("smiles", ""))
+        out.append(line)
+    return out
+
+
+def make_handler(service: ResolveService) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        server_version = "chem-reporter-resolve/1.0"
+
+        def log_message(self, fmt: str, *args: Any) -> None:
+            logger.debug("%s %s", self.address_string(), fmt % args)
+
+        def _send_json(self, status: int, body: Any) -> None:
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            if url.path == "/health":
+                self._send_json(200, service.health())
+                return
+            if url.path != "/resolve":
+                self._send_json(404, {"error": f"Unknown path {url.path}"})
+                return
+            smiles = (parse_qs(url.query).get("smiles") or [""])[0].strip()
+            if not smiles:
+                self._send_json(400, {"error": "Missing ?smiles="})
+                return
+            try:
+                self._send_json(200, service.lookup(smiles).result())
+            except Exception as e:
+                self._send_json(*error_record(smiles, e))
+
+        def do_POST(self) -> None:
+            if urlparse(self.path).path != "/resolve":
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                smiles = _parse_bulk(self.rfile.read(length), self.headers.get("Content-Type") or "")
+            except ValueError as e:
+                self._send_json(400, {"error": f"Unreadable request body: {e}"})
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+            self.end_headers()  # HTTP/1.0: the body ends when the connection closes
+            for index, s, future in service.lookup_many(iter(smiles)):
+                try:
+                    record = future.result()
+                except Exception as e:
+                    record = error_record(s, e)[1]
+                line = json.dumps({"index": index, **record}, ensure_ascii=False) + "\n"
+                try:
+                    self.wfile.write(line.encode("utf-8"))
+                    self.wfile.flush()
+                except OSError:
+                    return  # client went away
+
+    return Handler
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    service: Optional[ResolveService] = None,
+) -> ThreadingHTTPServer:
+    """An HTTP server bound to (host, port); call serve_forever() on it."""
+    service = service or ResolveService()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    server.service = service  # type: ignore[attr-defined]
+    return server
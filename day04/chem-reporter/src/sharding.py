@@ -0,0 +1,217 @@
+# src/sharding.py
+"""
+Deterministic sharding of batch inputs, and merging of per-shard results.
+
+Every row is assigned to a shard by a stable hash (BLAKE2b, not Python's
+randomized hash()) of its deduplication key (canonical SMILES, or the
+InChIKey with `--dedup inchikey`), so N workers given the same input file
+and `--shard 1/N` ... `--shard N/N` split it without talking to each other,
+and all rows deduplication would group land on the same shard
+(within-batch deduplication keeps working).
+
+Per-shard summaries keep the original input row numbers; `merge_summaries`
+k-way merges them back into input order and can gather per-shard output
+trees into one results folder. Each shard indexes into its own
+catalog_<tag>.sqlite (and, with `--store`, writes results_<tag>.sqlite, and
+fingerprints into fingerprints_<tag>/), so no file is shared between nodes;
+merging folds them into one catalog.sqlite / results.sqlite / fingerprints/.
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import heapq
+import logging
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    Parse "i/N" (1-based, 1 <= i <= N) into a 0-based (index, count) pair.
+    Raises ValueError for malformed specs.
+    """
+    try:
+        i, n = (int(part) for part in spec.split("/", 1))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N (e.g. 2/8), got {spec!r}") from None
+    if n < 1 or not 1 <= i <= n:
+        raise ValueError(f"Shard {spec!r} out of range: need 1 <= i <= N")
+    return i - 1, n
+
+
+def shard_of(smiles: str, count: int, mode: str = "smiles") -> int:
+    """
+    0-based shard of a SMILES, hashing the same `dedup_key(smiles, mode)` the
+    pipeline groups duplicates by; unparsable input is hashed as written.
+    """
+    from .rdkit_utils import dedup_key  # RDKit only when rows are actually sharded
+
+    key = dedup_key(smiles, mode) or smiles.strip()
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+
+def shard_tag(index: int, count: int) -> str:
+    """File-name tag for a shard, e.g. "shard2of8"."""
+    return f"shard{index + 1}of{count}"
+
+
+# ------------------------------------------------------------------
+# Merging
+# ------------------------------------------------------------------
+
+def _read_summary(path: Path, k: int) -> Iterator[Tuple[int, int, int, Dict[str, str]]]:
+    """Yield (row, file position, line, record) for one summary file."""
+    with path.open("r", newline="", encoding="utf-8") as fh:
+        for n, row in enumerate(csv.DictReader(fh)):
+            yield int(row["row"]), k, n, row
+
+
+def _gather_output(out_dir: str, target: Path, copied: Dict[str, str]) -> str:
+    """Copy one compound folder into `target` (once) and return its new path."""
+    if not out_dir:
+        return out_dir
+    if out_dir in copied:
+        return copied[out_dir]
+    src = Path(out_dir)
+    if not src.is_dir():
+        return out_dir  # e.g. a key into a results store
+    dest = target / src.name
+    if src.resolve() != dest.resolve():
+        shutil.copytree(src, dest, dirs_exist_ok=True)
+    copied[out_dir] = str(dest.resolve())
+    return copied[out_dir]
+
+
+_SHARD_SUFFIX = re.compile(r"_(shard\d+of\d+)$")
+
+
+def _merge_shard_databases(paths: Sequence[Path], target: Path, gathered: bool) -> Tuple[int, int, int]:
+    """
+    Fold the shard catalogs, stores and fingerprint stores next to each
+    summary (batch_summary_<time>_<tag>.csv) into `target`; returns how many
+    of each were merged. Unless the compound folders were `gathered` into
+    `target`, catalog entries point back at the shard's folders. Fingerprint
+    stores already in `target` are searched from there as they are and are
+    left alone.
+    """
+    from .catalog import catalog_filename, catalog_for
+    from .fingerprints import FINGERPRINT_DIRNAME, FingerprintStore
+    from .store import STORE_FILENAME, ResultStore, store_filename
+
+    catalogs, stores, fingerprints = [], [], []
+    for p in paths:
+        match = _SHARD_SUFFIX.search(p.stem)
+        if match is None:
+            continue
+        tag = match.group(1)
+        db = p.parent / catalog_filename(tag)
+        if db.is_file() and db not in catalogs:
+            catalogs.append(db)
+        db = p.parent / store_filename(tag)
+        if db.is_file() and db not in stores:
+            stores.append(db)
+        fp_dir = p.parent / f"{FINGERPRINT_DIRNAME}_{tag}"
+        if ((fp_dir / "meta.json").is_file() and fp_dir not in fingerprints
+                and p.parent.resolve() != target.resolve()):
+            fingerprints.append(fp_dir)
+    if catalogs:
+        catalog = catalog_for(target)
+        for db in catalogs:
+            catalog.merge(db, folders_in=None if gathered else db.parent)
+    if stores:
+        with ResultStore(target / STORE_FILENAME) as store:
+            for db in stores:
+                store.merge(db)
+    if fingerprints:
+        with FingerprintStore(target / FINGERPRINT_DIRNAME) as fps:
+            for fp_dir in fingerprints:
+                fps.merge(fp_dir)
+    return len(catalogs), len(stores), len(fingerprints)
+
+
+def merge_summaries(
+    summaries: Sequence[str | os.PathLike],
+    out_path: str | os.PathLike,
+    results_dir: Optional[str | os.PathLike] = None,
+) -> Dict[str, Any]:
+    """
+    Merge per-shard summary CSVs into one summary in input-row order.
+
+    The inputs are already sorted by row, so this is a streaming k-way merge
+    with flat memory use. If `results_dir` is given, every compound folder
+    referenced by a summary is copied there (once) and `output_dir` is
+    rewritten to point at the merged tree. `dup_group` ids, numbered per
+    shard, are renumbered so they stay unique in the merged file.
+
+    The shard catalogs and stores found next to the summaries are merged
+    into catalog.sqlite / results.sqlite of `results_dir` (default: the
+    directory of `out_path`, where catalog entries name the shards' folders
+    relative to it), and their fingerprint stores into its fingerprints/
+    (unless they already live there).
+
+    Returns counters: rows, duplicates (same row in several summaries; the
+    later file wins), missing (gaps in the row numbering, i.e. a shard that
+    was not included or did not finish), catalogs, stores and fingerprints
+    (shard databases merged).
+    """
+    paths = [Path(p) for p in summaries]
+    if not paths:
+        raise ValueError("No summary files to merge.")
+
+    fieldnames: List[str] = []
+    for p in paths:
+        with p.open("r", newline="", encoding="utf-8") as fh:
+            header = next(csv.reader(fh), [])
+        if "row" not in header:
+            raise ValueError(f"{p} has no 'row' column; was it written by a sharded run?")
+        fieldnames += [name for name in header if name not in fieldnames]
+
+    target = Path(results_dir) if results_dir else None
+    if target is not None:
+        target.mkdir(parents=True, exist_ok=True)
+    copied: Dict[str, str] = {}
+    groups: Dict[Tuple[int, str], str] = {}
+    stats = {"rows": 0, "duplicates": 0, "missing": 0}
+
+    # Streams carry their file position so ties resolve to the later file
+    streams = [_read_summary(p, k) for k, p in enumerate(paths)]
+    out = Path(out_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with out.open("w", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, fieldnames=fieldnames, restval="")
+        writer.writeheader()
+
+        def emit(k: int, rec: Dict[str, str]) -> None:
+            if rec.get("dup_group"):
+                rec["dup_group"] = groups.setdefault((k, rec["dup_group"]), str(len(groups) + 1))
+            if target is not None:
+                rec["output_dir"] = _gather_output(rec.get("output_dir", ""), target, copied)
+            writer.writerow(rec)
+            stats["rows"] += 1
+
+        pending: Optional[Tuple[int, Dict[str, str]]] = None
+        pending_row = 0
+        for row, k, _n, rec in heapq.merge(*streams, key=lambda t: t[:3]):
+            if pending is not None and row == pending_row:
+                stats["duplicates"] += 1
+            else:
+                if pending is not None:
+                    emit(*pending)
+                stats["missing"] += max(0, row - pending_row - 1)
+            pending, pending_row = (k, rec), row
+        if pending is not None:
+            emit(*pending)
+
+    merged = _merge_shard_databases(paths, target or out.parent, gathered=target is not None)
+    stats["catalogs"], stats["stores"], stats["fingerprints"] = merged
+    if stats["missing"]:
+        logger.warning("Merged summary is missing %d rows; is a shard absent or unfinished?", stats["missing"])
+    return stats
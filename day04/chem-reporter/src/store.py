@@ -0,0 +1,340 @@
+# src/store.py
+"""
+Consolidated output store for batch runs.
+
+Instead of a folder with four small files per compound, everything goes
+into one SQLite database:
+
+    compounds       one row per compound (metadata and RDKit descriptors;
+                    indexed by folder name, CID and IUPAC name)
+    melting_points  one row per melting-point entry
+    structures      the structure as zlib-compressed SDF text
+
+Writes are grouped into transactions of `batch_size` compounds, so a
+100k-compound run touches one file a few hundred times instead of creating
+400k files. Per-compound folders, identical to what `io_utils.write_outputs`
+produces, are exported only when asked for (`export`).
+
+Each shard of a sharded run writes its own results_<tag>.sqlite (SQLite's
+locking is not safe on the network filesystems shards tend to share);
+`merge-summaries` copies them into results.sqlite (`merge`).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .io_utils import (
+    _ensure_dir, _index_folder, _result_folder_name, _write_json_atomic, build_metadata, write_text_files,
+)
+
+logger = logging.getLogger(__name__)
+
+STORE_FILENAME = "results.sqlite"
+
+
+def store_filename(tag: str = "") -> str:
+    """results.sqlite, or results_<tag>.sqlite for one shard of a sharded run."""
+    return f"results_{tag}.sqlite" if tag else STORE_FILENAME
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS compounds (
+    id             INTEGER PRIMARY KEY,
+    folder         TEXT NOT NULL UNIQUE,
+    cid            INTEGER,
+    input_smiles   TEXT,
+    iupac_name     TEXT,
+    preferred_name TEXT,
+    created_at     TEXT,
+    sources        TEXT,
+    errors         TEXT,
+    structure      TEXT,
+    descriptors    TEXT
+);
+CREATE INDEX IF NOT EXISTS compounds_cid ON compounds(cid);
+CREATE INDEX IF NOT EXISTS compounds_iupac ON compounds(iupac_name COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS melting_points (
+    compound_id INTEGER NOT NULL REFERENCES compounds(id) ON DELETE CASCADE,
+    position    INTEGER NOT NULL,
+    source      TEXT,
+    value       TEXT,
+    unit        TEXT,
+    notes       TEXT,
+    source_url  TEXT,
+    PRIMARY KEY (compound_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS structures (
+    compound_id INTEGER PRIMARY KEY REFERENCES compounds(id) ON DELETE CASCADE,
+    sdf         BLOB NOT NULL
+);
+"""
+
+_MP_FIELDS = ("source", "value", "unit", "notes", "source_url")
+
+_COMPOUND_COLUMNS = ("folder", "cid", "input_smiles", "iupac_name", "preferred_name",
+                     "created_at", "sources", "errors", "structure", "descriptors")
+_UPSERT = (
+    f"INSERT INTO compounds ({', '.join(_COMPOUND_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(_COMPOUND_COLUMNS))}) ON CONFLICT(folder) DO UPDATE SET "
+    + ", ".join(f"{c}=excluded.{c}" for c in _COMPOUND_COLUMNS[1:])
+)
+
+Key = Union[int, str]
+
+
+class ResultStore:
+    """
+    SQLite store for resolved compounds and their structures.
+
+        with ResultStore("results/results.sqlite") as store:
+            store.add(result, sdf_text)
+        ...
+        ResultStore(path).export(["aspirin"], "results/")
+
+    Adding a compound whose folder name is already stored replaces it, the
+    same way `write_outputs` overwrites an existing folder. `add` may be
+    called from any thread; writes are serialized and committed every
+    `batch_size` compounds and on `commit` / `close`.
+    """
+
+    def __init__(self, path: str | os.PathLike, batch_size: int = 500) -> None:
+        self.path = os.path.abspath(path)
+        self.batch_size = max(1, batch_size)
+        _ensure_dir(os.path.dirname(self.path))
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+        columns = {r[1] for r in self._conn.execute("PRAGMA table_info(compounds)")}
+        if "descriptors" not in columns:  # store created before descriptors
+            self._conn.execute("ALTER TABLE compounds ADD COLUMN descriptors TEXT")
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def add(self, result: Any, sdf_text: Optional[str] = None) -> str:
+        """
+        Store one compound (metadata, melting points, structure) and return
+        its key, the folder name `write_outputs` would have used.
+        """
+        folder = _result_folder_name(result)
+        meta = build_metadata(result)
+        structure = dict(getattr(result, "structure", None) or {})
+        descriptors = meta.get("descriptors")
+        row = (
+            folder, meta["cid"], meta["input_smiles"], meta["iupac_name"], meta["preferred_name"],
+            meta["created_at"], json.dumps(meta["sources"]), json.dumps(meta["errors"]),
+            json.dumps(structure), json.dumps(descriptors) if descriptors else None,
+        )
+        with self._lock:
+            self._conn.execute(_UPSERT, row)
+            compound_id = self._conn.execute("SELECT id FROM compounds WHERE folder = ?", (folder,)).fetchone()[0]
+            self._conn.execute("DELETE FROM melting_points WHERE compound_id = ?", (compound_id,))
+            self._conn.executemany(
+                "INSERT INTO melting_points VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(compound_id, n, *(mp[f] for f in _MP_FIELDS)) for n, mp in enumerate(meta["melting_points"])],
+            )
+            if sdf_text is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO structures VALUES (?, ?)",
+                    (compound_id, zlib.compress(sdf_text.encode("utf-8"))),
+                )
+            self._uncommitted += 1
+            if self._uncommitted >= self.batch_size:
+                self._commit()
+        return folder
+
+    def set_descriptors(self, values: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """
+        Merge {name: value} descriptors into stored compounds, given as
+        (folder name, values) pairs; returns how many compounds were updated.
+        """
+        updated = 0
+        with self._lock:
+            for folder, new in values:
+                row = self._conn.execute("SELECT descriptors FROM compounds WHERE folder = ?",
+                                         (folder,)).fetchone()
+                if row is None:
+                    continue
+                merged = {**json.loads(row[0] or "{}"), **new}
+                self._conn.execute("UPDATE compounds SET descriptors = ? WHERE folder = ?",
+                                   (json.dumps(merged), folder))
+                updated += 1
+                self._uncommitted += 1
+                if self._uncommitted >= self.batch_size:
+                    self._commit()
+        return updated
+
+    def merge(self, path: str | os.PathLike) -> int:
+        """
+        Copy every compound of another store (e.g. a shard's
+        results_<tag>.sqlite) into this one, replacing compounds with the
+        same key; returns the number copied.
+        """
+        with self._lock:
+            self._commit()
+            self._conn.execute("ATTACH DATABASE ? AS other", (os.fspath(path),))
+            try:
+                with self._conn:
+                    present = {r[1] for r in self._conn.execute("PRAGMA other.table_info(compounds)")}
+                    select = ", ".join(c if c in present else "NULL" for c in _COMPOUND_COLUMNS)
+                    rows = self._conn.execute(f"SELECT id, {select} FROM other.compounds").fetchall()
+                    for row in rows:
+                        self._conn.execute(_UPSERT, tuple(row)[1:])
+                        compound_id = self._conn.execute("SELECT id FROM compounds WHERE folder = ?",
+                                                         (row["folder"],)).fetchone()[0]
+                        self._conn.execute("DELETE FROM melting_points WHERE compound_id = ?", (compound_id,))
+                        self._conn.execute(
+                            f"INSERT INTO melting_points SELECT ?, position, {', '.join(_MP_FIELDS)} "
+                            "FROM other.melting_points WHERE compound_id = ?",
+                            (compound_id, row["id"]),
+                        )
+                        self._conn.execute("DELETE FROM structures WHERE compound_id = ?", (compound_id,))
+                        self._conn.execute(
+                            "INSERT INTO structures SELECT ?, sdf FROM other.structures WHERE compound_id = ?",
+                            (compound_id, row["id"]),
+                        )
+            finally:
+                self._conn.execute("DETACH DATABASE other")
+        return len(rows)
+
+    def descriptor_rows(self) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """(folder name, input SMILES, descriptors) of every stored compound."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT folder, input_smiles, descriptors FROM compounds ORDER BY id").fetchall()
+        return ((folder, smiles or "", json.loads(values or "{}")) for folder, smiles, values in rows)
+
+    @property
+    def uncommitted(self) -> int:
+        """Compounds added since the last commit."""
+        return self._uncommitted
+
+    def commit(self) -> None:
+        with self._lock:
+            self._commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._commit()
+                self._conn.close()
+                self._conn = None
+
+    def _commit(self) -> None:
+        if self._uncommitted:
+            self._conn.commit()
+            self._uncommitted = 0
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def keys(self) -> List[str]:
+        """Folder names of every stored compound."""
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT folder FROM compounds ORDER BY id")]
+
+    def _find(self, key: Key) -> Optional[sqlite3.Row]:
+        """Look a compound up by folder name, CID or IUPAC / preferred name."""
+        if isinstance(key, int) or str(key).isdigit():
+            row = self._conn.execute("SELECT * FROM compounds WHERE cid = ? ORDER BY id LIMIT 1",
+                                     (int(key),)).fetchone()
+            if row is not None:
+                return row
+        return self._conn.execute(
+            "SELECT * FROM compounds WHERE folder = ? OR iupac_name = ? COLLATE NOCASE "
+            "OR preferred_name = ? COLLATE NOCASE ORDER BY folder != ? LIMIT 1",
+            (str(key), str(key), str(key), str(key)),
+        ).fetchone()
+
+    def get(self, key: Key) -> Optional[Dict[str, Any]]:
+        """metadata.json content of a stored compound, or None."""
+        with self._lock:
+            row = self._find(key)
+            if row is None:
+                return None
+            mps = self._conn.execute(
+                "SELECT source, value, unit, notes, source_url FROM melting_points "
+                "WHERE compound_id = ? ORDER BY position", (row["id"],),
+            ).fetchall()
+        metadata = {
+            "created_at": row["created_at"],
+            "input_smiles": row["input_smiles"],
+            "cid": row["cid"],
+            "iupac_name": row["iupac_name"],
+            "preferred_name": row["preferred_name"],
+            "sources": json.loads(row["sources"] or "{}"),
+            "melting_points": [dict(zip(_MP_FIELDS, mp)) for mp in mps],
+            "errors": json.loads(row["errors"] or "null"),
+            "structure_3d": "done",
+            "structure": json.loads(row["structure"] or "{}"),
+        }
+        if row["descriptors"]:
+            metadata["descriptors"] = json.loads(row["descriptors"])
+        return metadata
+
+    def structure(self, key: Key) -> Optional[str]:
+        """SDF text of a stored compound, or None."""
+        with self._lock:
+            row = self._find(key)
+            if row is None:
+                return None
+            blob = self._conn.execute("SELECT sdf FROM structures WHERE compound_id = ?",
+                                      (row["id"],)).fetchone()
+        return None if blob is None else zlib.decompress(blob[0]).decode("utf-8")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM compounds").fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+    def export(self, keys: Optional[Iterable[Key]] = None, base_dir: str = "results") -> List[str]:
+        """
+        Write per-compound folders (metadata.json, IUPAC.txt,
+        melting_point.csv, structure.sdf) for `keys`, or for every compound
+        if None, and record them in <base_dir>/catalog.sqlite like
+        `write_outputs` does. Returns the folders written; unknown keys are
+        logged.
+        """
+        written = []
+        for key in (self.keys() if keys is None else keys):
+            metadata = self.get(key)
+            if metadata is None:
+                logger.warning("Not in store: %s", key)
+                continue
+            with self._lock:
+                folder = self._find(key)["folder"]
+            out_dir = os.path.abspath(os.path.join(base_dir, folder))
+            _ensure_dir(out_dir)
+            write_text_files(out_dir, metadata)
+            sdf_text = self.structure(key)
+            if sdf_text is not None:
+                with open(os.path.join(out_dir, "structure.sdf"), "w", encoding="utf-8", newline="") as f:
+                    f.write(sdf_text)
+            _write_json_atomic(os.path.join(out_dir, "metadata.json"), metadata)
+            _index_folder(base_dir, folder, metadata)
+            written.append(out_dir)
+        return written
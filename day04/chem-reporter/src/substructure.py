@@ -0,0 +1,158 @@
+# src/substructure.py
+"""
+Substructure queries over batch inputs and processed results.
+
+A query is a SMARTS pattern; plain SMILES work too ("c1ccccc1C(=O)O").
+
+    SubstructureFilter.filter   keeps the CSV rows whose SMILES contain the
+                                motif (run_batch.py --substructure)
+    SubstructureFilter.search   the processed compounds containing it
+                                (query_results.py substructure)
+
+`search` first screens the pattern fingerprints stored with every compound
+(<results>/fingerprints*/pattern.u64, see fingerprints.py): a compound can
+only contain the query if it has every bit the query sets, which NumPy
+checks for a whole chunk of rows at a time. Only the survivors are parsed
+and matched exactly. In both cases exact matching runs on a process pool in
+chunks, and matches are yielded in input / row order as soon as their chunk
+is done, so callers can stream them out.
+
+Raw inputs are not prescreened: computing a pattern fingerprint costs more
+than the match it would save (about 20x for drug-sized molecules), whereas
+the stored ones are computed once, when the compound is written.
+"""
+from __future__ import annotations
+
+import logging
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SCREEN_ROWS = 1 << 16
+_queries: Dict[str, Any] = {}  # per process
+
+
+def compile_query(smarts: str) -> Any:
+    """RDKit query molecule for `smarts`; ValueError if it does not parse."""
+    from rdkit import Chem, rdBase
+
+    with rdBase.BlockLogs():
+        query = Chem.MolFromSmarts(smarts) if smarts and smarts.strip() else None
+    if query is None:
+        raise ValueError(f"Invalid SMARTS: {smarts!r}")
+    return query
+
+
+def match_chunk(smarts: str, smiles: List[str]) -> List[bool]:
+    """Pool task: whether each SMILES contains the query (False if it does not parse)."""
+    from rdkit import Chem, rdBase
+
+    query = _queries.get(smarts)
+    if query is None:
+        query = _queries[smarts] = compile_query(smarts)
+    out = []
+    with rdBase.BlockLogs():  # invalid inputs are reported by the pipeline, not here
+        for s in smiles:
+            mol = Chem.MolFromSmiles(s) if s else None
+            out.append(mol is not None and mol.HasSubstructMatch(query))
+    return out
+
+
+def screen(patterns: Any, query: Any) -> Any:
+    """Indexes of the rows of `patterns` ([n, words] uint64) that have every bit of `query`."""
+    import numpy as np
+
+    keep = []
+    for start in range(0, len(patterns), _SCREEN_ROWS):
+        chunk = np.bitwise_and(patterns[start:start + _SCREEN_ROWS], query)
+        keep.append(np.flatnonzero((chunk == query).all(axis=1)) + start)
+    return np.concatenate(keep) if keep else np.zeros(0, dtype=np.int64)
+
+
+class SubstructureFilter:
+    """
+    Exact substructure matching of (item, smiles) pairs on `workers`
+    processes (0 = in-process; default: one per core but one), in chunks of
+    `chunk_size`. With `pool` the chunks run on that executor instead
+    (shared with other stages, left running). Counters: `screened` rows seen by the fingerprint screen,
+    `matched` pairs matched exactly, `kept` pairs that contain the query.
+    """
+
+    def __init__(self, smarts: str, workers: Optional[int] = None, chunk_size: int = 256,
+                 pool: Optional[Executor] = None) -> None:
+        compile_query(smarts)  # fail early
+        if workers is None:
+            from .pipeline import default_rdkit_workers
+
+            workers = default_rdkit_workers()
+        self.smarts = smarts
+        self.workers = workers
+        self.chunk_size = max(1, chunk_size)
+        self.pool = pool
+        self.screened = 0
+        self.matched = 0
+        self.kept = 0
+
+    def _chunks(self, pairs: Iterable[Tuple[Any, str]]) -> Iterator[List[Tuple[Any, str]]]:
+        chunk: List[Tuple[Any, str]] = []
+        for pair in pairs:
+            chunk.append(pair)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _matched(self, chunk: List[Tuple[Any, str]], flags: List[bool]) -> Iterator[Tuple[Any, str]]:
+        self.matched += len(chunk)
+        for pair, flag in zip(chunk, flags):
+            if flag:
+                self.kept += 1
+                yield pair
+
+    def filter(self, pairs: Iterable[Tuple[Any, str]]) -> Iterator[Tuple[Any, str]]:
+        """The (item, smiles) pairs whose SMILES contain the query, in input order."""
+        if self.workers <= 0 and self.pool is None:
+            for chunk in self._chunks(pairs):
+                yield from self._matched(chunk, match_chunk(self.smarts, [s for _, s in chunk]))
+            return
+        pool = self.pool or ProcessPoolExecutor(max_workers=self.workers)
+        pending: Deque[Tuple[List[Tuple[Any, str]], Any]] = deque()
+        try:
+            for chunk in self._chunks(pairs):
+                pending.append((chunk, pool.submit(match_chunk, self.smarts, [s for _, s in chunk])))
+                if len(pending) > 2 * max(1, self.workers):  # bounded read-ahead
+                    done, future = pending.popleft()
+                    yield from self._matched(done, future.result())
+            while pending:
+                done, future = pending.popleft()
+                yield from self._matched(done, future.result())
+        finally:
+            if pool is self.pool:
+                for _, future in pending:
+                    future.cancel()
+            else:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    def search(self, base_dir: Any) -> Iterator[Dict[str, Any]]:
+        """Records (see fingerprints.py) of the processed compounds containing the query."""
+        from .fingerprints import fingerprint_dirs, open_patterns, pattern_words, read_records
+
+        query = pattern_words(compile_query(self.smarts))
+
+        def candidates() -> Iterator[Tuple[Dict[str, Any], str]]:
+            for directory in fingerprint_dirs(base_dir):
+                rows, patterns = open_patterns(directory)
+                self.screened += rows
+                survivors = [] if patterns is None else screen(patterns, query).tolist()
+                survivors += range(0 if patterns is None else len(patterns), rows)  # not screened
+                for start in range(0, len(survivors), 1024):
+                    records = read_records(directory, survivors[start:start + 1024])
+                    for row in survivors[start:start + 1024]:
+                        if row in records:
+                            yield records[row], records[row]["smiles"]
+
+        for record, _ in self.filter(candidates()):
+            yield record
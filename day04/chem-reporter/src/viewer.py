@@ -0,0 +1,233 @@
+# src/viewer.py
+"""
+Notebook viewer for stored 3D structures (see visualize_molecule.ipynb).
+
+structure.sdf already holds the optimized conformer written by the
+pipeline (every conformer, lowest energy first, for runs with
+`--keep-conformers`), so nothing is embedded or optimized again here: the stored
+coordinates are shown as they are.
+
+    viewer = ConformerViewer("results")
+    viewer.view(2244)                 # by CID, name or folder / store key
+    viewer.view_page(0)               # the first `per_page` compounds, as a grid
+    for page in range(viewer.num_pages): ...
+
+Compounds are found through <results>/catalog.sqlite (CID, preferred or
+IUPAC name), the folder name, or <results>/results.sqlite for `--store`
+runs. Nothing is read up front: a structure is parsed the first time it is
+shown and kept in a small LRU cache (`cache_size` molecules), so paging
+through a large result set reads only the SDFs of the pages looked at.
+When an SDF holds several records of the same molecule (a `--keep-conformers`
+run), they become the conformers of one Mol (`conf_id` selects one; None
+animates all); otherwise each compound has a single conformer.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+Key = Union[int, str]
+
+
+def _py3dmol():
+    try:
+        import py3Dmol
+    except ImportError as exc:
+        raise ImportError(
+            "The 3D viewer requires the 'py3Dmol' package "
+            "(conda install -c conda-forge py3dmol)."
+        ) from exc
+    return py3Dmol
+
+
+def mol_from_sdf(sdf_text: str) -> Any:
+    """
+    Parse SDF text (hydrogens and coordinates kept as stored); further
+    records of the same molecule are added as conformers of the first.
+    """
+    from rdkit import Chem
+
+    supplier = Chem.SDMolSupplier()
+    supplier.SetData(sdf_text, removeHs=False)
+    mol = None
+    for record in supplier:
+        if record is None:
+            continue
+        if mol is None:
+            mol = Chem.Mol(record)
+        elif record.GetNumAtoms() == mol.GetNumAtoms():
+            mol.AddConformer(record.GetConformer(), assignId=True)
+    if mol is None:
+        raise ValueError("No valid molecule in the SDF")
+    return mol
+
+
+class ConformerViewer:
+    """
+    Lazy access to the structures under `results_dir`, `per_page` compounds
+    a page, with the last `cache_size` parsed molecules kept in memory.
+    """
+
+    def __init__(self, results_dir: str | os.PathLike = "results", per_page: int = 12,
+                 cache_size: int = 64) -> None:
+        self.results_dir = os.path.abspath(results_dir)
+        self.per_page = max(1, per_page)
+        self.cache_size = max(1, cache_size)
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._keys: Optional[List[str]] = None
+        self._catalog: Any = None
+        self._store: Any = None
+
+    # ------------------------------------------------------------------
+    # Finding structures
+    # ------------------------------------------------------------------
+    def _open_catalog(self) -> Any:
+        from .catalog import CATALOG_FILENAME, ResultsCatalog
+
+        path = os.path.join(self.results_dir, CATALOG_FILENAME)
+        if self._catalog is None and os.path.exists(path):
+            self._catalog = ResultsCatalog(path)
+        return self._catalog
+
+    def _open_store(self) -> Any:
+        from .store import STORE_FILENAME, ResultStore
+
+        path = os.path.join(self.results_dir, STORE_FILENAME)
+        if self._store is None and os.path.exists(path):
+            self._store = ResultStore(path)
+        return self._store
+
+    def _folder_sdf(self, folder: str) -> Optional[str]:
+        path = os.path.join(self.results_dir, folder, "structure.sdf")
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def sdf(self, key: Key) -> str:
+        """SDF text of a compound, by CID, name or folder / store key; KeyError if unknown."""
+        text = self._folder_sdf(str(key))
+        if text is not None:
+            return text
+        catalog = self._open_catalog()
+        if catalog is not None:
+            if isinstance(key, int) or str(key).isdigit():
+                entries = catalog.query(cid=int(key), limit=1)
+            else:
+                entries = catalog.query(name=str(key), limit=1)
+            for entry in entries:
+                text = self._folder_sdf(entry["folder"])
+                if text is not None:
+                    return text
+        store = self._open_store()
+        if store is not None:
+            text = store.structure(key)
+            if text is not None:
+                return text
+        raise KeyError(f"No stored structure for {key!r} in {self.results_dir}")
+
+    def mol(self, key: Key) -> Any:
+        """The stored molecule, with all its conformers (parsed once, then cached)."""
+        cache_key = str(key)
+        mol = self._cache.get(cache_key)
+        if mol is not None:
+            self._cache.move_to_end(cache_key)
+            return mol
+        mol = mol_from_sdf(self.sdf(key))
+        self._cache[cache_key] = mol
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return mol
+
+    def num_conformers(self, key: Key) -> int:
+        return self.mol(key).GetNumConformers()
+
+    # ------------------------------------------------------------------
+    # Paging
+    # ------------------------------------------------------------------
+    def keys(self) -> List[str]:
+        """Folder names and store keys of every compound (names only; no SDF is read)."""
+        if self._keys is None:
+            keys = set()
+            for name in os.listdir(self.results_dir) if os.path.isdir(self.results_dir) else ():
+                if os.path.isfile(os.path.join(self.results_dir, name, "structure.sdf")):
+                    keys.add(name)
+            store = self._open_store()
+            if store is not None:
+                keys.update(store.keys())
+            self._keys = sorted(keys)
+        return self._keys
+
+    @property
+    def num_pages(self) -> int:
+        return -(-len(self.keys()) // self.per_page)
+
+    def page(self, n: int) -> List[str]:
+        """Keys on page `n` (0-based)."""
+        return self.keys()[n * self.per_page:(n + 1) * self.per_page]
+
+    def refresh(self) -> None:
+        """Forget the key list and cached molecules (after another run wrote results)."""
+        self._keys = None
+        self._cache.clear()
+
+    # ------------------------------------------------------------------
+    # Display (py3Dmol)
+    # ------------------------------------------------------------------
+    def molblock(self, key: Key, conf_id: int = -1) -> str:
+        from rdkit import Chem
+
+        return Chem.MolToMolBlock(self.mol(key), confId=conf_id)
+
+    def view(self, key: Key, conf_id: Optional[int] = -1, style: str = "stick",
+             width: int = 520, height: int = 420) -> Any:
+        """
+        py3Dmol view of one compound: conformer `conf_id` (-1: the first),
+        or every conformer as animation frames with `conf_id=None`.
+        """
+        py3Dmol = _py3dmol()
+        view = py3Dmol.view(width=width, height=height)
+        mol = self.mol(key)
+        if conf_id is None and mol.GetNumConformers() > 1:
+            frames = "".join(self.molblock(key, c.GetId()) + "$$$$\n" for c in mol.GetConformers())
+            view.addModelsAsFrames(frames, "sdf")
+            view.animate({"loop": "forward"})
+        else:
+            view.addModel(self.molblock(key, -1 if conf_id is None else conf_id), "mol")
+        view.setStyle({style: {}})
+        view.zoomTo()
+        return view
+
+    def view_page(self, n: int, columns: int = 4, style: str = "stick",
+                  cell_width: int = 260, cell_height: int = 220) -> Any:
+        """py3Dmol grid of the compounds on page `n`, one cell each (first conformer)."""
+        py3Dmol = _py3dmol()
+        keys = self.page(n)
+        columns = max(1, min(columns, len(keys) or 1))
+        rows = max(1, -(-len(keys) // columns))
+        view = py3Dmol.view(width=cell_width * columns, height=cell_height * rows,
+                            viewergrid=(rows, columns))
+        for i, key in enumerate(keys):
+            cell = (i // columns, i % columns)
+            try:
+                view.addModel(self.molblock(key), "mol", viewer=cell)
+            except (KeyError, ValueError) as e:
+                logger.warning("Skipping %s: %s", key, e)
+                continue
+            view.addLabel(key, {"position": {"x": 0, "y": 0, "z": 0}, "fontSize": 10,
+                                "useScreen": True}, viewer=cell)
+        view.setStyle({style: {}})
+        view.zoomTo()
+        return view
+
+    def close(self) -> None:
+        if self._catalog is not None:
+            self._catalog.close()
+            self._catalog = None
+        if self._store is not None:
+            self._store.close()
+            self._store = None
@@ -0,0 +1,175 @@
+# src/writer.py
+"""
+Background output writer.
+
+`write_outputs` does SDF rendering plus four file writes per compound; on a
+slow disk or network share that adds directly to the latency of whoever
+calls it. OutputWriter moves it to a dedicated thread fed by a bounded queue:
+
+    writer = OutputWriter("results")
+    future = writer.submit(result, sdf_text=sdf)   # returns immediately
+    ...
+    out_dir = future.result()
+    writer.close()                                 # flush + fsync, stop thread
+
+Every file is written to a temp file and renamed into place (see
+io_utils), so readers never see partial files. fsync is batched: written
+folders are synced every `fsync_every` compounds, after `fsync_interval`
+seconds, and on `flush` / `close`, instead of once per file. A future
+resolves when its folder is written, before that sync; callers that must
+not record a folder as done until it is durable (the batch journal) compare
+the `written` count at that point with `synced`.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, List, Optional
+
+from .io_utils import _OUTPUT_FILES, write_outputs
+
+if TYPE_CHECKING:
+    from .rdkit_utils import EmbedOptions
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+_FLUSH = object()
+
+
+def _fsync_dir(path: str) -> None:
+    """fsync a directory's entries (renames); a no-op on Windows."""
+    if os.name == "nt":  # directories cannot be opened for fsync there
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def _fsync_folder(out_dir: str) -> None:
+    """fsync the output files of one folder, then the folder itself."""
+    for name in _OUTPUT_FILES:
+        try:
+            with open(os.path.join(out_dir, name), "rb+") as f:
+                os.fsync(f.fileno())
+        except OSError:
+            pass  # not written (e.g. a failed structure)
+    _fsync_dir(out_dir)
+
+
+class OutputWriter:
+    """
+    Writes compound folders on a background thread. `submit` returns a
+    Future resolving to the output folder (or raising the write error); it
+    blocks only when `max_pending` writes are already queued. `written`
+    counts the folders written so far and `synced` how many of the first
+    ones are fsynced.
+    """
+
+    def __init__(
+        self,
+        base_dir: str = "results",
+        max_pending: int = 64,
+        fsync_every: int = 64,
+        fsync_interval: float = 2.0,
+        catalog: Optional[str] = None,
+    ) -> None:
+        self.base_dir = base_dir
+        self.catalog = catalog
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval = fsync_interval
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, max_pending))
+        self._unsynced: List[str] = []
+        self._last_sync = time.monotonic()
+        self.written = 0
+        self.synced = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="output-writer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "OutputWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def submit(
+        self,
+        result: Any,
+        *,
+        tiered: bool = False,
+        embed: Optional[EmbedOptions] = None,
+        sdf_text: Optional[str] = None,
+    ) -> "Future[str]":
+        """Queue `write_outputs(result, ...)`; see io_utils.write_outputs."""
+        if self._closed:
+            raise RuntimeError("OutputWriter is closed.")
+        future: "Future[str]" = Future()
+        self._queue.put((future, result, {"tiered": tiered, "embed": embed, "sdf_text": sdf_text}))
+        return future
+
+    def flush(self) -> None:
+        """Wait until everything submitted so far is written and synced."""
+        barrier: "Future[None]" = Future()
+        self._queue.put((barrier, _FLUSH, None))
+        barrier.result()
+
+    def close(self) -> None:
+        """Flush, then stop the writer thread. Safe to call twice."""
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+    def _run(self) -> None:
+        while True:
+            try:
+                task = self._queue.get(timeout=self.fsync_interval if self._unsynced else None)
+            except queue.Empty:
+                self._sync()  # idle: make what we have durable
+                continue
+            if task is _STOP:
+                return
+            future, result, kwargs = task
+            if result is _FLUSH:
+                self._sync()
+                future.set_result(None)
+                continue
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                out_dir = write_outputs(result, base_dir=self.base_dir, catalog=self.catalog, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+                continue
+            self._unsynced.append(out_dir)
+            self.written += 1
+            future.set_result(out_dir)
+            if (len(self._unsynced) >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+
+    def _sync(self) -> None:
+        written = self.written
+        folders = dict.fromkeys(self._unsynced)
+        for out_dir in folders:
+            _fsync_folder(out_dir)
+        for parent in dict.fromkeys(os.path.dirname(d) for d in folders):
+            _fsync_dir(parent)  # new folder entries
+        self._unsynced.clear()
+        self._last_sync = time.monotonic()
+        self.synced = written
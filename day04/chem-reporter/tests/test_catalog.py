@@ -0,0 +1,59 @@
+# tests/test_catalog.py
+import shutil
+from pathlib import Path
+
+from src.catalog import catalog_for, ResultsCatalog, CATALOG_FILENAME
+from src.io_utils import write_outputs
+from src.models import MeltingPoint, Result
+from src.rdkit_utils import sdf_block, smiles_to_2d_mol
+
+
+def _write(base: Path, smiles: str, cid: int, name: str, mp: str) -> str:
+    result = Result(input_smiles=smiles, cid=cid, iupac_name=name.lower(), preferred_name=name,
+                    melting_points=[MeltingPoint(value=mp)])
+    return write_outputs(result, base_dir=str(base), sdf_text=sdf_block(smiles_to_2d_mol(smiles)))
+
+
+def test_write_outputs_updates_catalog(tmp_path: Path):
+    _write(tmp_path, "CC(=O)OC1=CC=CC=C1C(=O)O", 2244, "Aspirin", "135 °C")
+    _write(tmp_path, "CN1C=NC2=C1C(=O)N(C(=O)N2C)C", 2519, "Caffeine", "235–238 °C")
+    _write(tmp_path, "OCC", 702, "Ethanol", "-114 °C")
+    catalog = catalog_for(tmp_path)
+
+    assert [r["folder"] for r in catalog.query(cid=2519)] == ["Caffeine"]
+    assert [r["folder"] for r in catalog.query(smiles="CCO")] == ["Ethanol"]
+    assert [r["folder"] for r in catalog.query(name="ASPIRIN")] == ["Aspirin"]
+    assert [r["folder"] for r in catalog.query(name="ca*")] == ["Caffeine"]
+    assert [r["folder"] for r in catalog.query(mp_min=120, mp_max=160)] == ["Aspirin"]
+    assert [r["folder"] for r in catalog.query(mp_min=236)] == ["Caffeine"]
+    assert catalog.query(cid=2244, mp_max=0) == []
+
+
+def test_rebuild_indexes_existing_tree(tmp_path: Path):
+    _write(tmp_path / "a", "OCC", 702, "Ethanol", "-114 °C")
+    _write(tmp_path / "a", "CCN", 6341, "Ethylamine", "-81 °C")
+    shutil.rmtree(tmp_path / "a" / "Ethylamine")
+
+    catalog = ResultsCatalog(tmp_path / "fresh" / CATALOG_FILENAME)
+    catalog.update("gone", {"cid": 1})
+    assert catalog.rebuild(tmp_path / "a") == 1
+    assert [r["folder"] for r in catalog.query()] == ["Ethanol"]
+    catalog.close()
+
+
+def test_unchanged_folder_is_indexed_in_another_catalog(tmp_path: Path):
+    result = Result(input_smiles="OCC", cid=702, preferred_name="Ethanol")
+    sdf = sdf_block(smiles_to_2d_mol("OCC"))
+    write_outputs(result, base_dir=str(tmp_path), sdf_text=sdf)
+    # Same inputs again, e.g. from a shard with its own catalog: nothing rewritten, still indexed
+    write_outputs(result, base_dir=str(tmp_path), sdf_text=sdf, catalog="catalog_shard1of2.sqlite")
+    assert [r["folder"] for r in catalog_for(tmp_path, "catalog_shard1of2.sqlite").query(cid=702)] == ["Ethanol"]
+
+
+def test_merge_keeps_folders_reachable_from_the_merged_catalog(tmp_path: Path):
+    _write(tmp_path / "node1", "OCC", 702, "Ethanol", "-114 °C")
+    merged = ResultsCatalog(tmp_path / "merged" / CATALOG_FILENAME)
+    assert merged.merge(tmp_path / "node1" / CATALOG_FILENAME, folders_in=tmp_path / "node1") == 1
+    (entry,) = merged.query(mp_max=0)
+    assert (tmp_path / "merged" / entry["folder"] / "metadata.json").is_file()
+    merged.close()
@@ -0,0 +1,139 @@
+# tests/test_checkpoint.py
+import csv
+import io
+from pathlib import Path
+
+from src.checkpoint import CheckpointJournal
+from src.columnar import ColumnarWriter
+from src.models import Result
+from src.pipeline import BatchPipeline
+from src.writer import OutputWriter
+
+
+def test_journal_ignores_truncated_tail(tmp_path: Path):
+    journal = CheckpointJournal(tmp_path / "j.jsonl")
+    journal.start()
+    journal.record(1, {"input_smiles": "CCO"})
+    journal.record(2, {"input_smiles": "CCN"})
+    journal.close()
+    with open(journal.path, "a", encoding="utf-8") as fh:
+        fh.write('{"row": 3, "rec')  # crash mid-write
+
+    done = journal.load()
+    assert sorted(done) == [1, 2]
+    assert journal.complete is False
+
+    journal.start()
+    journal.record(3, {"input_smiles": "CCC"})
+    journal.close()
+    assert sorted(journal.load()) == [1, 2, 3]
+
+
+def test_for_input_is_keyed_by_content(tmp_path: Path):
+    a = tmp_path / "a.csv"
+    a.write_text("smiles\nCCO\n", encoding="utf-8")
+    first = CheckpointJournal.for_input(a, tmp_path / "results")
+    a.write_text("smiles\nCCN\n", encoding="utf-8")
+    second = CheckpointJournal.for_input(a, tmp_path / "results")
+    assert first.path != second.path
+
+
+def test_pipeline_skips_restored_rows(tmp_path: Path):
+    calls = []
+
+    def resolve(smiles: str) -> Result:
+        calls.append(smiles)
+        return Result(input_smiles=smiles, cid=1, iupac_name=f"name-{smiles}")
+
+    journal = CheckpointJournal(tmp_path / "j.jsonl")
+    journal.start()
+    restored = {1: {"row": 1, "input_smiles": "CCO", "valid": True, "cid": "702", "error": ""}}
+    pipeline = BatchPipeline(str(tmp_path), resolver=resolve, rdkit_workers=0, journal=journal,
+                             restored=restored, log=lambda _msg: None)
+    fh = io.StringIO()
+    stats = pipeline.run([(1, "CCO"), (2, "CCN")], fh)
+    journal.close()
+
+    assert calls == ["CCN"]
+    assert stats["restored"] == 1
+    rows = list(csv.DictReader(io.StringIO(fh.getvalue())))
+    assert [r["cid"] for r in rows] == ["702", "1"]
+    assert sorted(journal.load()) == [2]
+
+
+def test_transient_failures_are_not_journaled(tmp_path: Path):
+    def resolve(smiles: str) -> Result:
+        if smiles == "CCN":
+            raise ConnectionError("PubChem unreachable")
+        if smiles == "CCC":
+            raise ValueError("Could not resolve CID from the provided SMILES.")
+        return Result(input_smiles=smiles, cid=1, iupac_name=f"name-{smiles}")
+
+    journal = CheckpointJournal(tmp_path / "j.jsonl")
+    journal.start()
+    pipeline = BatchPipeline(str(tmp_path), resolver=resolve, rdkit_workers=0, journal=journal,
+                             dedup="smiles", log=lambda _msg: None)
+    rows = [(1, "CCO"), (2, "CCN"), (3, "CCC"), (4, "not_a_smiles"), (5, "NCC")]
+    stats = pipeline.run(rows, io.StringIO())
+    journal.close()
+
+    assert stats["errors"] == 4
+    # Row 2 and its duplicate (row 5) are retried on resume; permanent errors are not
+    assert sorted(journal.load()) == [1, 3, 4]
+
+
+def test_resumed_run_keeps_restored_rows_in_columnar_export(tmp_path: Path):
+    import pyarrow.parquet as pq
+
+    def resolve(smiles: str) -> Result:
+        return Result(input_smiles=smiles, cid=len(smiles), preferred_name=f"name-{smiles}")
+
+    rows = [(1, "CCO"), (2, "OCC"), (3, "not_a_smiles"), (4, "CCN"), (5, "NCC"), (6, "CCCC")]
+    journal = CheckpointJournal(tmp_path / "j.jsonl")
+    journal.start()
+    BatchPipeline(str(tmp_path), resolver=resolve, rdkit_workers=0, journal=journal, dedup="smiles",
+                  log=lambda _msg: None).run(rows[:3], io.StringIO())  # then "crash"
+    journal.close()
+
+    restored = journal.load()
+    journal.start()
+    with ColumnarWriter(tmp_path / "out.parquet") as columnar:
+        stats = BatchPipeline(str(tmp_path), resolver=resolve, rdkit_workers=0, journal=journal,
+                              restored=restored, dedup="smiles", columnar=columnar,
+                              log=lambda _msg: None).run(rows, io.StringIO())
+    journal.close()
+
+    assert stats["restored"] == 3
+    table = sorted(pq.read_table(tmp_path / "out.parquet").to_pylist(), key=lambda r: r["row"])
+    assert [r["row"] for r in table] == [1, 3, 4, 6]  # rows 2 and 5 are duplicates
+    assert (table[0]["cid"], table[0]["title"], table[0]["num_confs"]) == (3, "name-CCO", 1)
+    assert table[1]["error"] == "Invalid SMILES"
+
+
+def test_rows_are_journaled_only_after_their_folders_are_synced(tmp_path: Path, monkeypatch):
+    events = []
+    sync = OutputWriter._sync
+
+    def logged_sync(self):
+        sync(self)
+        events.append(("sync", self.synced))
+
+    monkeypatch.setattr(OutputWriter, "_sync", logged_sync)
+    journal = CheckpointJournal(tmp_path / "j.jsonl")
+    journal.start()
+    record = journal.record
+    monkeypatch.setattr(journal, "record", lambda row, rec: (events.append(("journal", row)), record(row, rec)))
+    BatchPipeline(str(tmp_path), resolver=lambda s: Result(input_smiles=s, cid=len(s), iupac_name=f"n-{s}"),
+                  rdkit_workers=0, journal=journal, log=lambda _msg: None).run(
+        [(1, "CCO"), (2, "CCN"), (3, "CCC")], io.StringIO())
+    journal.close()
+
+    assert sorted(journal.load()) == [1, 2, 3]
+    # The k-th row journaled wrote the k-th folder: an fsync covering it came first
+    synced = journaled = 0
+    for kind, value in events:
+        if kind == "sync":
+            synced = value
+        else:
+            journaled += 1
+            assert synced >= journaled
@@ -0,0 +1,56 @@
+# tests/test_columnar.py
+import io
+from pathlib import Path
+
+import pytest
+
+from src.columnar import ColumnarWriter, compound_row
+from src.models import MeltingPoint, Result
+from src.pipeline import BatchPipeline
+from src.pubchem import melting_point_bounds
+
+
+def test_melting_point_bounds():
+    assert melting_point_bounds("135 °C") == (135.0, 135.0)
+    assert melting_point_bounds("138–140 °C (rapid heating)") == (138.0, 140.0)
+    assert melting_point_bounds("212 °F") == (100.0, 100.0)
+    assert melting_point_bounds("decomposes") == (None, None)
+
+
+def test_compound_row_flattens_melting_points():
+    result = Result(input_smiles="OCC", cid=702, iupac_name="ethanol", preferred_name="Ethanol",
+                    melting_points=[MeltingPoint(value="-114 °C"), MeltingPoint(value="-117–-114 °C")])
+    record = {"row": 3, "input_smiles": "OCC", "valid": True, "cid": "702", "error": "",
+              "num_confs": "1", "embed_s": "0.02", "elapsed_s": "0.10"}
+    row = compound_row(record, result, {"resolve": 0.5})
+    assert row["canonical_smiles"] == "CCO"
+    assert (row["mp_low_c"], row["mp_high_c"]) == (-117.0, -114.0)
+    assert len(row["melting_points"]) == 2
+    assert row["resolve_s"] == 0.5 and row["structure_s"] is None
+    assert row["error"] is None
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".arrow"])
+def test_pipeline_writes_columnar_dataset(tmp_path: Path, suffix: str):
+    pa = pytest.importorskip("pyarrow")
+
+    def resolve(smiles: str) -> Result:
+        return Result(input_smiles=smiles, cid=len(smiles), iupac_name=f"name-{smiles}",
+                      melting_points=[MeltingPoint(value="135 °C")])
+
+    path = tmp_path / f"out{suffix}"
+    with ColumnarWriter(path, row_group_size=2) as columnar:
+        BatchPipeline(str(tmp_path), resolver=resolve, rdkit_workers=0, dedup="smiles",
+                      columnar=columnar, log=lambda _msg: None).run(
+            [(1, "CCO"), (2, "xx"), (3, "OCC"), (4, "CCCN")], io.StringIO())
+
+    if suffix == ".parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        assert pq.ParquetFile(path).metadata.num_row_groups == 2
+    else:
+        table = pa.ipc.open_file(path).read_all()
+    rows = sorted(table.to_pylist(), key=lambda r: r["row"])
+    assert [r["row"] for r in rows] == [1, 2, 4]  # row 3 duplicates row 1
+    assert rows[1]["error"] == "Invalid SMILES"
+    assert rows[0]["melting_points"][0]["low_c"] == 135.0
@@ -0,0 +1,87 @@
+# tests/test_daemon.py
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from src import daemon, pubchem
+from src.models import Result
+
+
+def _fake_resolve(smiles, progress=None):
+    for stage in pubchem.RESOLVE_STAGES:
+        if progress:
+            progress(stage)
+    _fake_resolve.calls += 1
+    return Result(input_smiles=smiles, cid=702, iupac_name="ethanol")
+
+
+def test_worker_round_trip_and_fallback(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("CHEM_REPORTER_RUNTIME", str(tmp_path))
+    monkeypatch.setattr(pubchem, "resolve", _fake_resolve)
+    _fake_resolve.calls = 0
+
+    # No worker yet: the job runs in-process
+    assert not daemon.is_running()
+    assert daemon.resolve_via_worker("CCO").cid == 702
+    assert _fake_resolve.calls == 1
+
+    worker = daemon.WorkerDaemon()
+    thread = threading.Thread(target=worker.serve_forever, daemon=True)
+    thread.start()
+    for _ in range(200):
+        if daemon.is_running():
+            break
+        time.sleep(0.05)
+    try:
+        stages = []
+        result = daemon.resolve_via_worker("CCO", progress=stages.append)
+        assert (result.cid, tuple(stages)) == (702, pubchem.RESOLVE_STAGES)
+        # Same molecule, other spelling: answered from the worker's cache
+        assert daemon.resolve_via_worker("OCC").input_smiles == "OCC"
+        assert _fake_resolve.calls == 2
+
+        lines = []
+        assert daemon.run_batch_via_worker(["--no-such-flag"], log=lines.append) == 2
+        assert any("usage" in line for line in lines)
+
+        # A batch runs in the client's directory without moving the worker's
+        client = tmp_path / "client"
+        client.mkdir()
+        (client / "a.csv").write_text("row,input_smiles,output_dir\n1,CCO,\n", encoding="utf-8")
+        here, stdout, handlers = os.getcwd(), sys.stdout, list(logging.getLogger().handlers)
+        lines = []
+        code = daemon.request("batch", lambda _kind, line: lines.append(line), cwd=str(client),
+                              argv=["merge-summaries", "a.csv", "--out", "all.csv"])
+        assert code == 0 and any("Merged 1 rows" in line for line in lines)
+        assert (client / "all.csv").exists()
+        assert (os.getcwd(), sys.stdout, logging.getLogger().handlers) == (here, stdout, handlers)
+        assert daemon.request("ping")["requests"] >= 4
+    finally:
+        daemon.request("shutdown")
+        thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert not (tmp_path / daemon.INFO_FILENAME).exists()
+    with pytest.raises(daemon.WorkerUnavailable):
+        daemon.request("ping")
+
+
+def test_worker_cache_entries_expire(monkeypatch):
+    monkeypatch.setattr(pubchem, "resolve", _fake_resolve)
+    _fake_resolve.calls = 0
+    clock = [1000.0]
+    monkeypatch.setattr(daemon.time, "monotonic", lambda: clock[0])
+
+    worker = daemon.WorkerDaemon(cache_ttl=60.0)
+    emit = lambda *_event: None  # noqa: E731
+    worker._op_resolve({"smiles": "CCO"}, emit)
+    clock[0] += 59
+    worker._op_resolve({"smiles": "OCC"}, emit)
+    assert _fake_resolve.calls == 1
+    clock[0] += 2  # older than cache_ttl: looked up again
+    assert worker._op_resolve({"smiles": "CCO"}, emit).cid == 702
+    assert _fake_resolve.calls == 2
@@ -0,0 +1,81 @@
+# tests/test_depict.py
+import io
+from pathlib import Path
+
+import pytest
+
+from src.depict import DepictionStage, DrawOptions
+from src.models import Result
+from src.pipeline import BatchPipeline
+
+SMILES = ["CCO", "c1ccccc1", "CC(=O)Oc1ccccc1C(=O)O", "not_a_smiles"]
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_stage_writes_images_and_grids_then_caches(tmp_path: Path, workers: int):
+    options = DrawOptions(fmt="png", width=200, height=150)
+    stage = DepictionStage(tmp_path, options, workers=workers, per_page=2, run_tag="t")
+    for row, smiles in enumerate(SMILES, start=1):
+        stage.add(row, f"c{row}", smiles, legend=f"row {row}")
+    grids = stage.close()
+
+    out = tmp_path / "depictions"
+    assert sorted(p.name for p in out.glob("c*.png")) == ["c1.png", "c2.png", "c3.png"]
+    assert [Path(g).name for g in grids] == ["grid_t_01.png", "grid_t_02.png"]
+    assert (out / "c1.png").read_bytes().startswith(b"\x89PNG")
+    assert (stage.drawn, stage.cached) == (5, 0)
+
+    # Same compounds and options again: everything comes from the cache
+    again = DepictionStage(tmp_path, options, workers=workers, per_page=2, run_tag="u")
+    for row, smiles in enumerate(SMILES, start=1):
+        again.add(row, f"d{row}", smiles, legend=f"row {row}")
+    assert len(again.close()) == 2
+    assert (again.drawn, again.cached) == (0, 5)
+    assert (out / "d3.png").read_bytes() == (out / "c3.png").read_bytes()
+
+    # Other options are another cache entry
+    bigger = DepictionStage(tmp_path, DrawOptions(fmt="png", width=250, height=150), workers=0)
+    bigger.add(1, "e1", "OCC", legend="row 1")  # same canonical SMILES as CCO
+    bigger.close()
+    assert bigger.drawn == 2
+
+
+def test_pipeline_depiction_stage_svg(tmp_path: Path):
+    def resolve(smiles: str) -> Result:
+        return Result(input_smiles=smiles, cid=7, preferred_name=f"name {smiles}")
+
+    stage = DepictionStage(tmp_path, DrawOptions(fmt="svg"), workers=0)
+    pipeline = BatchPipeline(str(tmp_path), resolver=resolve, log=lambda _msg: None,
+                             rdkit_workers=0, depictions=stage)
+    pipeline.run(enumerate(SMILES, start=1), io.StringIO())
+    grids = stage.close()
+
+    images = sorted((tmp_path / "depictions").glob("*.svg"))
+    assert len(images) == 3 + len(grids) == 4
+    assert "<svg" in (tmp_path / "depictions" / "grid_01.svg").read_text(encoding="utf-8")
+
+
+def test_grid_pages_are_drawn_as_rows_complete(tmp_path: Path):
+    stage = DepictionStage(tmp_path, DrawOptions(fmt="svg"), workers=0, per_page=2)
+    out = tmp_path / "depictions"
+    stage.add(2, "c2", "c1ccccc1")
+    stage.add(3, "c3", "CCN")
+    stage.advance(1)  # row 1 may still come: no full page yet
+    assert not list(out.glob("grid_*"))
+    stage.add(1, "c1", "CCO")
+    stage.advance(3)
+    assert [p.name for p in out.glob("grid_*")] == ["grid_01.svg"]
+    assert stage._page == [("CCN", "")] and not stage._ahead  # only the partial page is kept
+    assert [Path(g).name for g in stage.close()] == ["grid_01.svg", "grid_02.svg"]
+
+
+def test_pipeline_streams_grid_pages(tmp_path: Path):
+    def resolve(smiles: str) -> Result:
+        return Result(input_smiles=smiles, cid=7, preferred_name=f"name {smiles}")
+
+    stage = DepictionStage(tmp_path, DrawOptions(fmt="svg"), workers=0, per_page=1)
+    BatchPipeline(str(tmp_path), resolver=resolve, log=lambda _msg: None,
+                  rdkit_workers=0, depictions=stage).run(enumerate(SMILES, start=1), io.StringIO())
+    # Every page was full before close()
+    assert len(list((tmp_path / "depictions").glob("grid_*.svg"))) == 3
+    assert len(stage.close()) == 3
@@ -0,0 +1,120 @@
+# tests/test_descriptors.py
+import csv
+import io
+import json
+from pathlib import Path
+
+import pyarrow.parquet as pq
+import pytest
+from rdkit import Chem
+
+from src import descriptors
+from src.columnar import ColumnarWriter
+from src.descriptors import (
+    DEFAULT_DESCRIPTORS, DESCRIPTORS, DescriptorEngine, add_descriptors, compute, parse_descriptor_names,
+)
+from src.models import Result
+from src.pipeline import BatchPipeline
+from src.store import ResultStore
+
+SMILES = ["CC(=O)Oc1ccccc1C(=O)O", "CN1C=NC2=C1C(=O)N(C(=O)N2C)C", "C[NH3+]", "not_a_smiles", "CCCCCC"]
+
+
+def _resolve(smiles: str) -> Result:
+    return Result(input_smiles=smiles, cid=len(smiles), iupac_name=f"name-{smiles}")
+
+
+def _expected(smiles: str) -> dict:
+    return compute(Chem.MolFromSmiles(smiles), DEFAULT_DESCRIPTORS)
+
+
+def test_parse_descriptor_names():
+    assert parse_descriptor_names("default") == DEFAULT_DESCRIPTORS
+    assert parse_descriptor_names("all") == DESCRIPTORS
+    assert parse_descriptor_names(" TPSA, mw,tpsa ") == ("tpsa", "mw")
+    with pytest.raises(ValueError, match="qed"):
+        parse_descriptor_names("mw,qed")
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_engine_yields_columns_in_input_order(workers: int):
+    engine = DescriptorEngine(DESCRIPTORS, workers=workers, chunk_size=2)
+    chunks = list(engine.chunks(enumerate(SMILES)))
+    assert [len(items) for items, _ in chunks] == [2, 2, 1]
+    assert chunks[0][1]["mw"] == [180.159, 194.194]
+
+    rows = list(engine.rows(enumerate(SMILES)))
+    assert [n for n, _ in rows] == list(range(len(SMILES)))
+    assert rows[3][1] == {name: None for name in DESCRIPTORS}
+    assert rows[0][1] == compute(Chem.MolFromSmiles(SMILES[0]), DESCRIPTORS)
+
+
+def test_pipeline_summary_metadata_and_columnar(tmp_path: Path, monkeypatch):
+    columnar = ColumnarWriter(tmp_path / "out.parquet", descriptors=DEFAULT_DESCRIPTORS)
+    pipeline = BatchPipeline(str(tmp_path), resolver=_resolve, rdkit_workers=0, columnar=columnar,
+                             dedup="smiles", descriptors=DEFAULT_DESCRIPTORS, log=lambda _msg: None)
+    summary = io.StringIO()
+    pipeline.run(enumerate(SMILES + [SMILES[0]], start=1), summary)
+    columnar.close()
+
+    rows = list(csv.DictReader(io.StringIO(summary.getvalue())))
+    assert list(rows[0])[-len(DEFAULT_DESCRIPTORS):] == list(DEFAULT_DESCRIPTORS)
+    for row in rows:
+        if row["error"]:
+            assert row["mw"] == ""
+            continue
+        # Computed in the 3D task, identical to parsing the SMILES
+        expected = _expected(row["input_smiles"])
+        assert {name: float(row[name]) for name in DEFAULT_DESCRIPTORS} == expected
+        meta = json.loads((Path(row["output_dir"]) / "metadata.json").read_text(encoding="utf-8"))
+        assert meta["descriptors"] == expected
+    assert rows[-1]["dup_group"] and rows[-1]["tpsa"] == rows[0]["tpsa"]
+
+    table = pq.read_table(tmp_path / "out.parquet", columns=["input_smiles", "tpsa"]).to_pylist()
+    assert {r["input_smiles"]: r["tpsa"] for r in table}["CCCCCC"] == 0.0
+
+    # Unchanged folders are skipped but still report their descriptors; missing
+    # ones are computed on the pool and added to metadata.json, once
+    for workers in (1, 0):
+        summary = io.StringIO()
+        rerun = BatchPipeline(str(tmp_path), resolver=_resolve, rdkit_workers=workers,
+                              descriptors=("mw", "fsp3"), log=lambda _msg: None)
+        assert rerun.run([(1, "CCCCCC")], summary)["unchanged"] == 1
+        [row] = csv.DictReader(io.StringIO(summary.getvalue()))
+        assert (row["mw"], row["fsp3"]) == ("86.178", "1.0")
+        meta = json.loads((Path(row["output_dir"]) / "metadata.json").read_text(encoding="utf-8"))
+        assert meta["descriptors"] == {**_expected("CCCCCC"), "fsp3": 1.0}
+        monkeypatch.setattr(descriptors, "add_to_metadata", None)  # the second run must not need it
+
+
+def test_descriptors_survive_failed_embedding(monkeypatch):
+    from src import pipeline as pipeline_module
+    from src.rdkit_utils import EmbedOptions
+
+    def no_embedding(*_args):
+        raise RuntimeError("Embedding failed")
+
+    monkeypatch.setattr(pipeline_module, "build_3d_mol", no_embedding)
+    sdf, _info, error, values, fingerprint = pipeline_module.build_structure(
+        "c1ccccc1O", EmbedOptions(), {}, DEFAULT_DESCRIPTORS, (2, 2048))
+    assert (sdf, error) == (None, "Embedding failed")
+    assert values == _expected("c1ccccc1O") and fingerprint[0] == "Oc1ccccc1"
+
+
+def test_store_and_backfill(tmp_path: Path):
+    store = ResultStore(tmp_path / "results.sqlite")
+    pipeline = BatchPipeline(str(tmp_path), resolver=_resolve, rdkit_workers=0, store=store,
+                             descriptors=("mw",), log=lambda _msg: None)
+    pipeline.run([(1, "CCO"), (2, "CCCN")], io.StringIO())
+    store.close()
+    folders = BatchPipeline(str(tmp_path), resolver=_resolve, rdkit_workers=0, log=lambda _msg: None)
+    folders.run([(1, "c1ccccc1")], io.StringIO())
+    assert "descriptors" not in json.loads((tmp_path / "name-c1ccccc1" / "metadata.json").read_text())
+
+    assert add_descriptors(tmp_path, ("mw", "rings"), workers=0) == 3
+    assert add_descriptors(tmp_path, ("mw", "rings"), workers=0) == 0  # nothing missing any more
+
+    meta = json.loads((tmp_path / "name-c1ccccc1" / "metadata.json").read_text())
+    assert meta["descriptors"] == {"mw": 78.114, "rings": 1}
+    with ResultStore(tmp_path / "results.sqlite") as store:
+        assert store.get("name-CCO")["descriptors"] == {"mw": 46.069, "rings": 0}
@@ -0,0 +1,101 @@
+# tests/test_fingerprints.py
+import csv
+import io
+import json
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src import fingerprints as fingerprints_module
+from src.fingerprints import FingerprintStore, morgan_words, rebuild, search
+from src.models import Result
+from src.pipeline import BatchPipeline
+
+
+def _tanimoto(a: str, b: str) -> float:
+    x, y = morgan_words(a), morgan_words(b)
+    common = int(np.bitwise_count(x & y).sum())
+    return common / (int(np.bitwise_count(x).sum()) + int(np.bitwise_count(y).sum()) - common)
+
+
+def test_search_ranks_by_tanimoto_with_threshold(tmp_path: Path):
+    library = ["CCO", "CCCO", "CCCCO", "c1ccccc1", "c1ccccc1O", "CC(=O)O"]
+    with FingerprintStore(tmp_path / "fingerprints") as fps:
+        for n, smiles in enumerate(library):
+            fps.add(f"c{n}", smiles, cid=n, mp_low_c=float(n), mp_high_c=float(n))
+
+    hits = search(tmp_path, "OCCC", top_k=3)
+    assert hits[0]["similarity"] == 1.0
+    assert hits[0]["smiles"] == "CCCO" and hits[0]["mp_low_c"] == 1.0
+    expected = sorted(library, key=lambda s: -_tanimoto("CCCO", s))[:3]
+    assert [h["smiles"] for h in hits] == expected
+    for h in hits:
+        assert h["similarity"] == pytest.approx(_tanimoto("CCCO", h["smiles"]), abs=1e-4)
+
+    assert all(h["similarity"] >= 0.5 for h in search(tmp_path, "CCCO", top_k=10, threshold=0.5))
+    with pytest.raises(ValueError):
+        search(tmp_path, "not_a_smiles")
+
+
+def test_readding_a_compound_replaces_its_record(tmp_path: Path):
+    with FingerprintStore(tmp_path / "fingerprints") as fps:
+        fps.add("old", "CCO", cid=1)
+        fps.add("x", "c1ccccc1", cid=2)
+    with FingerprintStore(tmp_path / "fingerprints") as fps:
+        assert fps.add("new", "OCC", cid=3) == 0
+        assert len(fps) == 2
+    hits = search(tmp_path, "CCO", top_k=1)
+    assert hits[0]["key"] == "new" and hits[0]["cid"] == 3
+
+
+def test_store_recovers_from_partial_row(tmp_path: Path):
+    directory = tmp_path / "fingerprints"
+    with FingerprintStore(directory) as fps:
+        fps.add("a", "CCO")
+        fps.add("b", "CCN")
+    with open(directory / "bits.u64", "ab") as f:
+        f.write(b"\0" * 100)  # crash in the middle of a row
+    with FingerprintStore(directory) as fps:
+        assert len(fps) == 2
+        fps.add("c", "CCC")
+    assert {h["key"] for h in search(tmp_path, "CCC", top_k=5)} == {"a", "b", "c"}
+
+
+def test_pipeline_stores_fingerprints_and_rebuild_matches(tmp_path: Path):
+    smiles = ["CCO", "not_a_smiles", "c1ccccc1", "OCC"]
+
+    def resolve(s: str) -> Result:
+        return Result(input_smiles=s, cid=len(s), iupac_name=f"name-{s}")
+
+    with FingerprintStore(tmp_path / "fingerprints") as fps:
+        pipeline = BatchPipeline(str(tmp_path), resolver=resolve, log=lambda _msg: None,
+                                 rdkit_workers=0, dedup="smiles", fingerprints=fps)
+        fh = io.StringIO()
+        pipeline.run(enumerate(smiles, start=1), fh)
+        assert len(fps) == 2  # invalid row skipped, duplicate stored once
+    rows = list(csv.DictReader(io.StringIO(fh.getvalue())))
+    hit = search(tmp_path, "c1ccccc1", top_k=1)[0]
+    assert hit["key"] == Path(rows[2]["output_dir"]).name and hit["similarity"] == 1.0
+
+    assert rebuild(tmp_path) == 2
+    records = (tmp_path / "fingerprints" / "records.jsonl").read_text(encoding="utf-8").splitlines()
+    assert sorted(json.loads(r)["smiles"] for r in records) == ["CCO", "c1ccccc1"]
+
+
+def test_pipeline_fingerprints_are_computed_off_the_writer_thread(tmp_path: Path, monkeypatch):
+    threads = []
+    original = fingerprints_module.morgan_words
+
+    def recording(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(fingerprints_module, "morgan_words", recording)
+    with FingerprintStore(tmp_path / "fingerprints") as fps:
+        BatchPipeline(str(tmp_path), resolver=lambda s: Result(input_smiles=s, cid=1), log=lambda _msg: None,
+                      rdkit_workers=0, fingerprints=fps).run(enumerate(["CCO", "c1ccccc1"], start=1),
+                                                              io.StringIO())
+    assert len(threads) == 2 and "writer" not in threads
+    assert search(tmp_path, "OCC", top_k=1)[0]["similarity"] == 1.0
@@ -0,0 +1,30 @@
+# tests/test_imports.py
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+HEAVY = ("rdkit", "numpy", "requests", "dotenv")
+
+
+@pytest.mark.parametrize("module", [
+    "src.app_gui", "src.launcher_gui", "src.daemon", "src.io_utils", "src.writer",
+    "src.pubchem", "src.config", "src.catalog", "src.store", "src.sharding", "src.service",
+])
+def test_entry_points_import_without_heavy_dependencies(module):
+    code = (f"import json, sys; import {module}; "
+            f"print(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    assert json.loads(out) == []
+
+
+def test_config_settings_resolve_on_first_use():
+    from src import config
+    assert config.TIMEOUT_SECONDS == config.settings.http_timeout
+    assert config.USER_AGENT == config.settings.user_agent
+    with pytest.raises(AttributeError):
+        config.NOT_A_SETTING
@@ -0,0 +1,87 @@
+# tests/test_io_utils.py
+import gzip
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from src.io_utils import SmilesCsvReader, unchanged_outputs, wait_for_3d, write_outputs
+from src.models import MeltingPoint, Result
+from src.rdkit_utils import EmbedOptions
+
+ASPIRIN = "CC(=O)OC1=CC=CC=C1C(=O)O"
+
+
+def _aspirin() -> Result:
+    return Result(
+        input_smiles=ASPIRIN,
+        cid=2244,
+        iupac_name="2-acetyloxybenzoic acid",
+        preferred_name="Aspirin",
+        melting_points=[MeltingPoint(value="135 °C", unit="°C", source="PubChem")],
+    )
+
+
+def _z_coords(sdf: Path) -> list:
+    lines = sdf.read_text(encoding="utf-8").splitlines()
+    n_atoms = int(lines[3][:3])
+    return [float(line[20:30]) for line in lines[4:4 + n_atoms]]
+
+
+def test_write_outputs_tiered(tmp_path: Path):
+    out = Path(write_outputs(_aspirin(), base_dir=str(tmp_path), tiered=True))
+    assert (out / "structure.sdf").exists()
+    meta = json.loads((out / "metadata.json").read_text(encoding="utf-8"))
+    assert meta["structure_3d"] in ("pending", "done")
+
+    assert wait_for_3d(str(out), timeout=60)
+    meta = json.loads((out / "metadata.json").read_text(encoding="utf-8"))
+    assert meta["structure_3d"] == "done"
+    assert any(abs(z) > 1e-3 for z in _z_coords(out / "structure.sdf"))
+
+
+
+def test_write_outputs_skips_unchanged(tmp_path: Path):
+    embed = EmbedOptions(num_confs=1)
+    out = Path(write_outputs(_aspirin(), base_dir=str(tmp_path), embed=embed))
+    for f in out.iterdir():
+        os.utime(f, ns=(0, 0))  # any rewrite would bump the mtime
+
+    assert unchanged_outputs(_aspirin(), str(tmp_path), embed) is not None
+    write_outputs(_aspirin(), base_dir=str(tmp_path), embed=embed)
+    assert all(f.stat().st_mtime_ns == 0 for f in out.iterdir())
+
+    # Different embedding parameters: regenerated, but identical text files stay untouched
+    write_outputs(_aspirin(), base_dir=str(tmp_path), embed=EmbedOptions(num_confs=2))
+    assert (out / "metadata.json").stat().st_mtime_ns > 0
+    assert (out / "IUPAC.txt").stat().st_mtime_ns == 0
+    assert (out / "melting_point.csv").stat().st_mtime_ns == 0
+    assert unchanged_outputs(_aspirin(), str(tmp_path), embed) is None
+
+@pytest.mark.parametrize("buffer_size", [0, 2])
+def test_smiles_csv_reader_streams_gzip(tmp_path: Path, buffer_size: int):
+    path = tmp_path / "input.csv.gz"
+    with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+        f.write("name,SMILES\n")
+        for i in range(10):
+            f.write(f"m{i},{'C' * (i + 1)}\n")
+
+    with SmilesCsvReader(path, buffer_size=buffer_size) as reader:
+        assert reader.column == "SMILES"
+        rows = list(reader)
+    assert [i for i, _, _ in rows] == list(range(1, 11))
+    assert rows[2][1] == "CCC"
+    assert rows[2][2]["name"] == "m2"
+
+
+def test_smiles_csv_reader_rejects_empty_and_missing_column(tmp_path: Path):
+    empty = tmp_path / "empty.csv"
+    empty.write_text("", encoding="utf-8")
+    with pytest.raises(ValueError):
+        SmilesCsvReader(empty).__enter__()
+
+    no_col = tmp_path / "no_col.csv"
+    no_col.write_text("name,formula\nwater,H2O\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        SmilesCsvReader(no_col).__enter__()
@@ -16,3 +16,25 @@ def test_caffeine_offline_mp():
     data = _j("caffeine_pugview.json")
     values = _extract_melting_point(data)
     assert any("235" in str(v) for v in values)
+
+def test_resolve_reports_stages_and_can_abort(monkeypatch):
+    import pytest
+    from src import pubchem
+    monkeypatch.setattr(pubchem, "_fetch_cid_from_smiles", lambda s: 2244)
+    monkeypatch.setattr(pubchem, "_fetch_iupac_from_cid", lambda cid: "2-acetyloxybenzoic acid")
+    monkeypatch.setattr(pubchem, "_fetch_title_from_cid", lambda cid: "Aspirin")
+    monkeypatch.setattr(pubchem, "_fetch_view_json", lambda cid: _j("aspirin_pugview.json"))
+
+    seen = []
+    result = pubchem.resolve("CC(=O)OC1=CC=CC=C1C(=O)O", progress=seen.append)
+    assert tuple(seen) == pubchem.RESOLVE_STAGES
+    assert result.cid == 2244
+
+    def stop_at_title(stage):
+        if stage == "title":
+            raise KeyboardInterrupt
+    calls = []
+    monkeypatch.setattr(pubchem, "_fetch_title_from_cid", lambda cid: calls.append(cid))
+    with pytest.raises(KeyboardInterrupt):
+        pubchem.resolve("CC(=O)OC1=CC=CC=C1C(=O)O", progress=stop_at_title)
+    assert calls == []
@@ -0,0 +1,158 @@
+# tests/test_pipeline.py
+import csv
+import io
+import random
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import pytest
+
+from src import depict, pipeline as pipeline_module, substructure
+from src.depict import DepictionStage, DrawOptions
+from src.models import Result
+from src.pipeline import BatchPipeline
+from src.substructure import SubstructureFilter
+from src.rdkit_utils import EmbedCostModel, EmbedOptions
+
+SMILES = ["CCO", "", "not_a_smiles", "c1ccccc1", "CC(=O)O", "CCN", "CCCC", "OCCO"]
+
+
+def _fake_resolve(smiles: str) -> Result:
+    time.sleep(random.uniform(0, 0.02))  # finish out of order
+    return Result(input_smiles=smiles, cid=len(smiles), iupac_name=f"name-{smiles}")
+
+
+def _run(tmp_path: Path, **kwargs) -> list:
+    pipeline = BatchPipeline(str(tmp_path), resolver=_fake_resolve, log=lambda _msg: None, **kwargs)
+    fh = io.StringIO()
+    stats = pipeline.run(enumerate(SMILES, start=1), fh)
+    assert stats["rows"] == len(SMILES)
+    return list(csv.DictReader(io.StringIO(fh.getvalue())))
+
+
+@pytest.mark.parametrize("rdkit_workers", [0, 2])
+def test_pipeline_summary_in_input_order(tmp_path: Path, rdkit_workers: int):
+    rows = _run(tmp_path, rdkit_workers=rdkit_workers, lookup_workers=4, max_in_flight=3)
+    assert [r["input_smiles"] for r in rows] == SMILES
+    assert [int(r["row"]) for r in rows] == list(range(1, len(SMILES) + 1))
+    assert rows[1]["error"] == "Empty SMILES cell"
+    assert rows[2]["error"] == "Invalid SMILES"
+    ok = [r for r in rows if not r["error"]]
+    assert len(ok) == 6
+    for r in ok:
+        assert (Path(r["output_dir"]) / "structure.sdf").exists()
+        assert r["num_confs"] == "1"
+
+
+def test_pipeline_dedup_fans_out_results(tmp_path: Path):
+    calls = []
+
+    def resolve(smiles: str) -> Result:
+        calls.append(smiles)
+        return _fake_resolve(smiles)
+
+    smiles = ["CC(=O)O", "OC(C)=O", "CCO", "[Na+].CC(=O)[O-]", "CC(=O)[O-].[Na+]", "CC(O)=O"]
+    pipeline = BatchPipeline(str(tmp_path), resolver=resolve, log=lambda _msg: None,
+                             rdkit_workers=0, dedup="smiles")
+    fh = io.StringIO()
+    stats = pipeline.run(enumerate(smiles, start=1), fh)
+    rows = list(csv.DictReader(io.StringIO(fh.getvalue())))
+
+    assert len(calls) == 3
+    assert stats["deduplicated"] == 3
+    groups = [r["dup_group"] for r in rows]
+    assert groups[0] == groups[1] == groups[5]
+    assert groups[3] == groups[4] != groups[0]
+    assert rows[1]["output_dir"] == rows[0]["output_dir"] != ""
+
+
+def test_finished_groups_are_dropped_and_spilled(tmp_path: Path):
+    smiles = ["CCO", "CCN", "CCC", "OCC", "NCC", "CCCC", "C(C)C", "CCO"]
+    pipeline = BatchPipeline(str(tmp_path), resolver=_fake_resolve, log=lambda _msg: None,
+                             rdkit_workers=0, dedup="smiles", dedup_cache=1, max_in_flight=1)
+    seen = []
+    real_put = pipeline._finished_groups.put
+    pipeline._finished_groups.put = lambda *args: (real_put(*args), seen.append(len(pipeline._groups)))
+    fh = io.StringIO()
+    assert pipeline.run(enumerate(smiles, start=1), fh)["deduplicated"] == 4
+    rows = list(csv.DictReader(io.StringIO(fh.getvalue())))
+
+    # Outcomes evicted from memory (capacity 1) still reach later duplicates
+    by_smiles = {r["input_smiles"]: r for r in rows}
+    for dup, first in [("OCC", "CCO"), ("NCC", "CCN"), ("C(C)C", "CCC")]:
+        assert by_smiles[dup]["dup_group"] == by_smiles[first]["dup_group"]
+        assert by_smiles[dup]["output_dir"] == by_smiles[first]["output_dir"] != ""
+    assert rows[-1]["dup_group"] == rows[0]["dup_group"]
+    assert len({r["dup_group"] for r in rows}) == 4
+    assert seen == [0, 0, 0, 0]  # no in-flight group is kept once written
+
+
+def test_cost_model_learns_adaptive_conformer_counts(tmp_path: Path):
+    class Recording(EmbedCostModel):
+        def __init__(self) -> None:
+            super().__init__()
+            self.seen = []
+
+        def observe(self, features, num_confs, seconds):
+            self.seen.append((num_confs, seconds))
+            super().observe(features, num_confs, seconds)
+
+    embed = EmbedOptions(adaptive=True)
+    model = Recording()
+    pipeline = BatchPipeline(str(tmp_path), resolver=_fake_resolve, rdkit_workers=0, embed=embed,
+                             cost_model=model, log=lambda _msg: None)
+    octanol = "CCCCCCCCO"
+    pipeline.run(((n, octanol) for n in range(1, 9)), io.StringIO())
+
+    features, confs = model.describe(octanol, embed)
+    assert confs > 1
+    assert [n for n, _ in model.seen] == [confs] * 8
+    measured = sum(s for _, s in model.seen) / len(model.seen)
+    assert model.predict(features, confs) == pytest.approx(measured, rel=0.5)
+
+
+def test_stages_share_one_process_pool(tmp_path: Path, monkeypatch):
+    def no_own_pool(*_args, **_kwargs):
+        raise AssertionError("a stage started its own process pool")
+
+    pool = ProcessPoolExecutor(2)
+    for module in (pipeline_module, depict, substructure):
+        monkeypatch.setattr(module, "ProcessPoolExecutor", no_own_pool)
+    try:
+        motif = SubstructureFilter("[OX2H]", workers=2, pool=pool)
+        stage = DepictionStage(tmp_path, DrawOptions(fmt="svg"), workers=2, pool=pool)
+        pipeline = BatchPipeline(str(tmp_path), resolver=_fake_resolve, log=lambda _msg: None,
+                                 rdkit_workers=2, pool=pool, depictions=stage)
+        fh = io.StringIO()
+        pipeline.run(motif.filter(enumerate(SMILES, start=1)), fh)
+        stage.close()
+        rows = list(csv.DictReader(io.StringIO(fh.getvalue())))
+        assert [r["input_smiles"] for r in rows] == ["CCO", "CC(=O)O", "OCCO"]
+        assert all(r["num_confs"] for r in rows)
+        assert len(list((tmp_path / "depictions").glob("*.svg"))) == 3 + 1
+        assert pool.submit(sum, [1, 2]).result() == 3  # still running: the caller owns it
+    finally:
+        pool.shutdown()
+
+
+def test_broken_pool_fails_rows_instead_of_hanging(tmp_path: Path):
+    class BrokenPool(Executor):
+        def submit(self, fn, *args, **kwargs):
+            raise BrokenProcessPool("a worker was killed")
+
+    pipeline = BatchPipeline(str(tmp_path), resolver=_fake_resolve, log=lambda _msg: None,
+                             rdkit_workers=2, pool=BrokenPool(), max_in_flight=2)
+    fh = io.StringIO()
+    done = {}
+    runner = threading.Thread(target=lambda: done.update(pipeline.run(enumerate(SMILES, start=1), fh)),
+                              daemon=True)
+    runner.start()
+    runner.join(timeout=60)
+    assert not runner.is_alive(), "the batch hung"
+    assert (done["rows"], done["ok"]) == (len(SMILES), 0)
+    rows = list(csv.DictReader(io.StringIO(fh.getvalue())))
+    assert rows[0]["error"] == "a worker was killed"
+    assert not (tmp_path / "name-CCO").exists()
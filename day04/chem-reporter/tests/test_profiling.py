@@ -0,0 +1,61 @@
+# tests/test_profiling.py
+import threading
+import time
+
+from src.profiling import profiled, stage, stage_of
+
+
+def _spin(seconds: float) -> int:
+    n, end = 0, time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        n += 1
+    return n
+
+
+def test_stage_of_follows_pipeline_thread_names():
+    assert stage_of("lookup-3") == "resolve"
+    assert stage_of("rdkit-dispatch") == "structure"
+    assert stage_of("output-writer") == "write"
+    assert stage_of("MainThread") == "input"
+    assert stage_of("something-else") == "other"
+
+
+def test_sampling_profile_writes_folded_stacks_and_stage_report(tmp_path, capsys):
+    out = tmp_path / "prof"
+    with profiled(out, "sampling", top=5, interval=0.002):
+        t = threading.Thread(target=_spin, args=(0.2,), name="lookup-0")
+        t.start()
+        with stage("write"):
+            _spin(0.1)
+        t.join()
+
+    folded = (out.parent / "prof.folded").read_text(encoding="utf-8").splitlines()
+    assert folded
+    stages = {line.split(";", 1)[0] for line in folded}
+    assert {"resolve", "write"} <= stages
+    # flamegraph.pl format: frames joined by ';', then a space and the count
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in folded)
+    assert any("_spin (tests/test_profiling.py" in line for line in folded)
+
+    report = (out.parent / "prof.txt").read_text(encoding="utf-8")
+    assert "[resolve]" in report and "[write]" in report
+    assert "Hot-function report" in capsys.readouterr().out
+
+
+def test_cprofile_mode_splits_stats_by_stage(tmp_path):
+    import pstats
+
+    out = tmp_path / "prof"
+    with profiled(out, "cprofile", top=5):
+        with stage("structure"):
+            _spin(0.02)
+        t = threading.Thread(target=_spin, args=(0.02,), name="writer")
+        t.start()
+        t.join()
+
+    stats = pstats.Stats(str(out.parent / "prof.pstats"))
+    assert any(func == "_spin" for _, _, func in stats.stats)
+    report = (out.parent / "prof.txt").read_text(encoding="utf-8")
+    structure = report.split("[structure]", 1)[1].split("\n\n", 1)[0]
+    write = report.split("[write]", 1)[1].split("\n\n", 1)[0]
+    assert "_spin" in structure and "_spin" in write
@@ -1,6 +1,24 @@
 # tests/test_rdkit_utils.py
+import time
 from pathlib import Path
-from src.rdkit_utils import validate_smiles, smiles_to_sdf
+
+import pytest
+
+from rdkit import Chem
+from rdkit.Chem import AllChem
+
+from src.rdkit_utils import (
+    ConformerBudget,
+    EmbedCostModel,
+    EmbeddingTimeout,
+    choose_conformer_budget,
+    embed_info,
+    sdf_block,
+    smiles_to_2d_mol,
+    smiles_to_mol,
+    smiles_to_sdf,
+    validate_smiles,
+)
 
 ASPIRIN = "CC(=O)OC1=CC=CC=C1C(=O)O"
 
@@ -16,3 +34,77 @@ def test_smiles_to_sdf_tmp(tmp_path: Path):
     # basic sanity: SDF should contain a property block
     txt = p.read_text(encoding="utf-8", errors="ignore")
     assert ">  <source>" in txt
+
+def test_smiles_to_2d_mol_is_flat():
+    mol = smiles_to_2d_mol(ASPIRIN)
+    conf = mol.GetConformer()
+    assert not conf.Is3D()
+    assert mol.GetNumAtoms() == 13  # no explicit hydrogens in the 2D tier
+
+def test_smiles_to_mol_within_budget():
+    mol = smiles_to_mol(ASPIRIN, num_confs=2, time_budget=30)
+    info = embed_info(mol)
+    assert info["strategy"] == "etkdg"
+    assert info["optimized"] == "full"
+    assert 1 <= info["num_confs"] <= 2
+
+def test_smiles_to_mol_budget_exhausted():
+    with pytest.raises(EmbeddingTimeout) as exc:
+        smiles_to_mol(ASPIRIN, time_budget=1e-9)
+    assert exc.value.elapsed >= 0
+
+PEPTIDE = ("CC(C)C[C@H](NC(=O)[C@@H](CC1=CC=CC=C1)NC(=O)[C@H](CCCCN)NC(=O)[C@@H](CO)"
+           "NC(=O)[C@H](CC(C)C)NC(=O)CN)C(=O)N[C@@H](CCC(N)=O)C(=O)O")
+
+@pytest.mark.parametrize("budget", [0.3, 2.0])
+def test_smiles_to_mol_budget_overrun_is_bounded(budget: float):
+    start = time.perf_counter()
+    try:
+        mol = smiles_to_mol(PEPTIDE, num_confs=30, time_budget=budget)
+        assert mol.GetNumConformers() >= 1  # never a "success" without coordinates
+    except EmbeddingTimeout:
+        pass
+    # Soft budget: RDKit's embedding timeout is whole seconds, force-field steps are short
+    assert time.perf_counter() - start < budget + 1.5
+
+def test_lowest_energy_conformer_is_written():
+    mol = smiles_to_mol("CCCCCCCCO", adaptive=True)
+    info = embed_info(mol)
+    assert info["num_confs"] > 1
+    props = AllChem.MMFFGetMoleculeProperties(mol, mmffVariant="MMFF94s")
+    energies = [AllChem.MMFFGetMoleculeForceField(mol, props, confId=c.GetId()).CalcEnergy()
+                for c in mol.GetConformers()]
+    assert energies == sorted(energies)
+    assert info["forcefield"] == "MMFF94s"
+    assert info["energy"] == pytest.approx(energies[0], abs=1e-3)
+
+    written = Chem.MolFromMolBlock(sdf_block(mol), removeHs=False)
+    assert (written.GetConformer().GetPositions()
+            == pytest.approx(mol.GetConformer(0).GetPositions(), abs=1e-3))
+
+def test_choose_conformer_budget_scales_with_flexibility():
+    rigid, _ = choose_conformer_budget(Chem.MolFromSmiles("OC(=O)c1ccccc1"))
+    floppy, rms = choose_conformer_budget(Chem.MolFromSmiles("C" * 24 + "O"))
+    assert rigid == 1
+    assert floppy > rigid
+    assert rms > 0.1
+
+def test_conformer_budget_exhausted_gives_single_conformer():
+    budget = ConformerBudget(total_seconds=1.0)
+    budget.charge(2.0, num_confs=4)
+    options = budget.plan("C" * 24 + "O")
+    assert options.num_confs == 1
+    assert options.adaptive is False
+
+def test_cost_model_ranks_and_learns_from_observations():
+    model = EmbedCostModel()
+    small = model.describe("CCO")
+    large = model.describe("C1CCCCCCCCCCCCCCCCCCCC1CCCCCCCCCC(=O)O")
+    assert model.describe("not a smiles") is None
+    assert model.predict(*large) > model.predict(*small)
+
+    # Real costs 10x the prior: predictions move towards them
+    target = 10 * model.predict(*large)
+    for _ in range(16):
+        model.observe(large[0], large[1], target)
+    assert model.predict(*large) == pytest.approx(target, rel=0.2)
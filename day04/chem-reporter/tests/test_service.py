@@ -0,0 +1,174 @@
+# tests/test_service.py
+import json
+import threading
+import urllib.request
+from pathlib import Path
+from urllib.parse import unquote
+
+import pytest
+
+from src import pubchem
+from src.http_cache import OfflineMiss
+from src.service import ResolveService, serve
+
+DATA = Path(__file__).parent / "data"
+CIDS = {"CC(=O)OC1=CC=CC=C1C(=O)O": 2244, "CCO": 702, "CCN": 6341, "CCC": 6334, "CCCl": 6337}
+
+
+@pytest.fixture
+def fake_pubchem(monkeypatch):
+    view = json.loads((DATA / "aspirin_pugview.json").read_text(encoding="utf-8"))
+    calls = {"properties": 0}
+
+    def properties(cids):
+        calls["properties"] += 1
+        return {c: {"iupac_name": f"iupac-{c}", "title": f"title-{c}"} for c in cids}
+
+    monkeypatch.setattr(pubchem, "_fetch_cid_from_smiles", lambda s: CIDS.get(s))
+    monkeypatch.setattr(pubchem, "_fetch_view_json", lambda cid: view)
+    monkeypatch.setattr(pubchem, "_fetch_properties", properties)
+    return calls
+
+
+def test_resolve_many_batches_property_requests(fake_pubchem):
+    out = pubchem.resolve_many(["CCO", "CCN", "CCO", "CCBr"])
+    assert [r.cid for r in out[:3]] == [702, 6341, 702]
+    assert out[1].preferred_name == "title-6341" and out[1].melting_points
+    assert isinstance(out[3], ValueError)  # no CID
+    assert fake_pubchem["properties"] == 1
+
+
+def test_service_coalesces_concurrent_requests_and_streams(fake_pubchem):
+    service = ResolveService(window=0.2)
+    server = serve("127.0.0.1", 0, service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    try:
+        answers = {}
+
+        def get(smiles):
+            with urllib.request.urlopen(f"{base}/resolve?smiles={smiles}") as r:
+                answers[smiles] = json.load(r)
+
+        threads = [threading.Thread(target=get, args=(s,)) for s in ("CCO", "CCN", "CCC", "CCCl")]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert {s: a["cid"] for s, a in answers.items()} == {s: CIDS[s] for s in answers}
+        assert fake_pubchem["properties"] == 1  # one micro-batch, one multi-CID request
+
+        body = "\n".join(["OCC", "not((", "CCBr", "CC(=O)OC1=CC=CC=C1C(=O)O"]).encode()
+        req = urllib.request.Request(f"{base}/resolve", data=body,
+                                     headers={"Content-Type": "application/x-ndjson"})
+        with urllib.request.urlopen(req) as r:
+            assert r.headers["Content-Type"].startswith("application/x-ndjson")
+            lines = [json.loads(line) for line in r]
+        assert [line["index"] for line in lines] == [0, 1, 2, 3]
+        assert lines[0]["cid"] == 702 and lines[0]["input_smiles"] == "OCC"  # cached by canonical SMILES
+        assert "error" in lines[1] and "error" in lines[2]
+        assert lines[3]["cid"] == 2244
+
+        with urllib.request.urlopen(f"{base}/health") as r:
+            health = json.load(r)
+        assert health["cache_hits"] >= 1 and health["batches"] <= 3
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+
+
+def test_offline_cache_answers_without_network(tmp_path, monkeypatch):
+    monkeypatch.setattr(pubchem, "_CACHE", pubchem._CACHE)  # restored afterwards
+    cache = pubchem.configure_cache(str(tmp_path), offline=True)
+    url = f"{pubchem._pug_base()}/compound/smiles/CCO/cids/JSON"
+    cache.put(url, None, {"IdentifierList": {"CID": [702]}})
+
+    assert pubchem._fetch_cid_from_smiles("CCO") == 702
+    with pytest.raises(OfflineMiss):
+        pubchem._fetch_cid_from_smiles("CCN")
+    assert cache.stats()["hits"] == 1
+
+
+class _FakeSession:
+    """Answers PubChem URLs like requests.Session.get; optionally fails multi-CID property requests."""
+
+    def __init__(self, fail_batches: bool = False) -> None:
+        self.view = json.loads((DATA / "aspirin_pugview.json").read_text(encoding="utf-8"))
+        self.fail_batches = fail_batches
+        self.urls = []
+
+    def get(self, url, params=None, timeout=None):
+        import requests
+
+        self.urls.append(url)
+        parts = url.split("/")
+        if "/smiles/" in url:
+            body = {"IdentifierList": {"CID": [CIDS[unquote(parts[-3])]]}}
+        elif "/property/" in url:
+            if self.fail_batches and "," in parts[-4]:
+                raise requests.ConnectionError("batch refused")
+            props = parts[-2].split(",")
+            body = {"PropertyTable": {"Properties": [
+                {"CID": int(c), **{p: f"{p}-{c}" for p in props}} for c in parts[-4].split(",")
+            ]}}
+        else:
+            body = self.view
+
+        class Response:
+            def raise_for_status(self):
+                pass
+
+            def json(self):
+                return body
+
+        return Response()
+
+
+@pytest.fixture
+def network(monkeypatch):
+    monkeypatch.setattr(pubchem, "_CACHE", pubchem._CACHE)  # restored afterwards
+    session = _FakeSession()
+    monkeypatch.setattr(pubchem, "_session", lambda: session)
+    monkeypatch.setattr(pubchem.time, "sleep", lambda _s: None)  # no retry backoff
+    return session
+
+
+def test_service_answers_offline_from_a_cache_filled_by_resolve(tmp_path, network):
+    pubchem.configure_cache(str(tmp_path))
+    for smiles in ("CCO", "CCN"):
+        pubchem.resolve(smiles)
+    pubchem.configure_cache(str(tmp_path), offline=True)
+    network.urls.clear()
+
+    service = ResolveService(window=0.05)
+    server = serve("127.0.0.1", 0, service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        body = "\n".join(["CCO", "CCN", "CCC"]).encode()
+        req = urllib.request.Request(f"http://127.0.0.1:{server.server_port}/resolve", data=body,
+                                     headers={"Content-Type": "application/x-ndjson"})
+        with urllib.request.urlopen(req) as r:
+            lines = [json.loads(line) for line in r]
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+    assert [line.get("cid") for line in lines[:2]] == [702, 6341]
+    assert lines[0]["iupac_name"] == "IUPACName-702" and lines[1]["preferred_name"] == "Title-6341"
+    assert "Not in the offline cache" in lines[2]["error"]  # never resolved online
+    assert network.urls == []
+
+
+def test_failed_batch_falls_back_per_cid_and_caches_per_cid(tmp_path, network):
+    pubchem.configure_cache(str(tmp_path))
+    network.fail_batches = True
+    out = pubchem.resolve_many(["CCO", "CCN"])
+    assert [r.preferred_name for r in out] == ["Title-702", "Title-6341"]
+    assert sum("/6341/property/IUPACName/" in u for u in network.urls) == 1
+
+    network.fail_batches = False
+    pubchem.resolve_many(["CCC", "CCCl"])  # batched; cached per CID as well
+    pubchem.configure_cache(str(tmp_path), offline=True)
+    assert pubchem.resolve("CCCl").iupac_name == "IUPACName-6337"
+    assert pubchem.resolve_many(["CCC", "CCO"])[0].preferred_name == "Title-6334"
@@ -0,0 +1,129 @@
+# tests/test_sharding.py
+import csv
+from pathlib import Path
+
+import pytest
+
+from src.catalog import catalog_filename, catalog_for
+from src.fingerprints import FingerprintStore, search
+from src.models import Result
+from src.pipeline import BatchPipeline
+from src.sharding import merge_summaries, parse_shard, shard_of, shard_tag
+from src.store import ResultStore, store_filename
+from src.substructure import SubstructureFilter
+
+
+def test_parse_shard():
+    assert parse_shard("1/4") == (0, 4)
+    assert parse_shard("4/4") == (3, 4)
+    for bad in ("0/4", "5/4", "x", "1/0"):
+        with pytest.raises(ValueError):
+            parse_shard(bad)
+
+
+def test_shard_is_stable_and_spelling_independent():
+    # Same molecule written two ways -> same shard, for any shard count
+    for n in (2, 3, 8):
+        assert shard_of("OCC", n) == shard_of("CCO", n)
+        assert shard_of("c1ccccc1", n) == shard_of("C1=CC=CC=C1", n)
+    assert 0 <= shard_of("not a smiles", 5) < 5
+
+
+def test_shard_follows_inchikey_dedup():
+    # Tautomers share a standard InChIKey but not a canonical SMILES
+    pyridinol, pyridone = "Oc1ccccn1", "O=c1cccc[nH]1"
+    assert any(shard_of(pyridinol, n) != shard_of(pyridone, n) for n in range(2, 9))
+    for n in range(2, 9):
+        assert shard_of(pyridinol, n, "inchikey") == shard_of(pyridone, n, "inchikey")
+
+
+def _write(path: Path, rows):
+    with path.open("w", newline="", encoding="utf-8") as fh:
+        w = csv.DictWriter(fh, fieldnames=["row", "input_smiles", "output_dir"])
+        w.writeheader()
+        w.writerows(rows)
+
+
+def test_merge_restores_input_order_and_gathers_outputs(tmp_path: Path):
+    a_dir = tmp_path / "shard1" / "ethanol"
+    a_dir.mkdir(parents=True)
+    (a_dir / "metadata.json").write_text("{}", encoding="utf-8")
+    _write(tmp_path / "a.csv", [
+        {"row": 1, "input_smiles": "CCO", "output_dir": str(a_dir)},
+        {"row": 4, "input_smiles": "OCC", "output_dir": str(a_dir)},
+    ])
+    _write(tmp_path / "b.csv", [
+        {"row": 2, "input_smiles": "CCN", "output_dir": ""},
+        {"row": 5, "input_smiles": "CCC", "output_dir": ""},
+    ])
+
+    merged_dir = tmp_path / "merged"
+    stats = merge_summaries([tmp_path / "a.csv", tmp_path / "b.csv"], tmp_path / "all.csv", merged_dir)
+
+    with (tmp_path / "all.csv").open(newline="", encoding="utf-8") as fh:
+        rows = list(csv.DictReader(fh))
+    assert [r["row"] for r in rows] == ["1", "2", "4", "5"]
+    assert stats == {"rows": 4, "duplicates": 0, "missing": 1, "catalogs": 0, "stores": 0, "fingerprints": 0}  # row 3 absent
+    assert (merged_dir / "ethanol" / "metadata.json").exists()
+    assert rows[0]["output_dir"] == str((merged_dir / "ethanol").resolve())
+
+
+def test_shards_write_their_own_databases_and_merge_folds_them(tmp_path: Path):
+    def resolve(smiles: str) -> Result:
+        return Result(input_smiles=smiles, cid=len(smiles), preferred_name=f"name-{smiles}")
+
+    run = tmp_path / "run"
+    run.mkdir()
+    summaries = []
+    for i, rows in enumerate([[(1, "CCO"), (3, "CCCO")], [(2, "CCCCO")]]):
+        tag = shard_tag(i, 2)
+        store = ResultStore(run / store_filename(tag)) if i == 1 else None
+        pipeline = BatchPipeline(str(run), resolver=resolve, rdkit_workers=0, store=store,
+                                 catalog=catalog_filename(tag), log=lambda _msg: None)
+        summaries.append(run / f"batch_summary_20260101_000000_{tag}.csv")
+        with summaries[-1].open("w", newline="", encoding="utf-8") as fh:
+            pipeline.run(rows, fh)
+        if store is not None:
+            store.close()
+    assert sorted(p.name for p in run.glob("*.sqlite")) == ["catalog_shard1of2.sqlite", "results_shard2of2.sqlite"]
+
+    stats = merge_summaries(summaries, run / "all.csv")
+    assert (stats["rows"], stats["catalogs"], stats["stores"]) == (3, 1, 1)
+    catalog = catalog_for(run)
+    assert [e["folder"] for e in catalog.query(cid=4)] == ["name-CCCO"]
+    assert len(catalog) == 2
+    with ResultStore(run / "results.sqlite") as store:
+        assert store.keys() == ["name-CCCCO"]
+        assert store.get(5)["preferred_name"] == "name-CCCCO"
+        assert store.structure("name-CCCCO").count("$$$$") == 1
+
+    merge_summaries(summaries, run / "all.csv")  # merging again replaces, never duplicates
+    assert len(catalog) == 2
+    with ResultStore(run / "results.sqlite") as store:
+        assert len(store) == 1
+
+
+def test_merge_gathers_shard_fingerprints_for_queries(tmp_path: Path):
+    def resolve(smiles: str) -> Result:
+        return Result(input_smiles=smiles, cid=len(smiles), preferred_name=f"name-{smiles}")
+
+    summaries = []
+    for i, rows in enumerate([[(1, "CCO"), (3, "c1ccccc1O")], [(2, "CCCCN")]]):
+        tag, node = shard_tag(i, 2), tmp_path / f"node{i + 1}"  # separate machines
+        node.mkdir()
+        with FingerprintStore(node / f"fingerprints_{tag}") as fps:
+            pipeline = BatchPipeline(str(node), resolver=resolve, rdkit_workers=0, fingerprints=fps,
+                                     catalog=catalog_filename(tag), log=lambda _msg: None)
+            summaries.append(node / f"batch_summary_20260101_000000_{tag}.csv")
+            with summaries[-1].open("w", newline="", encoding="utf-8") as fh:
+                pipeline.run(rows, fh)
+
+    merged = tmp_path / "merged"
+    stats = merge_summaries(summaries, merged / "all.csv", merged)
+    assert stats["fingerprints"] == 2
+    assert search(merged, "OCC", top_k=1)[0]["key"] == "name-CCO"
+    assert {r["key"] for r in SubstructureFilter("[NX3]", workers=0).search(merged)} == {"name-CCCCN"}
+    assert {r["key"] for r in SubstructureFilter("O", workers=0).search(merged)} == {"name-CCO", "name-c1ccccc1O"}
+
+    merge_summaries(summaries, merged / "all.csv", merged)  # merging again does not add rows
+    assert len(search(merged, "CCO", top_k=10)) == 3
@@ -0,0 +1,84 @@
+# tests/test_store.py
+import io
+import json
+from pathlib import Path
+
+from src.catalog import catalog_for
+from src.checkpoint import CheckpointJournal
+from src.io_utils import write_outputs
+from src.models import MeltingPoint, Result
+from src.pipeline import BatchPipeline
+from src.rdkit_utils import sdf_block, smiles_to_2d_mol
+from src.store import ResultStore
+
+ASPIRIN = "CC(=O)OC1=CC=CC=C1C(=O)O"
+
+
+def _aspirin() -> Result:
+    return Result(
+        input_smiles=ASPIRIN,
+        cid=2244,
+        iupac_name="2-acetyloxybenzoic acid",
+        preferred_name="Aspirin",
+        melting_points=[MeltingPoint(value="135 °C", notes="decomposes")],
+    )
+
+
+def test_store_export_matches_write_outputs(tmp_path: Path):
+    result = _aspirin()
+    sdf = sdf_block(smiles_to_2d_mol(ASPIRIN), props={"CID": "2244"})
+    direct = Path(write_outputs(result, base_dir=str(tmp_path / "direct"), sdf_text=sdf))
+
+    with ResultStore(tmp_path / "results.sqlite", batch_size=10) as store:
+        assert store.add(result, sdf) == "Aspirin"
+        store.add(result, sdf)  # same compound again replaces, not duplicates
+
+    store = ResultStore(tmp_path / "results.sqlite")
+    assert len(store) == 1
+    assert store.get(2244)["melting_points"][0]["notes"] == "decomposes"
+    assert store.get("2-ACETYLOXYBENZOIC ACID")["cid"] == 2244
+    assert store.get("missing") is None
+
+    [exported] = store.export([2244], str(tmp_path / "exported"))
+    store.close()
+    for name in ("IUPAC.txt", "melting_point.csv", "structure.sdf"):
+        assert (Path(exported) / name).read_bytes() == (direct / name).read_bytes()
+    meta = json.loads((Path(exported) / "metadata.json").read_text(encoding="utf-8"))
+    assert meta["preferred_name"] == "Aspirin"
+    # Exported folders are found by CID / name like written ones
+    catalog = catalog_for(tmp_path / "exported")
+    assert [e["folder"] for e in catalog.query(cid=2244)] == ["Aspirin"]
+    assert [e["folder"] for e in catalog.query(name="Aspirin")] == ["Aspirin"]
+
+
+def test_pipeline_writes_to_store(tmp_path: Path):
+    def resolve(smiles: str) -> Result:
+        return Result(input_smiles=smiles, cid=len(smiles), iupac_name=f"name-{smiles}")
+
+    journal = CheckpointJournal(tmp_path / "j.jsonl")
+    journal.start()
+    store = ResultStore(tmp_path / "results.sqlite", batch_size=100)
+    pipeline = BatchPipeline(str(tmp_path), resolver=resolve, rdkit_workers=0, store=store,
+                             journal=journal, log=lambda _msg: None)
+    stats = pipeline.run([(1, "CCO"), (2, "CCCN")], io.StringIO())
+    journal.close()
+
+    assert stats["ok"] == 2
+    assert sorted(store.keys()) == ["name-CCCN", "name-CCO"]
+    assert "M  END" in store.structure("name-CCO")
+    assert sorted(journal.load()) == [1, 2]  # journaled once the store committed
+    assert not any(p.is_dir() and p.name.startswith("name-") for p in tmp_path.iterdir())
+    store.close()
+
+
+def test_merge_copies_shard_stores(tmp_path: Path):
+    sdf = sdf_block(smiles_to_2d_mol(ASPIRIN))
+    with ResultStore(tmp_path / "results_shard1of2.sqlite") as shard:
+        shard.add(_aspirin(), sdf)
+    with ResultStore(tmp_path / "results.sqlite") as store:
+        store.add(Result(input_smiles="CCO", cid=702, preferred_name="Ethanol"))
+        store.add(Result(input_smiles=ASPIRIN, cid=2244, preferred_name="Aspirin"))  # replaced by the shard's
+        assert store.merge(tmp_path / "results_shard1of2.sqlite") == 1
+        assert store.keys() == ["Ethanol", "Aspirin"]
+        assert store.get("Aspirin")["melting_points"][0]["notes"] == "decomposes"
+        assert store.structure(2244) == sdf
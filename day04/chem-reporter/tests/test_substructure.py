@@ -0,0 +1,72 @@
+# tests/test_substructure.py
+from pathlib import Path
+
+import numpy as np
+import pytest
+from rdkit import Chem
+
+from src.fingerprints import FingerprintStore, pattern_words
+from src.substructure import SubstructureFilter, compile_query, screen
+
+LIBRARY = [
+    "CC(=O)Oc1ccccc1C(=O)O", "OC(=O)c1ccccc1", "CCO", "c1ccccc1", "CC(C)Cc1ccc(cc1)C(C)C(=O)O",
+    "CN1C=NC2=C1C(=O)N(C(=O)N2C)C", "OC(=O)CCC(=O)O", "Oc1ccccc1", "c1ccc2ccccc2c1", "NCC(=O)O",
+]
+QUERIES = ["c1ccccc1C(=O)[OH]", "C(=O)[OH]", "c1ccccc1", "[#7]", "CCO", "c1ccc2ccccc2c1"]
+
+
+def _expected(smarts: str) -> list:
+    query = Chem.MolFromSmarts(smarts)
+    return [s for s in LIBRARY if Chem.MolFromSmiles(s).HasSubstructMatch(query)]
+
+
+@pytest.mark.parametrize("smarts", QUERIES)
+def test_screen_never_rejects_a_match(smarts: str):
+    patterns = np.stack([pattern_words(s) for s in LIBRARY])
+    survivors = {LIBRARY[i] for i in screen(patterns, pattern_words(compile_query(smarts)))}
+    assert set(_expected(smarts)) <= survivors
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_filter_keeps_matching_rows_in_order(workers: int):
+    rows = list(enumerate(LIBRARY + ["not_a_smiles", ""], start=1))
+    motif = SubstructureFilter("C(=O)[OH]", workers=workers, chunk_size=3)
+    kept = list(motif.filter(rows))
+    assert [s for _, s in kept] == _expected("C(=O)[OH]")
+    assert [i for i, _ in kept] == sorted(i for i, _ in kept)
+    assert (motif.matched, motif.kept) == (len(rows), len(kept))
+
+
+def test_search_prescreens_stored_compounds(tmp_path: Path):
+    with FingerprintStore(tmp_path / "fingerprints") as fps:
+        for n, smiles in enumerate(LIBRARY):
+            fps.add(f"c{n}", smiles, cid=n)
+
+    motif = SubstructureFilter("c1ccccc1C(=O)[OH]", workers=0)
+    found = list(motif.search(tmp_path))
+    assert [r["key"] for r in found] == ["c0", "c1"]
+    assert motif.screened == len(LIBRARY)
+    assert motif.matched < len(LIBRARY)  # the rest never reached exact matching
+
+
+def test_store_without_patterns_is_backfilled(tmp_path: Path):
+    directory = tmp_path / "fingerprints"
+    with FingerprintStore(directory) as fps:
+        for n, smiles in enumerate(LIBRARY):
+            fps.add(f"c{n}", smiles)
+    (directory / "pattern.u64").unlink()  # store written before pattern fingerprints
+
+    # Unscreened rows still reach exact matching
+    assert len(list(SubstructureFilter("c1ccccc1", workers=0).search(tmp_path))) == 6
+
+    with FingerprintStore(directory):
+        pass
+    assert (directory / "pattern.u64").stat().st_size == len(LIBRARY) * 256
+    motif = SubstructureFilter("c1ccccc1", workers=0)
+    assert len(list(motif.search(tmp_path))) == 6
+    assert motif.matched < len(LIBRARY)
+
+
+def test_invalid_query_is_rejected():
+    with pytest.raises(ValueError):
+        SubstructureFilter("C(", workers=0)
@@ -0,0 +1,77 @@
+# tests/test_viewer.py
+from pathlib import Path
+
+import pytest
+from rdkit import Chem
+from rdkit.Chem import AllChem
+
+from src.io_utils import write_outputs
+from src.models import Result
+from src.pipeline import build_structure
+from src.rdkit_utils import EmbedOptions, sdf_block
+from src.store import ResultStore
+from src.viewer import ConformerViewer, mol_from_sdf
+
+
+def _sdf(smiles: str, conformers: int = 1) -> str:
+    mol = Chem.AddHs(Chem.MolFromSmiles(smiles))
+    ids = AllChem.EmbedMultipleConfs(mol, conformers, randomSeed=7)
+    return "".join(Chem.MolToMolBlock(mol, confId=c) + "$$$$\n" for c in ids)
+
+
+@pytest.fixture
+def results(tmp_path: Path) -> Path:
+    for cid, name, smiles in [(702, "Ethanol", "CCO"), (241, "Benzene", "c1ccccc1"), (887, "Methanol", "CO")]:
+        write_outputs(Result(input_smiles=smiles, cid=cid, preferred_name=name), base_dir=str(tmp_path),
+                      sdf_text=_sdf(smiles, conformers=3 if cid == 702 else 1))
+    with ResultStore(tmp_path / "results.sqlite") as store:
+        store.add(Result(input_smiles="CCCC", cid=7843, preferred_name="Butane"), _sdf("CCCC"))
+    return tmp_path
+
+
+def test_stored_coordinates_are_used_as_is(results: Path):
+    viewer = ConformerViewer(results)
+    stored = Chem.MolFromMolFile(str(results / "Benzene" / "structure.sdf"), removeHs=False)
+    mol = viewer.mol("Benzene")
+    assert mol.GetNumAtoms() == 12  # hydrogens kept, nothing re-embedded
+    assert list(mol.GetConformer().GetPositions().ravel()) == list(stored.GetConformer().GetPositions().ravel())
+    assert viewer.num_conformers("Ethanol") == 3
+    assert mol_from_sdf(sdf_block(mol)).GetNumConformers() == 1
+
+
+def test_kept_conformer_ensemble_can_be_paged(tmp_path: Path):
+    best, _, _, _, _ = build_structure("CCCCCCO", EmbedOptions(num_confs=5, prune_rms=0.0), {})
+    ensemble, info, error, _, _ = build_structure(
+        "CCCCCCO", EmbedOptions(num_confs=5, prune_rms=0.0, keep_conformers=True), {})
+    assert error is None and info["num_confs"] > 1
+    assert best.count("$$$$") == 1
+    assert ensemble.count("$$$$") == info["num_confs"]
+    # The first record is the best conformer, as written without the option
+    assert ensemble.split("M  END")[0] == best.split("M  END")[0]
+    write_outputs(Result(input_smiles="CCCCCCO", cid=8103, preferred_name="Hexanol"),
+                  base_dir=str(tmp_path), sdf_text=ensemble)
+    assert ConformerViewer(tmp_path).num_conformers("Hexanol") == info["num_confs"]
+
+
+def test_lookup_by_cid_name_folder_and_store(results: Path):
+    viewer = ConformerViewer(results)
+    assert viewer.mol(702).GetNumAtoms() == viewer.mol("ethanol").GetNumAtoms() == 9
+    assert viewer.mol("Butane").GetNumAtoms() == viewer.mol(7843).GetNumAtoms() == 14
+    with pytest.raises(KeyError):
+        viewer.mol("Propane")
+    viewer.close()
+
+
+def test_pages_are_loaded_lazily_and_cached(results: Path):
+    viewer = ConformerViewer(results, per_page=2, cache_size=2)
+    assert viewer.keys() == ["Benzene", "Butane", "Ethanol", "Methanol"]
+    assert viewer.num_pages == 2
+    assert viewer.page(1) == ["Ethanol", "Methanol"]
+    assert not viewer._cache  # listing pages reads no structure
+
+    first = viewer.mol("Benzene")
+    assert viewer.mol("Benzene") is first
+    viewer.mol("Ethanol")
+    viewer.mol("Methanol")  # evicts Benzene, the least recently used
+    assert list(viewer._cache) == ["Ethanol", "Methanol"]
+    assert viewer.mol("Benzene") is not first
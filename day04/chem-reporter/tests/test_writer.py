@@ -0,0 +1,31 @@
+# tests/test_writer.py
+from pathlib import Path
+
+import pytest
+
+from src.models import Result
+from src.rdkit_utils import sdf_block, smiles_to_2d_mol
+from src.writer import OutputWriter
+
+
+def _result(smiles: str, name: str) -> Result:
+    return Result(input_smiles=smiles, cid=1, iupac_name=name)
+
+
+def test_writer_returns_futures_and_flushes(tmp_path: Path):
+    with OutputWriter(str(tmp_path), max_pending=2, fsync_every=2) as writer:
+        futures = [
+            writer.submit(_result(smi, f"c{n}"), sdf_text=sdf_block(smiles_to_2d_mol(smi)))
+            for n, smi in enumerate(["CCO", "CCN", "CCC", "c1ccccc1"])
+        ]
+        bad = writer.submit(_result("not-a-smiles", "bad"), tiered=True)
+        writer.flush()
+        assert all(f.done() for f in futures)
+        assert [Path(f.result()).name for f in futures] == ["c0", "c1", "c2", "c3"]
+        with pytest.raises(Exception):
+            bad.result()
+        assert not list(tmp_path.rglob("*.tmp"))  # every file was renamed into place
+
+    with pytest.raises(RuntimeError):
+        writer.submit(_result("CCO", "late"))
+    writer.close()  # second close is a no-op